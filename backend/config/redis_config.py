@@ -22,9 +22,18 @@ DRE_N0_CACHE_TTL = int(os.getenv("DRE_N0_CACHE_TTL", "300"))  # 5 minutos
 CLASSIFICACOES_CACHE_TTL = int(os.getenv("CLASSIFICACOES_CACHE_TTL", "300"))  # 5 minutos
 ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "600"))  # 10 minutos
 
+# Cache de respostas dos endpoints da planilha Excel (helpers/response_cache.py)
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64"))  # por processo
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # 1 hora no Redis
+
 # Configurações de invalidação
 CACHE_INVALIDATION_ENABLED = os.getenv("CACHE_INVALIDATION_ENABLED", "true").lower() == "true"
-AUTO_REFRESH_MATERIALIZED_VIEWS = os.getenv("AUTO_REFRESH_MATERIALIZED_VIEWS", "false").lower() == "true"
+# Refresh das views materializadas após escritas em financial_data. Cada processo agenda
+# o refresh das próprias escritas; um advisory lock no Postgres garante um refresh por vez
+# entre processos (materialized_view_helper.py). Desligado, a view só muda no refresh manual.
+AUTO_REFRESH_MATERIALIZED_VIEWS = os.getenv("AUTO_REFRESH_MATERIALIZED_VIEWS", "true").lower() == "true"
+# Janela (segundos) que agrupa as escritas em financial_data em um único refresh
+MATERIALIZED_VIEW_REFRESH_DEBOUNCE = float(os.getenv("MATERIALIZED_VIEW_REFRESH_DEBOUNCE", "30"))
 
 def get_redis_config() -> dict:
     """Retorna configurações do Redis"""
@@ -39,8 +48,11 @@ def get_redis_config() -> dict:
         "dre_n0_cache_ttl": DRE_N0_CACHE_TTL,
         "classificacoes_cache_ttl": CLASSIFICACOES_CACHE_TTL,
         "analytics_cache_ttl": ANALYTICS_CACHE_TTL,
+        "response_cache_max_mb": RESPONSE_CACHE_MAX_MB,
+        "response_cache_ttl": RESPONSE_CACHE_TTL,
         "cache_invalidation_enabled": CACHE_INVALIDATION_ENABLED,
-        "auto_refresh_materialized_views": AUTO_REFRESH_MATERIALIZED_VIEWS
+        "auto_refresh_materialized_views": AUTO_REFRESH_MATERIALIZED_VIEWS,
+        "materialized_view_refresh_debounce": MATERIALIZED_VIEW_REFRESH_DEBOUNCE
     }
 
 def print_config():
@@ -0,0 +1,155 @@
+"""
+Ids das contas DRE/DFC resolvidos em financial_data (dre_n1_id, dre_n2_id, dfc_n2_id)
+
+Os rótulos de texto do lançamento (dre_n1, dre_n2, dfc_n2) são resolvidos uma
+vez, na escrita, para o id da conta em dre_structure_n1/dre_structure_n2/
+dfc_structure_n2 da mesma empresa (ou de uma estrutura sem empresa). A
+comparação usa o nome limpo (sem "( + )", "( - )"...), sem diferenciar
+maiúsculas. Com os ids, a tabela de fatos e as views fazem joins por igualdade,
+com índices (empresa_id, id da conta, competência/data).
+
+Quando a estrutura é recarregada, os lançamentos são resolvidos de novo
+(função SQL resolver_contas_financial_data, chamada pelas migrações).
+
+Colunas, índices e funções são criados (com o backfill) na inicialização da API
+ou por scripts/migrates/backfill_account_ids.py, nunca dentro de uma escrita:
+o ALTER TABLE esperaria o lock da própria transação de escrita.
+"""
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy import text
+from database.connection_sqlalchemy import get_engine
+
+# Colunas de id em financial_data: (coluna, rótulo do lançamento, tabela da estrutura)
+COLUNAS_CONTAS = (
+    ("dre_n1_id", "dre_n1", "dre_structure_n1"),
+    ("dre_n2_id", "dre_n2", "dre_structure_n2"),
+    ("dfc_n2_id", "dfc_n2", "dfc_structure_n2"),
+)
+
+_SQL_SUBCONSULTA = """(
+            SELECT c.id FROM contas c
+            WHERE c.coluna = '{coluna}'
+            AND c.nome = nome_conta_limpo(fd.{rotulo})
+            AND (c.empresa_id = fd.empresa_id::text OR c.empresa_id IS NULL)
+            ORDER BY c.empresa_id IS NULL, c.is_active IS NOT TRUE, c.order_index
+            LIMIT 1
+        )"""
+
+# Resolve os ids dos lançamentos filtrados por {filtro}; retorna quantos foram atualizados
+_SQL_RESOLVER = """
+    WITH contas AS (
+        """ + "\n        UNION ALL\n        ".join(
+    f"SELECT '{coluna}' AS coluna, empresa_id::text AS empresa_id, nome_conta_limpo(name) AS nome, "
+    f"id::text AS id, is_active, order_index FROM {tabela}"
+    for coluna, _, tabela in COLUNAS_CONTAS
+) + """
+    ),
+    atualizados AS (
+        UPDATE financial_data fd SET
+        """ + ",\n        ".join(
+    f"{coluna} = " + _SQL_SUBCONSULTA.format(coluna=coluna, rotulo=rotulo)
+    for coluna, rotulo, _ in COLUNAS_CONTAS
+) + """
+        WHERE {filtro}
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM atualizados
+"""
+
+_SQL_CRIAR = r"""
+    CREATE OR REPLACE FUNCTION nome_conta_limpo(texto text)
+    RETURNS text LANGUAGE sql IMMUTABLE AS $$
+        SELECT NULLIF(lower(trim(regexp_replace(texto, '\(\s*(\+\s*/\s*-|\+|-|=)\s*\)', '', 'g'))), '')
+    $$;
+""" + "".join(f"""
+    ALTER TABLE financial_data ADD COLUMN IF NOT EXISTS {coluna} varchar(36);"""
+    for coluna, _, _ in COLUNAS_CONTAS
+) + """
+    CREATE INDEX IF NOT EXISTS idx_financial_data_empresa_dre_n1 ON financial_data (empresa_id, dre_n1_id, competencia);
+    CREATE INDEX IF NOT EXISTS idx_financial_data_empresa_dre_n2 ON financial_data (empresa_id, dre_n2_id, competencia);
+    CREATE INDEX IF NOT EXISTS idx_financial_data_empresa_dfc_n2 ON financial_data (empresa_id, dfc_n2_id, data);
+""" + "".join(f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_financial_data_{coluna}_{tabela}') THEN
+            ALTER TABLE financial_data ADD CONSTRAINT fk_financial_data_{coluna}_{tabela}
+                FOREIGN KEY ({coluna}) REFERENCES {tabela}(id) ON DELETE SET NULL NOT VALID;
+        END IF;
+    EXCEPTION WHEN others THEN
+        RAISE NOTICE 'FK de financial_data.{coluna} não criada: %', SQLERRM;
+    END
+    $$;"""
+    for coluna, _, tabela in COLUNAS_CONTAS
+) + """
+
+    CREATE OR REPLACE FUNCTION resolver_contas_financial_data(empresas text[] DEFAULT NULL)
+    RETURNS bigint LANGUAGE sql AS $$
+        """ + _SQL_RESOLVER.format(filtro="empresas IS NULL OR fd.empresa_id::text = ANY(empresas)") + """;
+    $$;
+"""
+
+_colunas_prontas = False
+
+
+def garantir_colunas_contas() -> bool:
+    """Cria colunas, índices, FKs e funções se preciso; retorna se foram criadas agora
+
+    Roda em transação própria. Na criação os lançamentos existentes são
+    resolvidos (backfill completo). Chamar na inicialização ou em migrações,
+    sem transação aberta sobre financial_data na mesma thread.
+    """
+    global _colunas_prontas
+    if _colunas_prontas:
+        return False
+
+    with get_engine().begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('financial_data_contas'))"))
+        existe = connection.execute(
+            text("SELECT to_regproc('resolver_contas_financial_data') IS NOT NULL")
+        ).scalar()
+        if not existe:
+            print("🏗️ Criando ids de contas em financial_data e resolvendo os lançamentos...")
+            connection.execute(text(_SQL_CRIAR))
+            total = connection.execute(text("SELECT resolver_contas_financial_data()")).scalar()
+            print(f"✅ {total} lançamentos resolvidos")
+    _colunas_prontas = True
+    return not existe
+
+
+def colunas_contas_prontas(connection) -> bool:
+    """Se as colunas e funções já existem, consultado na conexão dada (sem DDL)"""
+    global _colunas_prontas
+    if not _colunas_prontas:
+        _colunas_prontas = connection.execute(
+            text("SELECT to_regproc('resolver_contas_financial_data') IS NOT NULL")
+        ).scalar()
+    return _colunas_prontas
+
+
+def resolver_contas(connection, filtro: str, parametros: Dict[str, Any]) -> int:
+    """Resolve os ids de conta dos lançamentos que atendem ao filtro, na transação da escrita
+
+    Antes da criação das colunas não faz nada: o backfill da criação resolve
+    os lançamentos gravados até lá.
+    """
+    if not colunas_contas_prontas(connection):
+        return 0
+    return connection.execute(text(_SQL_RESOLVER.format(filtro=filtro)), parametros).scalar()
+
+
+def resolver_contas_registro(connection, id: Any) -> int:
+    """Ids de conta de um único lançamento (após INSERT/UPDATE)"""
+    return resolver_contas(connection, "fd.id = :id", {"id": id})
+
+
+def resolver_contas_empresas(connection, empresa_ids: Optional[Iterable[str]] = None) -> int:
+    """Backfill dos lançamentos das empresas indicadas (todas quando None)
+
+    connection precisa estar em transação (engine.begin()).
+    """
+    if not colunas_contas_prontas(connection):
+        return 0
+    empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+    return connection.execute(
+        text("SELECT resolver_contas_financial_data(:empresas)"), {"empresas": empresas}
+    ).scalar()
@@ -0,0 +1,136 @@
+"""
+Mapeamento materializado das classificações (classificacao_plano_contas)
+
+Resolve uma vez o caminho financial_data.classificacao → de_para → plano_de_contas
+→ conta DRE N2: uma linha por (empresa_id, classificacao) com a conta do plano
+(id e nome_conta), o rótulo classificacao_dre_n2 e o id da conta em
+dre_structure_n2 da mesma empresa (ou de uma estrutura sem empresa), casada
+pelo nome limpo (database/account_ids.py).
+
+Com ela, o endpoint de classificações faz um único GROUP BY classificação/mês
+sobre financial_data_mensal, com join por igualdade em (empresa_id,
+classificacao), em vez do join de três tabelas com LIKE.
+
+As migrações de de_para, plano_de_contas e estrutura DRE reconstroem as
+empresas carregadas (função SQL reconstruir_classificacao_plano_contas). A
+tabela é criada na inicialização da API; as leituras só conferem a versão
+(exigir_mapa_classificacoes).
+"""
+from typing import Iterable, Optional
+from sqlalchemy import text
+from database.connection_sqlalchemy import get_engine
+from database.account_ids import garantir_colunas_contas
+from database.monthly_facts import TabelaFatosIndisponivel
+
+TABELA_MAPA = "classificacao_plano_contas"
+
+# Comentário da tabela: outra versão (colunas ou função diferente) recria a função e reconstrói a tabela
+_VERSAO = "classificacao_plano_contas v1"
+
+_SQL_CRIAR = """
+    CREATE TABLE IF NOT EXISTS classificacao_plano_contas (
+        empresa_id varchar(36) NOT NULL,
+        classificacao varchar(255) NOT NULL,
+        plano_conta_id varchar(36),
+        nome_conta varchar(255),
+        classificacao_dre_n2 varchar(255),
+        dre_n2_nome varchar(255),
+        dre_n2_id varchar(36),
+        PRIMARY KEY (empresa_id, classificacao)
+    );
+    CREATE INDEX IF NOT EXISTS idx_classificacao_plano_contas_dre_n2 ON classificacao_plano_contas (dre_n2_nome, empresa_id);
+    CREATE INDEX IF NOT EXISTS idx_classificacao_plano_contas_dre_n2_id ON classificacao_plano_contas (dre_n2_id, empresa_id);
+
+    CREATE OR REPLACE FUNCTION reconstruir_classificacao_plano_contas(empresas text[] DEFAULT NULL)
+    RETURNS bigint LANGUAGE sql AS $$
+        DELETE FROM classificacao_plano_contas WHERE empresas IS NULL OR empresa_id = ANY(empresas);
+        WITH inseridos AS (
+            INSERT INTO classificacao_plano_contas (
+                empresa_id, classificacao, plano_conta_id, nome_conta,
+                classificacao_dre_n2, dre_n2_nome, dre_n2_id
+            )
+            -- de_para é único por (descricao_origem, empresa_id) e plano_de_contas por
+            -- (conta_pai, empresa_id); o DISTINCT ON só protege bases sem essas constraints
+            SELECT DISTINCT ON (dp.empresa_id::text, dp.descricao_origem)
+                dp.empresa_id::text,
+                dp.descricao_origem,
+                pc.id::text,
+                pc.nome_conta,
+                pc.classificacao_dre_n2,
+                nome_conta_limpo(pc.classificacao_dre_n2),
+                (
+                    SELECT n2.id::text FROM dre_structure_n2 n2
+                    WHERE nome_conta_limpo(n2.name) = nome_conta_limpo(pc.classificacao_dre_n2)
+                    AND (n2.empresa_id::text = dp.empresa_id::text OR n2.empresa_id IS NULL)
+                    ORDER BY n2.empresa_id IS NULL, n2.is_active IS NOT TRUE, n2.order_index
+                    LIMIT 1
+                )
+            FROM de_para dp
+            JOIN plano_de_contas pc ON pc.conta_pai = dp.descricao_destino
+                AND pc.empresa_id = dp.empresa_id
+            WHERE dp.empresa_id IS NOT NULL
+            AND dp.descricao_origem IS NOT NULL
+            AND (empresas IS NULL OR dp.empresa_id::text = ANY(empresas))
+            ORDER BY dp.empresa_id::text, dp.descricao_origem, pc.id
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM inseridos;
+    $$;
+"""
+
+_SQL_VERSAO = "SELECT obj_description(to_regclass('classificacao_plano_contas'), 'pg_class')"
+
+_tabela_pronta = False
+
+
+class MapaClassificacoesIndisponivel(TabelaFatosIndisponivel):
+    """classificacao_plano_contas ainda não está na versão atual (mesma resposta 503 da tabela de fatos)"""
+
+
+def garantir_mapa_classificacoes() -> bool:
+    """Cria a tabela (e a função de reconstrução) se preciso; retorna se foi criada agora
+
+    Roda em transação própria. Na criação (ou mudança de versão) a tabela é
+    populada a partir de de_para e plano_de_contas.
+    """
+    global _tabela_pronta
+    if _tabela_pronta:
+        return False
+
+    # nome_conta_limpo vem das colunas de ids de conta
+    garantir_colunas_contas()
+    with get_engine().begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('classificacao_plano_contas'))"))
+        versao = connection.execute(text(_SQL_VERSAO)).scalar()
+        criada = versao != _VERSAO
+        if criada:
+            print("🏗️ Criando classificacao_plano_contas a partir de de_para e plano_de_contas...")
+            connection.execute(text(_SQL_CRIAR))
+            connection.execute(text(f"COMMENT ON TABLE classificacao_plano_contas IS '{_VERSAO}'"))
+            total = connection.execute(text("SELECT reconstruir_classificacao_plano_contas()")).scalar()
+            print(f"✅ {total} classificações mapeadas")
+    _tabela_pronta = True
+    return criada
+
+
+def exigir_mapa_classificacoes(connection):
+    """Para leituras: MapaClassificacoesIndisponivel se a tabela não está na versão atual (sem DDL)"""
+    global _tabela_pronta
+    if _tabela_pronta:
+        return
+    if connection.execute(text(_SQL_VERSAO)).scalar() != _VERSAO:
+        raise MapaClassificacoesIndisponivel(f"{TABELA_MAPA} em preparação; tente novamente em instantes")
+    _tabela_pronta = True
+
+
+def reconstruir_mapa_classificacoes(connection, empresa_ids: Optional[Iterable[str]] = None) -> int:
+    """Remapeia as classificações das empresas indicadas (todas quando None)
+
+    connection precisa estar em transação (engine.begin()).
+    """
+    if garantir_mapa_classificacoes():
+        return 0
+    empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+    return connection.execute(
+        text("SELECT reconstruir_classificacao_plano_contas(:empresas)"), {"empresas": empresas}
+    ).scalar()
@@ -0,0 +1,344 @@
+"""
+Tabela de fatos mensais (financial_data_mensal) lida pelos relatórios DRE/DFC
+
+Uma linha por (base, empresa_id, conta n1/n2, classificacao, mês, origem):
+- base 'competencia' (DRE): competencia e valor_original, contas dre_n1/dre_n2;
+- base 'caixa' (DFC): data e valor, contas dfc_n1/dfc_n2.
+
+Os ids de conta são os resolvidos em financial_data (database/account_ids.py).
+
+Guarda as somas de realizado (origem <> 'ORC') e orçamento (origem = 'ORC'),
+entradas e saídas (valores positivos e negativos) e a quantidade de lançamentos.
+É mantida por delta: as escritas do FinancialDataRepository somam/subtraem a
+contribuição do registro na mesma transação, e as migrações reconstroem as
+empresas carregadas (função SQL reconstruir_financial_data_mensal).
+
+A coluna descartado separa os lançamentos que /financial-data/dfc e /dre
+sempre deixaram de fora: os dados fictícios (ids 15354-15533, criados em
+08/08/2025) e as duplicatas exatas (mesma categoria, subcategoria, nome, valor
+e data, entre os lançamentos que passam pelos filtros daqueles endpoints;
+fica o de menor id). As duplicatas são procuradas dentro da empresa, para que
+a recarga de uma empresa não mude as linhas de outra. Os demais leitores somam
+as duas partes, como antes.
+
+A tabela é criada e populada na inicialização da API ou pelas migrações, e o
+delta de uma escrita é sempre aplicado na transação dela. As leituras só
+conferem a versão (exigir_tabela_fatos) e, antes da criação, falham com
+TabelaFatosIndisponivel (503 na API).
+"""
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy import text
+from database.connection_sqlalchemy import get_engine
+from database.account_ids import garantir_colunas_contas
+
+TABELA_FATOS = "financial_data_mensal"
+BASE_COMPETENCIA = "competencia"
+BASE_CAIXA = "caixa"
+
+# Comentário da tabela: outra versão (chave ou função diferente) recria a função e reconstrói a tabela
+_VERSAO = "financial_data_mensal v3"
+
+_CHAVE = "base, empresa_id, conta_n1_id, conta_n2_id, conta_n1, conta_n2, classificacao, mes, origem, descartado"
+
+# Categoria e subcategoria de compatibilidade (dfc_n1 or dre_n1) usadas pelos filtros de /dfc e /dre
+_SQL_CATEGORIA = "COALESCE(NULLIF(fd.dfc_n1, ''), fd.dre_n1)"
+_SQL_SUBCATEGORIA = "COALESCE(NULLIF(fd.dfc_n2, ''), fd.dre_n2)"
+
+# Dados fictícios de exemplo (id é varchar nas bases migradas)
+_SQL_FICTICIO = """(
+    CASE WHEN fd.id::text ~ '^[0-9]+$' AND length(fd.id::text) <= 18
+         THEN fd.id::text::bigint BETWEEN 15354 AND 15533 ELSE false END
+    OR COALESCE(fd.created_at::date = DATE '2025-08-08', false)
+)"""
+
+# Lançamentos que passam pelos filtros de /dfc e /dre antes da remoção de duplicatas
+_SQL_CONSIDERADO = """COALESCE(
+    NOT """ + _SQL_FICTICIO + """
+    AND fd.origem IS DISTINCT FROM 'Sistema ERP'
+    AND """ + _SQL_CATEGORIA + """ <> 'nan'
+    AND TRIM(""" + _SQL_CATEGORIA + """) <> '',
+    false
+)"""
+
+# Grupo de duplicatas exatas de um lançamento (coluna -> expressão sobre fd)
+_COLUNAS_GRUPO = {
+    "empresa_id": "fd.empresa_id::text",
+    "considerado": _SQL_CONSIDERADO,
+    "categoria": _SQL_CATEGORIA,
+    "subcategoria": _SQL_SUBCATEGORIA,
+    "nome": "fd.nome",
+    "valor": "fd.valor",
+    "data": "fd.data",
+}
+
+# Lançamentos de financial_data nas duas bases; {filtro} restringe fd e precisa
+# trazer grupos de duplicatas inteiros (empresas inteiras ou _aplicar_grupo)
+_SQL_LANCAMENTOS = """
+    WITH marcados AS (
+        SELECT fd.*,
+               """ + _SQL_FICTICIO + """ OR (""" + _SQL_CONSIDERADO + """ AND row_number() OVER (
+                   PARTITION BY """ + ", ".join(_COLUNAS_GRUPO.values()) + """
+                   ORDER BY fd.id
+               ) > 1) AS descartado
+        FROM financial_data fd
+        WHERE ({filtro})
+    )
+    SELECT 'competencia' AS base,
+           COALESCE(fd.empresa_id::text, '') AS empresa_id,
+           COALESCE(fd.dre_n1_id::text, '') AS conta_n1_id,
+           COALESCE(fd.dre_n2_id::text, '') AS conta_n2_id,
+           COALESCE(fd.dre_n1, '') AS conta_n1,
+           COALESCE(fd.dre_n2, '') AS conta_n2,
+           COALESCE(fd.classificacao, '') AS classificacao,
+           date_trunc('month', fd.competencia)::date AS mes,
+           COALESCE(fd.origem, '') AS origem,
+           fd.descartado,
+           fd.valor_original AS valor
+    FROM marcados fd
+    WHERE fd.competencia IS NOT NULL AND fd.valor_original IS NOT NULL
+    UNION ALL
+    SELECT 'caixa',
+           COALESCE(fd.empresa_id::text, ''),
+           '',
+           COALESCE(fd.dfc_n2_id::text, ''),
+           COALESCE(fd.dfc_n1, ''),
+           COALESCE(fd.dfc_n2, ''),
+           COALESCE(fd.classificacao, ''),
+           date_trunc('month', fd.data)::date,
+           COALESCE(fd.origem, ''),
+           fd.descartado,
+           fd.valor
+    FROM marcados fd
+    WHERE fd.data IS NOT NULL AND fd.valor IS NOT NULL
+"""
+
+# Soma (sinal 1) ou subtrai (sinal -1) a contribuição dos lançamentos filtrados
+_SQL_APLICAR = """
+    INSERT INTO financial_data_mensal AS f (
+        """ + _CHAVE + """, valor_real, valor_orcamento, entradas, saidas, quantidade
+    )
+    SELECT """ + _CHAVE + """,
+           {sinal} * COALESCE(SUM(valor) FILTER (WHERE origem <> 'ORC'), 0),
+           {sinal} * COALESCE(SUM(valor) FILTER (WHERE origem = 'ORC'), 0),
+           {sinal} * COALESCE(SUM(valor) FILTER (WHERE valor > 0), 0),
+           {sinal} * COALESCE(SUM(valor) FILTER (WHERE valor < 0), 0),
+           {sinal} * COUNT(*)
+    FROM (""" + _SQL_LANCAMENTOS + """) lancamentos
+    GROUP BY """ + _CHAVE + """
+    ON CONFLICT (""" + _CHAVE + """) DO UPDATE SET
+        valor_real = f.valor_real + EXCLUDED.valor_real,
+        valor_orcamento = f.valor_orcamento + EXCLUDED.valor_orcamento,
+        entradas = f.entradas + EXCLUDED.entradas,
+        saidas = f.saidas + EXCLUDED.saidas,
+        quantidade = f.quantidade + EXCLUDED.quantidade
+"""
+
+_SQL_CRIAR = """
+    CREATE TABLE IF NOT EXISTS financial_data_mensal (
+        base varchar(12) NOT NULL,
+        empresa_id varchar(36) NOT NULL DEFAULT '',
+        conta_n1_id varchar(36) NOT NULL DEFAULT '',
+        conta_n2_id varchar(36) NOT NULL DEFAULT '',
+        conta_n1 varchar(255) NOT NULL DEFAULT '',
+        conta_n2 varchar(255) NOT NULL DEFAULT '',
+        classificacao varchar(255) NOT NULL DEFAULT '',
+        mes date NOT NULL,
+        origem varchar(50) NOT NULL DEFAULT '',
+        descartado boolean NOT NULL DEFAULT false,
+        valor_real numeric(18,2) NOT NULL DEFAULT 0,
+        valor_orcamento numeric(18,2) NOT NULL DEFAULT 0,
+        entradas numeric(18,2) NOT NULL DEFAULT 0,
+        saidas numeric(18,2) NOT NULL DEFAULT 0,
+        quantidade integer NOT NULL DEFAULT 0,
+        PRIMARY KEY (""" + _CHAVE + """)
+    );
+    -- Tabela de uma versão anterior: a função reconstrói as linhas, aqui só muda a chave
+    ALTER TABLE financial_data_mensal ADD COLUMN IF NOT EXISTS descartado boolean NOT NULL DEFAULT false;
+    ALTER TABLE financial_data_mensal DROP CONSTRAINT IF EXISTS financial_data_mensal_pkey;
+    ALTER TABLE financial_data_mensal ADD PRIMARY KEY (""" + _CHAVE + """);
+    CREATE INDEX IF NOT EXISTS idx_financial_data_mensal_conta ON financial_data_mensal (base, conta_n2, mes);
+    CREATE INDEX IF NOT EXISTS idx_financial_data_mensal_empresa ON financial_data_mensal (base, empresa_id, mes);
+    CREATE INDEX IF NOT EXISTS idx_financial_data_mensal_classificacao ON financial_data_mensal (empresa_id, classificacao);
+    -- Busca do grupo de duplicatas de um lançamento nas escritas
+    CREATE INDEX IF NOT EXISTS idx_financial_data_data_valor ON financial_data (data, valor);
+
+    CREATE OR REPLACE FUNCTION reconstruir_financial_data_mensal(empresas text[] DEFAULT NULL)
+    RETURNS void LANGUAGE sql AS $$
+        DELETE FROM financial_data_mensal WHERE empresas IS NULL OR empresa_id = ANY(empresas);
+        """ + _SQL_APLICAR.format(
+            sinal=1, filtro="empresas IS NULL OR fd.empresa_id::text = ANY(empresas)"
+        ) + """;
+    $$;
+"""
+
+_SQL_GRUPO_REGISTRO = "SELECT " + ", ".join(
+    f"{expressao} AS {coluna}" for coluna, expressao in _COLUNAS_GRUPO.items()
+) + " FROM financial_data fd WHERE fd.id = :id"
+
+_SQL_VERSAO = "SELECT obj_description(to_regclass('financial_data_mensal'), 'pg_class')"
+
+_tabela_pronta = False
+
+
+class TabelaFatosIndisponivel(Exception):
+    """financial_data_mensal ainda não está na versão atual (criação em andamento ou pendente)"""
+
+
+def _criar_tabela_fatos(connection) -> bool:
+    """Cria e popula a tabela na transação dada se ela não está na versão atual
+
+    O lock SHARE em financial_data espera as escritas em andamento e segura as
+    novas até o fim da transação: a tabela nasce com tudo o que foi gravado, e
+    as escritas seguintes já aplicam o delta.
+    """
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('financial_data_mensal'))"))
+    if connection.execute(text(_SQL_VERSAO)).scalar() == _VERSAO:
+        return False
+    print("🏗️ Criando financial_data_mensal a partir de financial_data...")
+    connection.execute(text("LOCK TABLE financial_data IN SHARE MODE"))
+    connection.execute(text(_SQL_CRIAR))
+    connection.execute(text(f"COMMENT ON TABLE financial_data_mensal IS '{_VERSAO}'"))
+    connection.execute(text("SELECT reconstruir_financial_data_mensal()"))
+    return True
+
+
+def garantir_tabela_fatos() -> bool:
+    """Cria a tabela (e a função de reconstrução) se preciso; retorna se foi criada agora
+
+    Roda em transação própria, a partir do que já está gravado em financial_data.
+    Chamar na inicialização ou nas migrações, sem transação aberta sobre
+    financial_data na mesma thread (as leituras usam exigir_tabela_fatos); o
+    advisory lock evita que dois processos a criem e populem ao mesmo tempo.
+    """
+    global _tabela_pronta
+    if _tabela_pronta:
+        return False
+
+    # Os lançamentos entram na tabela com os ids de conta já resolvidos
+    garantir_colunas_contas()
+    with get_engine().begin() as connection:
+        criada = _criar_tabela_fatos(connection)
+    _tabela_pronta = True
+    return criada
+
+
+def exigir_tabela_fatos(connection=None):
+    """Para leituras: TabelaFatosIndisponivel se a tabela não está na versão atual
+
+    Só lê o comentário da tabela, sem lock nem DDL; connection pode ser uma
+    Session. Durante uma recriação, o comentário antigo vale até o commit dela.
+    """
+    global _tabela_pronta
+    if _tabela_pronta:
+        return
+    if connection is None:
+        with get_engine().connect() as conexao:
+            versao = conexao.execute(text(_SQL_VERSAO)).scalar()
+    else:
+        versao = connection.execute(text(_SQL_VERSAO)).scalar()
+    if versao != _VERSAO:
+        raise TabelaFatosIndisponivel(f"{TABELA_FATOS} em preparação; tente novamente em instantes")
+    _tabela_pronta = True
+
+
+def tabela_fatos_pronta(connection) -> bool:
+    """Se a tabela existe na versão atual, consultado na conexão da escrita (sem DDL)
+
+    O lock ROW EXCLUSIVE (o mesmo de um INSERT/UPDATE) vem antes da consulta: uma
+    criação em andamento termina antes, e uma que ainda não começou espera esta
+    escrita. Assim o -1 e o +1 de um UPDATE veem a mesma resposta.
+    """
+    global _tabela_pronta
+    if not _tabela_pronta:
+        connection.execute(text("LOCK TABLE financial_data IN ROW EXCLUSIVE MODE"))
+        _tabela_pronta = connection.execute(text(_SQL_VERSAO)).scalar() == _VERSAO
+    return _tabela_pronta
+
+
+def aplicar_delta_fatos(connection, filtro: str, parametros: Dict[str, Any], sinal: int):
+    """Soma (sinal=1) ou subtrai (sinal=-1) os lançamentos de financial_data que atendem ao filtro
+
+    Roda na transação da escrita. Antes da criação da tabela não faz nada: ela
+    nasce já com esta escrita.
+    """
+    if not tabela_fatos_pronta(connection):
+        return
+    connection.execute(text(_SQL_APLICAR.format(sinal=int(sinal), filtro=filtro)), parametros)
+    connection.execute(text("DELETE FROM financial_data_mensal WHERE quantidade <= 0"))
+
+
+def _grupo_registro(connection, id: Any) -> Optional[Dict[str, Any]]:
+    """Grupo de duplicatas do registro (valores de _COLUNAS_GRUPO), ou None se ele não existe"""
+    linha = connection.execute(text(_SQL_GRUPO_REGISTRO), {"id": id}).mappings().first()
+    return dict(linha) if linha is not None else None
+
+
+def _travar_grupo(connection, grupo: Dict[str, Any]):
+    """Uma escrita por vez em cada grupo: quem mantém o primeiro lançamento depende dos demais"""
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:chave))"),
+        {"chave": f"{TABELA_FATOS}:{sorted(grupo.items())!r}"}
+    )
+
+
+def _aplicar_grupo(connection, grupo: Dict[str, Any], sinal: int, sem_id: Any = None):
+    """Delta de todos os lançamentos do grupo (sem_id: calculado como se o registro não existisse)"""
+    filtros = []
+    parametros: Dict[str, Any] = {}
+    for coluna, expressao in _COLUNAS_GRUPO.items():
+        if grupo[coluna] is None:
+            filtros.append(f"{expressao} IS NULL")
+        else:
+            filtros.append(f"{expressao} = :grupo_{coluna}")
+            parametros[f"grupo_{coluna}"] = grupo[coluna]
+    if sem_id is not None:
+        filtros.append("fd.id <> :sem_id")
+        parametros["sem_id"] = sem_id
+    aplicar_delta_fatos(connection, " AND ".join(filtros), parametros, sinal)
+
+
+def retirar_registro_fatos(connection, id: Any) -> Optional[Dict[str, Any]]:
+    """Antes de UPDATE/DELETE: subtrai o registro e as duplicatas dele
+
+    Retorna o grupo do registro, a passar para somar_registro_fatos depois da escrita.
+    """
+    if not tabela_fatos_pronta(connection):
+        return None
+    grupo = _grupo_registro(connection, id)
+    if grupo is not None:
+        _travar_grupo(connection, grupo)
+        _aplicar_grupo(connection, grupo, -1)
+    return grupo
+
+
+def somar_registro_fatos(connection, id: Any, anterior: Optional[Dict[str, Any]] = None):
+    """Depois de INSERT/UPDATE/DELETE: soma o grupo anterior e o atual do registro
+
+    Se o registro mudou de grupo (ou é novo), as duplicatas do grupo atual são
+    recalculadas: ele pode ter passado a ser o primeiro lançamento delas.
+    """
+    if not tabela_fatos_pronta(connection):
+        return
+    atual = _grupo_registro(connection, id)
+    if anterior is not None:
+        _aplicar_grupo(connection, anterior, 1)
+    if atual is not None and atual != anterior:
+        _travar_grupo(connection, atual)
+        _aplicar_grupo(connection, atual, -1, sem_id=id)
+        _aplicar_grupo(connection, atual, 1)
+
+
+def reconstruir_fatos(connection, empresa_ids: Optional[Iterable[str]] = None):
+    """Recalcula as linhas das empresas indicadas (todas quando None), após cargas em lote
+
+    connection precisa estar em transação (engine.begin()) e as colunas de ids
+    de conta precisam existir (garantir_colunas_contas antes de abrir a transação).
+    Se a tabela ainda não existe, é criada nesta mesma transação, já com os
+    dados da carga.
+    """
+    global _tabela_pronta
+    if _criar_tabela_fatos(connection):
+        _tabela_pronta = True
+        return
+    empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+    connection.execute(text("SELECT reconstruir_financial_data_mensal(:empresas)"), {"empresas": empresas})
@@ -6,6 +6,9 @@ from decimal import Decimal
 from typing import List, Dict, Optional, Any
 from database.connection import get_database
 from database.schema import financial_data, categories, periods, users, roles, permissions
+from database.account_ids import resolver_contas_registro
+from database.monthly_facts import retirar_registro_fatos, somar_registro_fatos
+from helpers_postgresql.dre.materialized_view_helper import agendar_atualizacao_views
 
 class FinancialDataRepository:
     """Repository para operações com dados financeiros"""
@@ -94,31 +97,47 @@ class FinancialDataRepository:
     async def insert_financial_data(self, data: Dict[str, Any]) -> int:
         """Insere novo dado financeiro"""
         
-        with self.db.connect() as conn:
+        with self.db.connect() as conn, conn.begin():
             result = conn.execute(
                 financial_data.insert().values(**data)
             )
-            return result.inserted_primary_key[0]
+            # Ids de conta resolvidos e tabela de fatos mensais mantida na mesma transação
+            resolver_contas_registro(conn, result.inserted_primary_key[0])
+            somar_registro_fatos(conn, result.inserted_primary_key[0])
+        
+        agendar_atualizacao_views("insert financial_data")
+        return result.inserted_primary_key[0]
     
     async def update_financial_data(self, id: int, data: Dict[str, Any]) -> bool:
         """Atualiza dado financeiro"""
         
-        with self.db.connect() as conn:
+        with self.db.connect() as conn, conn.begin():
+            anterior = retirar_registro_fatos(conn, id)
             result = conn.execute(
                 financial_data.update()
                 .where(financial_data.id == id)
                 .values(**data, updated_at=datetime.now())
             )
-            return result.rowcount > 0
+            resolver_contas_registro(conn, id)
+            somar_registro_fatos(conn, id, anterior)
+        
+        if result.rowcount > 0:
+            agendar_atualizacao_views("update financial_data")
+        return result.rowcount > 0
     
     async def delete_financial_data(self, id: int) -> bool:
         """Remove dado financeiro"""
         
-        with self.db.connect() as conn:
+        with self.db.connect() as conn, conn.begin():
+            anterior = retirar_registro_fatos(conn, id)
             result = conn.execute(
                 financial_data.delete().where(financial_data.id == id)
             )
-            return result.rowcount > 0
+            somar_registro_fatos(conn, id, anterior)
+        
+        if result.rowcount > 0:
+            agendar_atualizacao_views("delete financial_data")
+        return result.rowcount > 0
     
     async def get_summary_by_type(
         self,
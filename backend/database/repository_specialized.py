@@ -4,12 +4,12 @@ Repository especializado para dados financeiros com base na estrutura real da fi
 from datetime import date, datetime
 from typing import List, Dict, Optional, Any
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, or_, text
 import pandas as pd
 
 from database.connection_sqlalchemy import DatabaseSession
+from database.monthly_facts import exigir_tabela_fatos, BASE_CAIXA, BASE_COMPETENCIA
 from database.schema_sqlalchemy import (
-    FinancialData, 
     DFCStructureN1, DFCStructureN2, DFCClassification,
     DREStructureN1, DREStructureN2, DREClassification
 )
@@ -25,31 +25,21 @@ class SpecializedFinancialRepository:
         """Busca dados DFC estruturados conforme a versão Excel"""
         
         with DatabaseSession() as session:
-            # Buscar dados financeiros DFC
-            query = session.query(FinancialData).filter(
-                FinancialData.dfc_n1.isnot(None),
-                FinancialData.dfc_n2.isnot(None)
+            # Somas mensais DFC (base caixa) da tabela de fatos
+            financial_data = self._consultar_fatos(
+                session, BASE_CAIXA, start_date=start_date, end_date=end_date, com_contas=True
             )
             
-            if start_date:
-                query = query.filter(FinancialData.data >= start_date)
-            if end_date:
-                query = query.filter(FinancialData.data <= end_date)
-            
-            financial_data = query.all()
-            
             if not financial_data:
                 return self._empty_dfc_response()
             
             # Converter para DataFrame para processamento
             df = pd.DataFrame([{
-                'id': item.id,
-                'nome': item.nome,
                 'classificacao': item.classificacao,
                 'data': item.data,
-                'valor': float(item.valor) if item.valor else 0.0,
-                'dfc_n1': item.dfc_n1,
-                'dfc_n2': item.dfc_n2,
+                'valor': float(item.valor),
+                'dfc_n1': item.conta_n1,
+                'dfc_n2': item.conta_n2,
                 'origem': item.origem
             } for item in financial_data])
             
@@ -64,7 +54,7 @@ class SpecializedFinancialRepository:
             trimestres = sorted(df['trimestre'].unique())
             
             # Separar realizado e orçamento
-            df_real = df[df['origem'] != 'ORC'].copy()
+            df_real = self._indexar_rotulos(df[df['origem'] != 'ORC'].copy(), 'dfc_n1', 'dfc_n2')
             df_orc = df[df['origem'] == 'ORC'].copy()
             
             # Buscar estruturas DFC do banco
@@ -144,31 +134,21 @@ class SpecializedFinancialRepository:
         """Busca dados DRE estruturados conforme a versão Excel"""
         
         with DatabaseSession() as session:
-            # Buscar dados financeiros DRE
-            query = session.query(FinancialData).filter(
-                FinancialData.dre_n1.isnot(None),
-                FinancialData.dre_n2.isnot(None)
+            # Somas mensais DRE (base competência) da tabela de fatos
+            financial_data = self._consultar_fatos(
+                session, BASE_COMPETENCIA, start_date=start_date, end_date=end_date, com_contas=True
             )
             
-            if start_date:
-                query = query.filter(FinancialData.competencia >= start_date)
-            if end_date:
-                query = query.filter(FinancialData.competencia <= end_date)
-            
-            financial_data = query.all()
-            
             if not financial_data:
                 return self._empty_dre_response()
             
             # Converter para DataFrame para processamento
             df = pd.DataFrame([{
-                'id': item.id,
-                'nome': item.nome,
                 'classificacao': item.classificacao,
-                'competencia': item.competencia,
-                'valor_original': float(item.valor_original) if item.valor_original else 0.0,
-                'dre_n1': item.dre_n1,
-                'dre_n2': item.dre_n2,
+                'competencia': item.data,
+                'valor_original': float(item.valor),
+                'dre_n1': item.conta_n1,
+                'dre_n2': item.conta_n2,
                 'origem': item.origem
             } for item in financial_data])
             
@@ -183,7 +163,7 @@ class SpecializedFinancialRepository:
             trimestres = sorted(df['trimestre'].unique())
             
             # Separar realizado e orçamento
-            df_real = df[df['origem'] != 'ORC'].copy()
+            df_real = self._indexar_rotulos(df[df['origem'] != 'ORC'].copy(), 'dre_n1', 'dre_n2')
             df_orc = df[df['origem'] == 'ORC'].copy()
             
             # Buscar estruturas DRE do banco
@@ -242,20 +222,8 @@ class SpecializedFinancialRepository:
         """Busca dados de contas a receber baseado na origem CAR (como na versão Excel)"""
         
         with DatabaseSession() as session:
-            # Filtrar por origem CAR (Contas a Receber)
-            query = session.query(FinancialData).filter(
-                FinancialData.origem == 'CAR'
-            )
-            
-            if mes:
-                # Filtrar por mês específico usando a data principal
-                year, month = map(int, mes.split('-'))
-                query = query.filter(
-                    func.extract('year', FinancialData.data) == year,
-                    func.extract('month', FinancialData.data) == month
-                )
-            
-            data = query.all()
+            # Somas mensais da origem CAR (Contas a Receber), pela data principal
+            data = self._consultar_fatos(session, BASE_CAIXA, origem='CAR', mes=mes)
             
             if not data:
                 return {"success": True, "data": {"saldo_total": 0, "mom_analysis": [], "meses_disponiveis": [], "pmr": "30 dias"}}
@@ -285,20 +253,8 @@ class SpecializedFinancialRepository:
         """Busca dados de contas a pagar baseado na origem CAP (como na versão Excel)"""
         
         with DatabaseSession() as session:
-            # Filtrar por origem CAP (Contas a Pagar)
-            query = session.query(FinancialData).filter(
-                FinancialData.origem == 'CAP'
-            )
-            
-            if mes:
-                # Filtrar por mês específico usando a data principal
-                year, month = map(int, mes.split('-'))
-                query = query.filter(
-                    func.extract('year', FinancialData.data) == year,
-                    func.extract('month', FinancialData.data) == month
-                )
-            
-            data = query.all()
+            # Somas mensais da origem CAP (Contas a Pagar), pela data principal
+            data = self._consultar_fatos(session, BASE_CAIXA, origem='CAP', mes=mes)
             
             if not data:
                 return {"success": True, "data": {"saldo_total": 0, "mom_analysis": [], "meses_disponiveis": [], "pmp": "30 dias"}}
@@ -323,6 +279,48 @@ class SpecializedFinancialRepository:
     
     # === MÉTODOS AUXILIARES ===
     
+    def _consultar_fatos(
+        self,
+        session,
+        base: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        origem: Optional[str] = None,
+        mes: Optional[str] = None,
+        com_contas: bool = False
+    ) -> List[Any]:
+        """Linhas de financial_data_mensal: conta_n1, conta_n2, classificacao, data (mês), origem, valor
+        
+        valor é a soma do mês (realizado ou orçamento, conforme a origem). Os
+        filtros de data valem por mês; mes no formato YYYY-MM. Antes da criação
+        da tabela, TabelaFatosIndisponivel.
+        """
+        exigir_tabela_fatos(session)
+        filtros = ["base = :base"]
+        parametros: Dict[str, Any] = {"base": base}
+        if com_contas:
+            filtros.append("conta_n1 <> '' AND conta_n2 <> ''")
+        if start_date:
+            filtros.append("mes >= date_trunc('month', CAST(:start_date AS date))")
+            parametros["start_date"] = start_date
+        if end_date:
+            filtros.append("mes <= :end_date")
+            parametros["end_date"] = end_date
+        if origem:
+            filtros.append("origem = :origem")
+            parametros["origem"] = origem
+        if mes:
+            year, month = map(int, mes.split('-'))
+            filtros.append("mes = :mes")
+            parametros["mes"] = date(year, month, 1)
+        
+        return session.execute(text(f"""
+            SELECT conta_n1, conta_n2, classificacao, mes AS data, origem,
+                   valor_real + valor_orcamento AS valor
+            FROM financial_data_mensal
+            WHERE {' AND '.join(filtros)}
+        """), parametros).fetchall()
+    
     def _empty_dfc_response(self):
         return {"success": True, "meses": [], "trimestres": [], "anos": [], "data": []}
     
@@ -358,34 +356,38 @@ class SpecializedFinancialRepository:
             "horizontal_anuais": {str(ano): "–" for ano in anos}
         }
     
+    def _indexar_rotulos(self, df: pd.DataFrame, *colunas: str) -> pd.DataFrame:
+        """Adiciona <coluna>_id com o id do nome limpo de cada rótulo (cada rótulo distinto interpretado uma vez)"""
+        from helpers.structure_helper import rotulos_contas
+        
+        for coluna in colunas:
+            df[f'{coluna}_id'] = rotulos_contas.ids(df[coluna], lambda x: str(x) if x else '')
+        return df
+    
     def _match_dfc_data(self, df: pd.DataFrame, dfc_n1_name: str, dfc_n2_name: str) -> pd.DataFrame:
         """Encontra dados que correspondem aos nomes DFC N1 e N2 baseado na estrutura Excel"""
-        from helpers.structure_helper import extrair_nome_conta
+        from helpers.structure_helper import rotulos_contas
         
-        # Extrair nomes limpos dos dados
-        df_copy = df.copy()
-        df_copy['dfc_n1_clean'] = df_copy['dfc_n1'].apply(lambda x: extrair_nome_conta(str(x)) if x else '')
-        df_copy['dfc_n2_clean'] = df_copy['dfc_n2'].apply(lambda x: extrair_nome_conta(str(x)) if x else '')
+        if 'dfc_n1_id' not in df.columns:
+            df = self._indexar_rotulos(df.copy(), 'dfc_n1', 'dfc_n2')
         
-        # Match exato com nomes limpos
-        return df_copy[
-            (df_copy['dfc_n1_clean'].str.lower() == dfc_n1_name.lower()) &
-            (df_copy['dfc_n2_clean'].str.lower() == dfc_n2_name.lower())
+        # Match exato com nomes limpos (comparando ids do dicionário de rótulos)
+        return df[
+            (df['dfc_n1_id'].values == rotulos_contas.id_nome(dfc_n1_name)) &
+            (df['dfc_n2_id'].values == rotulos_contas.id_nome(dfc_n2_name))
         ]
     
     def _match_dre_data(self, df: pd.DataFrame, dre_n1_name: str, dre_n2_name: str) -> pd.DataFrame:
         """Encontra dados que correspondem aos nomes DRE N1 e N2 baseado na estrutura Excel"""
-        from helpers.structure_helper import extrair_nome_conta
+        from helpers.structure_helper import rotulos_contas
         
-        # Extrair nomes limpos dos dados
-        df_copy = df.copy()
-        df_copy['dre_n1_clean'] = df_copy['dre_n1'].apply(lambda x: extrair_nome_conta(str(x)) if x else '')
-        df_copy['dre_n2_clean'] = df_copy['dre_n2'].apply(lambda x: extrair_nome_conta(str(x)) if x else '')
+        if 'dre_n1_id' not in df.columns:
+            df = self._indexar_rotulos(df.copy(), 'dre_n1', 'dre_n2')
         
-        # Match exato com nomes limpos
-        return df_copy[
-            (df_copy['dre_n1_clean'].str.lower() == dre_n1_name.lower()) &
-            (df_copy['dre_n2_clean'].str.lower() == dre_n2_name.lower())
+        # Match exato com nomes limpos (comparando ids do dicionário de rótulos)
+        return df[
+            (df['dre_n1_id'].values == rotulos_contas.id_nome(dre_n1_name)) &
+            (df['dre_n2_id'].values == rotulos_contas.id_nome(dre_n2_name))
         ]
     
     def _calculate_periods(self, item: Dict, df: pd.DataFrame, meses: List[str], trimestres: List[str], anos: List[int], operation_type: str):
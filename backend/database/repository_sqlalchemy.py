@@ -5,9 +5,12 @@ from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Dict, Optional, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, text
 from database.connection_sqlalchemy import DatabaseSession
 from database.schema_sqlalchemy import FinancialData, Category, Period, User, Role, Permission, UserRole, RolePermission
+from database.account_ids import resolver_contas_registro
+from database.monthly_facts import retirar_registro_fatos, somar_registro_fatos, exigir_tabela_fatos, BASE_CAIXA, BASE_COMPETENCIA
+from helpers_postgresql.dre.materialized_view_helper import agendar_atualizacao_views
 
 class FinancialDataRepository:
     """Repository para operações com dados financeiros"""
@@ -83,6 +86,79 @@ class FinancialDataRepository:
                 for item in results
             ]
     
+    def get_monthly_financial_data(
+        self,
+        base: str = BASE_CAIXA,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        incluir_descartados: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Dados mensais agregados (financial_data_mensal) no formato de get_financial_data
+
+        base 'caixa' (data/valor, DFC) ou 'competencia' (competencia/valor_original, DRE).
+        Cada célula (conta, classificação, mês, origem) vira até dois registros,
+        'receita' com a soma das entradas e 'despesa' com a das saídas, para os
+        cálculos que separam receitas e despesas por 'type'. Os filtros de data
+        valem por mês. Sem incluir_descartados, ficam de fora os dados fictícios
+        e as duplicatas exatas (ver database/monthly_facts.py). Antes da criação
+        da tabela, TabelaFatosIndisponivel.
+        """
+        filtros = ["base = :base"]
+        parametros: Dict[str, Any] = {"base": base}
+        if not incluir_descartados:
+            filtros.append("NOT descartado")
+        if start_date:
+            filtros.append("mes >= date_trunc('month', CAST(:start_date AS date))")
+            parametros["start_date"] = start_date
+        if end_date:
+            filtros.append("mes <= :end_date")
+            parametros["end_date"] = end_date
+        
+        with DatabaseSession() as session:
+            exigir_tabela_fatos(session)
+            rows = session.execute(text(f"""
+                SELECT empresa_id, conta_n1, conta_n2, classificacao, mes, origem, entradas, saidas, quantidade
+                FROM financial_data_mensal
+                WHERE {' AND '.join(filtros)}
+                ORDER BY mes
+            """), parametros).fetchall()
+        
+        prefixo = "dre" if base == BASE_COMPETENCIA else "dfc"
+        agora = datetime.now()
+        registros = []
+        for row in rows:
+            for tipo, valor in (('receita', row.entradas), ('despesa', row.saidas)):
+                if not valor:
+                    continue
+                valor = float(valor)
+                registro = {
+                    'id': None,
+                    'origem': row.origem or None,
+                    'empresa_id': row.empresa_id or None,
+                    'classificacao': row.classificacao or None,
+                    f'{prefixo}_n1': row.conta_n1 or None,
+                    f'{prefixo}_n2': row.conta_n2 or None,
+                    'quantidade': row.quantidade,
+                    
+                    # Mesmas chaves de compatibilidade de get_financial_data
+                    'category': row.conta_n1 or None,
+                    'subcategory': row.conta_n2 or None,
+                    'description': row.classificacao or None,
+                    'value': valor,
+                    'type': tipo,
+                    'date': row.mes,
+                    'source': row.origem or None,
+                    'is_budget': row.origem == 'ORC',
+                    'created_at': agora,
+                    'updated_at': agora
+                }
+                if base == BASE_COMPETENCIA:
+                    registro.update({'competencia': row.mes, 'valor_original': valor})
+                else:
+                    registro.update({'data': row.mes, 'valor': valor})
+                registros.append(registro)
+        return registros
+    
     def get_data_by_period(
         self,
         period_type: str,
@@ -134,7 +210,14 @@ class FinancialDataRepository:
             financial_data = FinancialData(**data)
             session.add(financial_data)
             session.flush()  # Para obter o ID
-            return financial_data.id
+            novo_id = financial_data.id
+            # Ids de conta resolvidos e tabela de fatos mensais mantida na mesma transação
+            resolver_contas_registro(session.connection(), novo_id)
+            somar_registro_fatos(session.connection(), novo_id)
+        
+        # Views materializadas atualizadas (com debounce) após o commit
+        agendar_atualizacao_views("insert financial_data")
+        return novo_id
     
     def update_financial_data(self, id: int, data: Dict[str, Any]) -> bool:
         """Atualiza dado financeiro"""
@@ -144,11 +227,18 @@ class FinancialDataRepository:
             if not financial_data:
                 return False
             
+            # Retira a contribuição antiga do registro e soma a nova após o flush
+            anterior = retirar_registro_fatos(session.connection(), id)
             for key, value in data.items():
                 setattr(financial_data, key, value)
             
             financial_data.updated_at = datetime.now()
-            return True
+            session.flush()
+            resolver_contas_registro(session.connection(), id)
+            somar_registro_fatos(session.connection(), id, anterior)
+        
+        agendar_atualizacao_views("update financial_data")
+        return True
     
     def delete_financial_data(self, id: int) -> bool:
         """Remove dado financeiro"""
@@ -158,8 +248,13 @@ class FinancialDataRepository:
             if not financial_data:
                 return False
             
+            anterior = retirar_registro_fatos(session.connection(), id)
             session.delete(financial_data)
-            return True
+            session.flush()
+            somar_registro_fatos(session.connection(), id, anterior)
+        
+        agendar_atualizacao_views("delete financial_data")
+        return True
     
     def get_summary_by_type(
         self,
@@ -1,149 +1,245 @@
 from fastapi import APIRouter, Request
-from helpers.cache_helper import get_cached_df
-from helpers.structure_helper import carregar_estrutura_dre_simplificada, extrair_nome_conta, verificar_correspondencia_dados_estrutura, normalizar_nomes_contas
-from helpers.data_processor import processar_dados_financeiros, separar_realizado_orcamento, calcular_totais_por_periodo
-from helpers.analysis_helper import calcular_analises_completas
-from helpers.dre_helper import criar_linha_dre_simplificada, get_classificacoes_dre, calcular_totalizadores_dre, identificar_custos_despesas_dinamicamente
-import pandas as pd
+from helpers.workbook_store import get_workbook_store, resolver_workbook
+from helpers.report_pool import executar_relatorio
+from helpers.structure_helper import extrair_nome_conta, verificar_correspondencia_dados_estrutura, normalizar_nomes_contas
+from helpers.data_processor import (
+    separar_realizado_orcamento, rotulo_mes, validar_intervalo_meses, filtrar_granularidade,
+    validar_campos, filtrar_campos
+)
+from helpers.cube_helper import montar_cubo, montar_indice_classificacoes, ORCADO
+from helpers.analysis_helper import formato_numerico
+from helpers.dre_helper import criar_linhas_dre_simplificadas, get_classificacoes_dre, calcular_totalizadores_dre, identificar_custos_despesas_dinamicamente
+import numpy as np
 
 router = APIRouter()
 
-@router.get("/dre")
-def get_dre_data(request: Request):
-    filename = "db_bluefit - Copia.xlsx"
-
+def _montar_base_dre(df, estrutura_dre, normalizacao):
+    """Cubo e índice de classificações da DRE no intervalo completo da planilha
+
+    Montados uma vez por versão da planilha; cada requisição apenas recorta os
+    meses pedidos. df é a base com períodos já calculados e normalizacao o
+    IndiceNormalizacao da estrutura. Retorna None quando não há dados realizados.
+    """
+    # Separar realizado e orçamento
+    df_real, df_orc = separar_realizado_orcamento(df, "origem")
+
+    if df_real.empty:
+        return None
+
+    # Verificar se há dados orçamentários - se não houver, criar estrutura vazia
+    if df_orc.empty:
+        # Criar DataFrame vazio com a mesma estrutura
+        df_orc = df_real.copy()
+        df_orc["valor_original"] = 0.0
+        df_orc["origem"] = "ORC"
+
+    # Verificar e normalizar correspondência
+    stats_inicial = verificar_correspondencia_dados_estrutura(df_real, estrutura_dre, 'dre_n2', 'DRE')
+
+    # Tentar normalizar nomes se necessário
+    if not stats_inicial["correspondencia_perfeita"]:
+        df_real = normalizar_nomes_contas(df_real, 'dre_n2', estrutura_dre, normalizacao)
+        df_orc = normalizar_nomes_contas(df_orc, 'dre_n2', estrutura_dre, normalizacao)
+
+    # Cubo conta × mês × cenário e índice (dre_n2, classificação, mês, cenário)
+    nomes_estrutura = [item["nome"] for item in estrutura_dre]
+    return {
+        "cubo": montar_cubo(df_real, df_orc, "dre_n2", "valor_original", nomes_estrutura),
+        "indice_classificacoes": montar_indice_classificacoes(
+            df_real, df_orc, "dre_n2", "classificacao", "valor_original"
+        ),
+        "meses_realizado": [rotulo_mes(int(c)) for c in np.unique(df_real["periodo_mes"])],
+    }
+
+def _expandir(expand, estrutura_dre):
+    """Nomes das contas cujas classificações vão na resposta (expand=none|all|conta1,conta2)
+
+    Retorna (nomes, erro). Sem expand, todas as contas expansíveis (comportamento
+    anterior); as demais são buscadas sob demanda em /dre/classificacoes/{conta}.
+    """
+    expansiveis = {item["nome"] for item in estrutura_dre if item["expandivel"]}
+    if expand is None or expand.strip().lower() in ("", "all"):
+        return expansiveis, None
+    if expand.strip().lower() == "none":
+        return set(), None
+    nomes = {nome.strip() for nome in expand.split(",") if nome.strip()}
+    desconhecidas = sorted(nomes - expansiveis)
+    if desconhecidas:
+        return None, f"Contas não expansíveis na DRE: {', '.join(desconhecidas)}"
+    return nomes, None
+
+def _preparar_dre(parametros):
+    """Snapshot, estrutura, recorte e campos pedidos comuns a /dre e /dre/classificacoes
+
+    parametros é o dict da query. Retorna (contexto, erro): erro é a mensagem a
+    devolver em {"error": ...}. A planilha é a do cliente (ou grupo) da query;
+    sem ele, a padrão.
+    """
+    filename, erro = resolver_workbook(parametros.get("cliente"), parametros.get("grupo"))
+    if erro:
+        return None, erro
+
+    snapshot = get_workbook_store(filename).get_snapshot()
+    df = snapshot.base if snapshot is not None else None
+    if df is None:
+        return None, "Erro ao ler o arquivo Excel."
+
+    # Estrutura DRE simplificada (montada uma vez por versão da planilha)
+    estrutura_dre = snapshot.estrutura_dre
+    if not estrutura_dre:
+        return None, "Não foi possível carregar a estrutura DRE da planilha"
+
+    # Validação das colunas obrigatórias
+    required_columns = ["dre_n2", "valor_original", "classificacao", "origem", "competencia"]
+    if not all(col in df.columns for col in required_columns):
+        return None, f"A planilha deve conter as colunas: {', '.join(required_columns)}"
+
+    date_column = next((col for col in df.columns if col.lower() == "competencia"), None)
+    if not date_column:
+        return None, "Coluna de competência não encontrada"
+
+    # Intervalo de meses (start/end, ou mes para um único mês) e granularity
+    mes_param = parametros.get("mes")
+    inicio = parametros.get("start") or mes_param
+    fim = parametros.get("end") or mes_param
+    granularidade = parametros.get("granularity")
+    erro = validar_intervalo_meses(inicio, fim, granularidade)
+    if erro:
+        return None, erro
+
+    # fields: famílias de campos calculadas e serializadas (valores, orcamentos, análises)
+    campos, erro = validar_campos(parametros.get("fields"))
+    if erro:
+        return None, erro
+
+    # Base com períodos já calculados (uma vez por versão da planilha)
+    df, _, _, _ = snapshot.base_periodos(date_column, "valor_original")
+
+    # Cubo e índice do intervalo completo (uma vez por versão da planilha)
+    base = snapshot.derivado(
+        ("base_dre", date_column), lambda: _montar_base_dre(df, estrutura_dre, snapshot.normalizacao_dre)
+    )
+    if base is None or not any(
+        (inicio is None or mes >= inicio) and (fim is None or mes <= fim) for mes in base["meses_realizado"]
+    ):
+        return None, "Não foram encontrados dados realizados na planilha"
+
+    # Recorte dos meses pedidos: trimestres, anos e totais refeitos a partir deles
+    cubo = base["cubo"].fatiar(inicio, fim)
+    return {
+        "snapshot": snapshot,
+        "estrutura_dre": estrutura_dre,
+        "base": base,
+        "inicio": inicio,
+        "fim": fim,
+        "granularidade": granularidade,
+        "campos": campos,
+        "cubo": cubo,
+        "base_vertical": cubo.total_conta("Faturamento"),
+        # format=numeric: análises como números (null quando não se aplicam)
+        "numerico": formato_numerico(parametros.get("format")),
+    }, None
+
+def montar_dre(parametros):
+    """Monta a DRE para os parâmetros da query: (versão da planilha, payload)
+
+    Roda nos workers do pool de relatórios (helpers/report_pool.py).
+    """
     try:
-        df = get_cached_df(filename)
-        if df is None:
-            return {"error": "Erro ao ler o arquivo Excel."}
+        contexto, erro = _preparar_dre(parametros)
+        if erro:
+            return None, {"error": erro}
 
-        # Carregar estrutura DRE simplificada
-        estrutura_dre = carregar_estrutura_dre_simplificada(filename)
-        if not estrutura_dre:
-            return {"error": "Não foi possível carregar a estrutura DRE da planilha"}
+        estrutura_dre = contexto["estrutura_dre"]
+        cubo = contexto["cubo"]
+        base_vertical = contexto["base_vertical"]
+        numerico = contexto["numerico"]
+        campos = contexto["campos"]
+
+        # expand: contas com classificações já na resposta
+        expandidas, erro = _expandir(parametros.get("expand"), estrutura_dre)
+        if erro:
+            return None, {"error": erro}
 
         # Identificar custos e despesas dinamicamente
         custos, despesas = identificar_custos_despesas_dinamicamente(estrutura_dre)
 
-        # Filtro por mês, se fornecido na query string
-        mes_param = request.query_params.get("mes")
-        if mes_param:
-            # Garante que a coluna mes_ano existe antes de filtrar
-            date_column = next((col for col in df.columns if col.lower() == "competencia"), None)
-            if date_column:
-                df[date_column] = pd.to_datetime(df[date_column], errors="coerce")
-                df["mes_ano"] = df[date_column].dt.to_period("M").astype(str)
-                df = df[df["mes_ano"] == mes_param]
-            else:
-                return {"error": "Coluna de competência não encontrada para filtro de mês."}
-
-        # Validação das colunas obrigatórias
-        required_columns = ["dre_n2", "valor_original", "classificacao", "origem", "competencia"]
-        if not all(col in df.columns for col in required_columns):
-            return {"error": f"A planilha deve conter as colunas: {', '.join(required_columns)}"}
-
-        date_column = next((col for col in df.columns if col.lower() == "competencia"), None)
-        if not date_column:
-            return {"error": "Coluna de competência não encontrada"}
-
-        # Processar dados financeiros
-        df, meses_unicos, anos_unicos, trimestres_unicos = processar_dados_financeiros(df, date_column, "valor_original")
-
-        # Separar realizado e orçamento
-        df_real, df_orc = separar_realizado_orcamento(df, "origem")
-
-        if df_real.empty:
-            return {"error": "Não foram encontrados dados realizados na planilha"}
-        
-        # Verificar se há dados orçamentários - se não houver, criar estrutura vazia
-        if df_orc.empty:
-            # Criar DataFrame vazio com a mesma estrutura
-            df_orc = df_real.copy()
-            df_orc["valor_original"] = 0.0
-            df_orc["origem"] = "ORC"
-
-        # Calcular totais por período
-        totais = calcular_totais_por_periodo(df_real, df_orc, meses_unicos, trimestres_unicos, anos_unicos, "dre_n2", "valor_original")
-
-        # Verificar e normalizar correspondência
-        stats_inicial = verificar_correspondencia_dados_estrutura(df_real, estrutura_dre, 'dre_n2', 'DRE')
-        
-        # Tentar normalizar nomes se necessário
-        if not stats_inicial["correspondencia_perfeita"]:
-            df_real = normalizar_nomes_contas(df_real, 'dre_n2', estrutura_dre)
-            df_orc = normalizar_nomes_contas(df_orc, 'dre_n2', estrutura_dre)
-            
-            # Recarregar totais após normalização
-            totais = calcular_totais_por_periodo(df_real, df_orc, meses_unicos, trimestres_unicos, anos_unicos, "dre_n2", "valor_original")
-
-        # Preparar dados por período
-        valores_mensais = {
-            mes: {nome: totais['total_real_por_mes'].get(mes, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for mes in meses_unicos
-        }
-        orcamentos_mensais = {
-            mes: {nome: totais['total_orc_por_mes'].get(mes, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for mes in meses_unicos
-        }
-
-        valores_trimestrais = {
-            tri: {nome: totais['total_real_por_tri'].get(tri, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for tri in trimestres_unicos
-        }
-        orcamentos_trimestrais = {
-            tri: {nome: totais['total_orc_por_tri'].get(tri, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for tri in trimestres_unicos
-        }
-
-        valores_anuais = {
-            str(ano): {nome: totais['total_real_por_ano'].get(ano, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for ano in anos_unicos
-        }
-        orcamentos_anuais = {
-            str(ano): {nome: totais['total_orc_por_ano'].get(ano, {}).get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-            for ano in anos_unicos
-        }
-
-        valores_totais = {nome: totais['total_geral_real'].get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-        orcamentos_totais = {nome: totais['total_geral_orc'].get(nome, 0.0) for nome in [item["nome"] for item in estrutura_dre]}
-
-        # Calcular totalizadores dinamicamente
-        totalizadores = calcular_totalizadores_dre(
-            estrutura_dre, valores_mensais, valores_trimestrais, valores_anuais,
-            orcamentos_mensais, orcamentos_trimestrais, orcamentos_anuais,
-            valores_totais, orcamentos_totais, meses_unicos, trimestres_unicos, anos_unicos
+        meses_unicos, trimestres_unicos, anos_unicos = cubo.meses, cubo.trimestres, cubo.anos
+        nomes_estrutura = [item["nome"] for item in estrutura_dre]
+
+        # Totalizadores: fórmula da estrutura compilada uma vez por versão da planilha
+        totalizadores = calcular_totalizadores_dre(estrutura_dre, cubo, contexto["snapshot"].formula_dre)
+
+        # O índice de classificações só é recortado quando alguma conta é expandida
+        indice_classificacoes = (
+            contexto["base"]["indice_classificacoes"].fatiar(contexto["inicio"], contexto["fim"])
+            if expandidas else None
         )
 
         def get_classificacoes(dre_n2_name):
-            return get_classificacoes_dre(
-                df_real, df_orc, dre_n2_name, meses_unicos, trimestres_unicos, anos_unicos,
-                valores_mensais, valores_trimestrais, valores_anuais, totais['total_geral_real'], totais['total_geral_orc']
-            )
+            if dre_n2_name not in expandidas:
+                return []
+            return get_classificacoes_dre(indice_classificacoes, dre_n2_name, base_vertical, numerico, campos)
 
         # Criar estrutura simplificada
-        result = []
-        
-        for item_estrutura in estrutura_dre:
-            linha_dre = criar_linha_dre_simplificada(
-                item_estrutura, valores_mensais, valores_trimestrais, valores_anuais,
-                orcamentos_mensais, orcamentos_trimestrais, orcamentos_anuais,
-                valores_totais, orcamentos_totais, meses_unicos, trimestres_unicos, anos_unicos,
-                get_classificacoes, totalizadores
-            )
-            result.append(linha_dre)
-
-        return {
+        result = criar_linhas_dre_simplificadas(
+            estrutura_dre, cubo, totalizadores, get_classificacoes, base_vertical, numerico, campos
+        )
+
+        orcamentos = cubo.por_periodo(ORCADO, nomes_estrutura)
+
+        return contexto["snapshot"].versao, filtrar_granularidade(filtrar_campos({
             "meses": meses_unicos,
             "trimestres": trimestres_unicos,
             "anos": anos_unicos,
             "data": result,
-            "orcamentos_mensais": orcamentos_mensais,
-            "orcamentos_trimestrais": orcamentos_trimestrais,
-            "orcamentos_anuais": orcamentos_anuais,
-            "orcamento_total": orcamentos_totais,
+            "orcamentos_mensais": orcamentos["mensais"],
+            "orcamentos_trimestrais": orcamentos["trimestrais"],
+            "orcamentos_anuais": orcamentos["anuais"],
+            "orcamento_total": orcamentos["total"],
             "custos": custos,
             "despesas": despesas
-        }
+        }, campos), contexto["granularidade"])
 
     except Exception as e:
-        return {"error": f"Erro ao processar a DRE: {str(e)}"}
\ No newline at end of file
+        return None, {"error": f"Erro ao processar a DRE: {str(e)}"}
+
+@router.get("/dre")
+async def get_dre_data(request: Request):
+    return await executar_relatorio(montar_dre, dict(request.query_params))
+
+def montar_dre_classificacoes(conta, parametros):
+    """Classificações de uma conta da DRE: (versão da planilha, payload), nos workers do pool"""
+    try:
+        contexto, erro = _preparar_dre(parametros)
+        if erro:
+            return None, {"error": erro}
+
+        if not any(item["nome"] == conta and item["expandivel"] for item in contexto["estrutura_dre"]):
+            return None, {"error": f"Conta não expansível na DRE: {conta}"}
+
+        cubo = contexto["cubo"]
+        indice_classificacoes = contexto["base"]["indice_classificacoes"].fatiar(contexto["inicio"], contexto["fim"])
+
+        return contexto["snapshot"].versao, filtrar_granularidade({
+            "conta": conta,
+            "meses": cubo.meses,
+            "trimestres": cubo.trimestres,
+            "anos": cubo.anos,
+            "classificacoes": get_classificacoes_dre(
+                indice_classificacoes, conta, contexto["base_vertical"], contexto["numerico"], contexto["campos"]
+            ),
+        }, contexto["granularidade"])
+
+    except Exception as e:
+        return None, {"error": f"Erro ao processar as classificações da DRE: {str(e)}"}
+
+@router.get("/dre/classificacoes/{conta:path}")
+async def get_dre_classificacoes(conta: str, request: Request):
+    """Classificações de uma conta expansível da DRE, para expandir a linha sob demanda
+
+    conta vai no caminho e pode conter "/" ("Receitas / Despesas não operacionais").
+    Aceita os mesmos cliente/grupo/mes/start/end/granularity/format/fields de /dre e devolve as
+    classificações exatamente como viriam em /dre?expand=<conta>.
+    """
+    return await executar_relatorio(montar_dre_classificacoes, conta, dict(request.query_params))
@@ -5,10 +5,13 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import Dict, Any, List, Optional
 from sqlalchemy import text
 from database.connection_sqlalchemy import get_engine
+from database.monthly_facts import TabelaFatosIndisponivel
 from helpers_postgresql.dre import (
     DreN0Helper, ClassificacoesHelper, PaginationHelper, 
-    DebugHelper, PerformanceHelper, get_cache
+    DebugHelper, PerformanceHelper, get_cache, formato_numerico_postgresql
 )
+from helpers_postgresql.dre.materialized_view_helper import dre_n0_view
+from helpers.data_processor import validar_campos, filtrar_campos
 import json
 import time
 import asyncio
@@ -21,11 +24,17 @@ async def get_dre_n0(
     page_size: int = Query(50, ge=10, le=200, description="Itens por página"),
     include_all: bool = Query(False, description="Incluir todos os itens (ignora paginação)"),
     empresa_id: Optional[str] = Query(None, description="ID da empresa para filtrar dados (pode ser múltiplo separado por vírgula)"),
-    grupo_empresa_id: Optional[str] = Query(None, description="ID do grupo empresarial para filtrar dados")
+    grupo_empresa_id: Optional[str] = Query(None, description="ID do grupo empresarial para filtrar dados"),
+    formato: Optional[str] = Query(None, alias="format", description="'numeric' retorna análises como números (null quando não se aplicam)"),
+    fields: Optional[str] = Query(None, description="Famílias de campos separadas por vírgula (valores, orcamentos, horizontal, vertical...)")
 ):
     """Retorna dados da DRE Nível 0 usando a view v_dre_n0_completo com cache Redis e paginação"""
     
     start_time = time.time()
+    numerico = formato_numerico_postgresql(formato)
+    campos, erro = validar_campos(fields)
+    if erro:
+        raise HTTPException(status_code=400, detail=erro)
     
     try:
         # Tentar buscar do cache primeiro (se não for paginação)
@@ -46,6 +55,12 @@ async def get_dre_n0(
             print(f"🏢 Filtrando DRE N0 por empresa_id: {empresa_id}")
             cache_key_parts.append(f"empresa_{empresa_id}")
         
+        if numerico:
+            cache_key_parts.append("numeric")
+        
+        if campos is not None:
+            cache_key_parts.append(f"fields_{'-'.join(sorted(campos))}")
+        
         cache_key = ":".join(cache_key_parts)
             
         cached_result = await cache.get(cache_key)
@@ -63,10 +78,11 @@ async def get_dre_n0(
             view_exists = DreN0Helper.check_view_exists(connection)
             
             if not view_exists:
-                print("🏗️ View DRE N0 não existe, criando...")
+                # Também troca uma view comum pela materializada (ENABLE_MATERIALIZED_VIEWS)
+                print("🏗️ View DRE N0 não existe no formato configurado, criando...")
                 if not DreN0Helper.create_dre_n0_view(connection):
                     raise HTTPException(status_code=500, detail="Erro ao criar view DRE N0")
-                print("✅ View v_dre_n0_completo criada com formato correto dos trimestres")
+                print("✅ View v_dre_n0_completo criada")
             else:
                 print("✅ View DRE N0 já existe, usando view existente")
             
@@ -95,7 +111,7 @@ async def get_dre_n0(
                 }
             
             # Processar dados para o formato esperado pelo frontend
-            dre_items, meses, trimestres, anos = DreN0Helper.process_dre_items(rows)
+            dre_items, meses, trimestres, anos = DreN0Helper.process_dre_items(rows, numerico, campos)
             
             # Aplicar paginação se não for include_all
             dados_paginados, pagination_meta = PaginationHelper.apply_pagination_to_dre_items(
@@ -110,7 +126,7 @@ async def get_dre_n0(
             # Construir resposta
             response_data = {
                 "success": True,
-                "data": dados_paginados,
+                "data": filtrar_campos(dados_paginados, campos),
                 "meses": meses_ordenados,
                 "trimestres": trimestres_ordenados,
                 "anos": anos_ordenados,
@@ -131,6 +147,8 @@ async def get_dre_n0(
             print(f"✅ DRE N0 retornado em {time.time() - start_time:.3f}s")
             return response_data
             
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         print(f"❌ Erro ao buscar DRE N0: {str(e)}")
         raise HTTPException(
@@ -285,7 +303,7 @@ async def get_dre_n0_por_periodo():
 
 @router.get("/recreate-view")
 async def recreate_dre_n0_view():
-    """Força a recriação da view DRE N0 com correções de agregação e invalida cache"""
+    """Força a recriação da view DRE N0 (materializada com ENABLE_MATERIALIZED_VIEWS) e invalida cache"""
     
     try:
         # Invalidar cache antes de recriar view
@@ -295,235 +313,21 @@ async def recreate_dre_n0_view():
         engine = get_engine()
         
         with engine.connect() as connection:
-            print("🔄 Forçando recriação da view DRE N0 com correções de agregação...")
-            
-            # Forçar recriação da view
-            drop_view = text("DROP VIEW IF EXISTS v_dre_n0_completo")
-            connection.execute(drop_view)
-            
-            # Criar view corrigida com agregação correta
-            create_view = text("""
-                CREATE OR REPLACE VIEW v_dre_n0_completo AS
-                WITH dados_limpos AS (
-                    -- Filtrar dados válidos da financial_data
-                    SELECT 
-                        
-                        
-                        fd.competencia,
-                        fd.valor_original,
-                        TO_CHAR(fd.competencia, 'YYYY-MM') as periodo_mensal,
-                        CONCAT(EXTRACT(YEAR FROM fd.competencia), '-Q', EXTRACT(QUARTER FROM fd.competencia)) as periodo_trimestral,
-                        EXTRACT(YEAR FROM fd.competencia)::text as periodo_anual
-                    FROM financial_data fd
-                    WHERE  IS NOT NULL 
-                    AND ::text <> '' 
-                    AND ::text <> 'nan'
-                    AND fd.valor_original IS NOT NULL 
-                    AND fd.competencia IS NOT NULL
-                ),
-                estrutura_n0 AS (
-                    SELECT 
-                        ds0.id as dre_n0_id,
-                        ds0.name as nome_conta,
-                        ds0.operation_type as tipo_operacao,
-                        ds0.order_index as ordem,
-                        CASE 
-                            WHEN ds0.description LIKE 'Conta DRE N0: %' 
-                            THEN SUBSTRING(ds0.description FROM 15)
-                            ELSE ds0.description
-                        END as descricao,
-                        CASE 
-                            WHEN ds0.operation_type = '=' THEN NULL
-                            ELSE ds0.name
-                        END as nome_para_match
-                    FROM dre_structure_n0 ds0
-                    WHERE ds0.is_active = true
-                ),
-                valores_mensais AS (
-                    -- Valores mensais agregados
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_mensal,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        e.nome_para_match IS NOT NULL AND (
-                            (d.dre_n1 = e.nome_para_match)
-                            OR
-                            (d.dre_n2 = e.nome_para_match)
-                        )
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_mensal
-                ),
-                valores_trimestrais AS (
-                    -- Valores trimestrais agregados (soma dos meses)
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_trimestral,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        e.nome_para_match IS NOT NULL AND (
-                            (d.dre_n1 = e.nome_para_match)
-                            OR
-                            (d.dre_n2 = e.nome_para_match)
-                        )
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_trimestral
-                ),
-                valores_anuais AS (
-                    -- Valores anuais agregados (soma dos meses)
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_anual,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        e.nome_para_match IS NOT NULL AND (
-                            (d.dre_n1 = e.nome_para_match)
-                            OR
-                            (d.dre_n2 = e.nome_para_match)
-                        )
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_anual
-                ),
-                valores_agregados AS (
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        
-                        -- Valores mensais
-                        COALESCE(
-                            jsonb_object_agg(
-                                vm.periodo_mensal,
-                                vm.valor_calculado
-                            ) FILTER (WHERE vm.periodo_mensal IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_mensais,
-                        
-                        -- Valores trimestrais
-                        COALESCE(
-                            jsonb_object_agg(
-                                vt.periodo_trimestral,
-                                vt.valor_calculado
-                            ) FILTER (WHERE vt.periodo_trimestral IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_trimestrais,
-                        
-                        -- Valores anuais
-                        COALESCE(
-                            jsonb_object_agg(
-                                va.periodo_anual,
-                                va.valor_calculado
-                            ) FILTER (WHERE va.periodo_anual IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_anuais
-                        
-                    FROM estrutura_n0 e
-                    LEFT JOIN valores_mensais vm ON e.dre_n0_id = vm.dre_n0_id
-                    LEFT JOIN valores_trimestrais vt ON e.dre_n0_id = vt.dre_n0_id
-                    LEFT JOIN valores_anuais va ON e.dre_n0_id = va.dre_n0_id
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao
-                )
-                SELECT 
-                    dre_n0_id,
-                    nome_conta,
-                    tipo_operacao,
-                    ordem,
-                    descricao,
-                    'CAR' as origem,
-                    'BLUEFIT' as empresa,
-                    valores_mensais,
-                    valores_trimestrais,
-                    valores_anuais,
-                    '{}'::jsonb as orcamentos_mensais,
-                    '{}'::jsonb as orcamentos_trimestrais,
-                    '{}'::jsonb as orcamentos_anuais,
-                    0 as orcamento_total,
-                    0 as valor_total,
-                    'v_dre_n0_todos_periodos' as source
-                    
-                FROM valores_agregados
-                
-                UNION ALL
-                
-                -- Adicionar contas totalizadoras com valores vazios
-                SELECT 
-                    ds0.id as dre_n0_id,
-                    ds0.name as nome_conta,
-                    ds0.operation_type as tipo_operacao,
-                    ds0.order_index as ordem,
-                    CASE 
-                        WHEN ds0.description LIKE 'Conta DRE N0: %' 
-                        THEN SUBSTRING(ds0.description FROM 15)
-                        ELSE ds0.description
-                    END as descricao,
-                    'CAR' as origem,
-                    'BLUEFIT' as empresa,
-                    '{}'::jsonb as valores_mensais,
-                    '{}'::jsonb as valores_trimestrais,
-                    '{}'::jsonb as valores_anuais,
-                    '{}'::jsonb as orcamentos_mensais,
-                    '{}'::jsonb as orcamentos_trimestrais,
-                    '{}'::jsonb as orcamentos_anuais,
-                    0 as orcamento_total,
-                    0 as valor_total,
-                    'v_dre_n0_totalizadores' as source
-                FROM dre_structure_n0 ds0
-                WHERE ds0.is_active = true AND ds0.operation_type = '='
-                
-                ORDER BY ordem;
-            """)
+            print("🔄 Forçando recriação da view DRE N0...")
             
-            connection.execute(create_view)
-            connection.commit()
+            if not DreN0Helper.create_dre_n0_view(connection):
+                raise HTTPException(status_code=500, detail="Erro ao recriar view DRE N0")
             
-            print("✅ View v_dre_n0_completo recriada com correções de agregação")
+            print("✅ View v_dre_n0_completo recriada")
             
             return {
                 "success": True,
-                "message": "View DRE N0 recriada com correções de agregação",
-                "correcoes": [
-                    "Valores trimestrais agora são agregados corretamente",
-                    "Valores anuais agora são agregados corretamente",
-                    "Contas DRE N2 agora têm valores corretos para todos os períodos"
-                ]
+                "message": "View DRE N0 recriada",
+                "materialized_view": dre_n0_view.status(connection)
             }
             
+    except (HTTPException, TabelaFatosIndisponivel):
+        raise
     except Exception as e:
         print(f"❌ Erro ao recriar view: {str(e)}")
         raise HTTPException(
@@ -531,6 +335,24 @@ async def recreate_dre_n0_view():
             detail=f"Erro ao recriar view DRE N0: {str(e)}"
         )
 
+@router.get("/materialized-view/status")
+async def get_materialized_view_status():
+    """Status da view materializada: duração do último refresh e defasagem em relação a financial_data"""
+    try:
+        engine = get_engine()
+        with engine.connect() as connection:
+            return {"success": True, **dre_n0_view.status(connection)}
+    except Exception as e:
+        return {"success": False, "error": str(e), **dre_n0_view.status()}
+
+@router.post("/materialized-view/refresh")
+async def refresh_materialized_view():
+    """Atualiza v_dre_n0_completo agora (REFRESH ... CONCURRENTLY), sem esperar o debounce"""
+    if not dre_n0_view.materializada:
+        raise HTTPException(status_code=400, detail="ENABLE_MATERIALIZED_VIEWS desativado")
+    resultado = await asyncio.to_thread(dre_n0_view.atualizar, "endpoint")
+    return {**resultado, "materialized_view": dre_n0_view.status()}
+
 @router.get("/teste-query/{dre_n2_name}")
 async def teste_query_classificacoes(dre_n2_name: str):
     """Testa apenas a query SQL das classificações"""
@@ -613,11 +435,20 @@ async def teste_classificacoes():
 @router.get("/classificacoes/{dre_n2_name}")
 async def get_classificacoes_dre_n2(
     dre_n2_name: str,
-    empresa_id: Optional[str] = Query(None, description="ID da empresa para filtrar dados")
+    empresa_id: Optional[str] = Query(None, description="ID da empresa para filtrar dados"),
+    formato: Optional[str] = Query(None, alias="format", description="'numeric' retorna análises como números (null quando não se aplicam)"),
+    fields: Optional[str] = Query(None, description="Famílias de campos separadas por vírgula (valores, orcamentos, horizontal, vertical...)")
 ):
-    """Retorna as classificações de uma conta DRE N2 específica com cache Redis"""
+    """Retorna as classificações de uma conta DRE N2 específica com cache Redis
+
+    As classificações trazem apenas valores numéricos (sem análises formatadas),
+    então o payload é o mesmo em format=numeric; fields só pode retirar os valores.
+    """
     
     start_time = time.time()
+    campos, erro = validar_campos(fields)
+    if erro:
+        raise HTTPException(status_code=400, detail=erro)
     print(f"🔍 Buscando classificações para: {dre_n2_name}")
     if empresa_id:
         print(f"🏢 Filtrando por empresa_id: {empresa_id}")
@@ -628,6 +459,8 @@ async def get_classificacoes_dre_n2(
         cache_key = f"classificacoes:{dre_n2_name}"
         if empresa_id:
             cache_key += f":empresa_{empresa_id}"
+        if campos is not None:
+            cache_key += f":fields_{'-'.join(sorted(campos))}"
         cached_result = await cache.get(cache_key)
         
         if cached_result:
@@ -669,7 +502,7 @@ async def get_classificacoes_dre_n2(
                 "meses": meses_ordenados,
                 "trimestres": trimestres_ordenados,
                 "anos": anos_ordenados,
-                "data": classificacoes,
+                "data": filtrar_campos(classificacoes, campos),
                 "total_classificacoes": len(classificacoes)
             }
             
@@ -682,6 +515,8 @@ async def get_classificacoes_dre_n2(
                 print(f"🏢 Filtradas por empresa_id: {empresa_id}")
             return response_data
             
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         print(f"❌ Erro: {str(e)}")
         raise HTTPException(
@@ -693,11 +528,18 @@ async def get_classificacoes_dre_n2(
 async def get_nomes_por_classificacao(
     dre_n2_name: str,
     nome_classificacao: str,
-    empresa_id: Optional[str] = Query(None, description="ID da empresa para filtrar dados")
+    empresa_id: Optional[str] = Query(None, description="ID da empresa para filtrar dados"),
+    fields: Optional[str] = Query(None, description="Famílias de campos separadas por vírgula (valores, orcamentos, horizontal, vertical...)")
 ):
-    """Retorna os nomes (lançamentos) de uma classificação específica - NOVO NÍVEL DE EXPANSÃO"""
+    """Retorna os nomes (lançamentos) de uma classificação específica - NOVO NÍVEL DE EXPANSÃO
+
+    Os nomes trazem apenas valores numéricos; fields só pode retirar os valores.
+    """
     
     start_time = time.time()
+    campos, erro = validar_campos(fields)
+    if erro:
+        raise HTTPException(status_code=400, detail=erro)
     print(f"🔍 Buscando nomes para classificação: {nome_classificacao} em DRE N2: {dre_n2_name}")
     if empresa_id:
         print(f"🏢 Filtrando por empresa_id: {empresa_id}")
@@ -708,6 +550,8 @@ async def get_nomes_por_classificacao(
         cache_key = f"nomes:{dre_n2_name}:{nome_classificacao}"
         if empresa_id:
             cache_key += f":empresa_{empresa_id}"
+        if campos is not None:
+            cache_key += f":fields_{'-'.join(sorted(campos))}"
         cached_result = await cache.get(cache_key)
         
         if cached_result:
@@ -751,7 +595,7 @@ async def get_nomes_por_classificacao(
                 "meses": meses_ordenados,
                 "trimestres": trimestres_ordenados,
                 "anos": anos_ordenados,
-                "data": nomes,
+                "data": filtrar_campos(nomes, campos),
                 "total_nomes": len(nomes)
             }
             
@@ -764,6 +608,8 @@ async def get_nomes_por_classificacao(
                 print(f"🏢 Filtradas por empresa_id: {empresa_id}")
             return response_data
             
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         print(f"❌ Erro: {str(e)}")
         raise HTTPException(
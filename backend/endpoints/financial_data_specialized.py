@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 import traceback
 
 from database.repository_specialized import SpecializedFinancialRepository
+from database.monthly_facts import TabelaFatosIndisponivel
 
 router = APIRouter(prefix="/financial-data", tags=["financial-data-specialized"])
 
@@ -48,6 +49,8 @@ async def get_dfc_data(
         
         return result
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         error_msg = f"Erro ao processar DFC: {str(e)}"
         print(f"❌ {error_msg}")
@@ -102,7 +105,7 @@ async def get_dre_data(
         
         return result
         
-    except HTTPException:
+    except (HTTPException, TabelaFatosIndisponivel):
         raise
     except Exception as e:
         error_msg = f"Erro ao processar DRE: {str(e)}"
@@ -133,6 +136,8 @@ async def get_receber_data(
         
         return result
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         error_msg = f"Erro ao processar contas a receber: {str(e)}"
         print(f"❌ {error_msg}")
@@ -162,6 +167,8 @@ async def get_pagar_data(
         
         return result
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         error_msg = f"Erro ao processar contas a pagar: {str(e)}"
         print(f"❌ {error_msg}")
@@ -231,6 +238,8 @@ async def get_specialized_summary(
             "data": summary
         }
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         error_msg = f"Erro ao processar resumo especializado: {str(e)}"
         print(f"❌ {error_msg}")
@@ -9,6 +9,7 @@ from decimal import Decimal
 import pandas as pd
 
 from database.repository_sqlalchemy import FinancialDataRepository
+from database.monthly_facts import BASE_CAIXA, BASE_COMPETENCIA, TabelaFatosIndisponivel
 from database.connection_sqlalchemy import DatabaseSession
 from database.schema_sqlalchemy import DFCStructureN1, DFCStructureN2, DFCClassification
 
@@ -275,13 +276,11 @@ async def get_receber_saldo(
             start_date = date(2020, 1, 1)  # Data mínima
             end_date = date(2030, 12, 31)  # Data máxima
         
-        # Buscar dados de receita
-        data = repository.get_financial_data(
+        # Somas mensais do período (base caixa)
+        data = repository.get_monthly_financial_data(
+            base=BASE_CAIXA,
             start_date=start_date,
-            end_date=end_date,
-            data_type='receita',
-            is_budget=False,
-            limit=100000
+            end_date=end_date
         )
         
         if not data:
@@ -320,6 +319,8 @@ async def get_receber_saldo(
             }
         }
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de receber: {str(e)}")
 
@@ -345,13 +346,11 @@ async def get_pagar_saldo(
             start_date = date(2020, 1, 1)  # Data mínima
             end_date = date(2030, 12, 31)  # Data máxima
         
-        # Buscar dados de despesa
-        data = repository.get_financial_data(
+        # Somas mensais do período (base caixa)
+        data = repository.get_monthly_financial_data(
+            base=BASE_CAIXA,
             start_date=start_date,
-            end_date=end_date,
-            data_type='despesa',
-            is_budget=False,
-            limit=100000
+            end_date=end_date
         )
         
         if not data:
@@ -390,6 +389,8 @@ async def get_pagar_saldo(
             }
         }
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de pagar: {str(e)}")
 
@@ -400,11 +401,14 @@ async def get_dfc_postgresql(
     """Endpoint DFC para PostgreSQL - usando estruturas migradas do Excel"""
     
     try:
-        # Buscar todos os dados financeiros - FILTRAR dados inconsistentes
-        data = repository.get_financial_data(
+        # Somas mensais da tabela de fatos (financial_data_mensal), base caixa.
+        # Dados fictícios (IDs 15354-15533, criados em 08/08/2025) e duplicatas
+        # exatas já ficam de fora na tabela (descartado)
+        data = repository.get_monthly_financial_data(
+            base=BASE_CAIXA,
             start_date=date(2020, 1, 1),
             end_date=date(2030, 12, 31),
-            limit=100000
+            incluir_descartados=False
         )
         
         # Filtrar dados fictícios e inconsistentes - REMOVENDO DADOS DE EXEMPLO
@@ -413,29 +417,16 @@ async def get_dfc_postgresql(
             df_raw = pd.DataFrame(data)
             original_count = len(df_raw)
             
-            # 1. REMOVER DADOS FICTÍCIOS específicos (IDs 15354-15533)
-            if 'id' in df_raw.columns:
-                df_raw = df_raw[~df_raw['id'].between(15354, 15533)]
+            # 1. REMOVER dados com source = "Sistema ERP" (fictícios)
+            df_raw = df_raw[df_raw['source'] != 'Sistema ERP']
             
-            # 2. REMOVER dados criados em 08/08/2025 (dados fictícios)
-            if 'created_at' in df_raw.columns:
-                df_raw['created_at'] = pd.to_datetime(df_raw['created_at'])
-                df_raw = df_raw[~(df_raw['created_at'].dt.date == pd.to_datetime('2025-08-08').date())]
-            
-            # 3. REMOVER dados com source = "Sistema ERP" (fictícios)
-            if 'source' in df_raw.columns:
-                df_raw = df_raw[df_raw['source'] != 'Sistema ERP']
-            
-            # 4. Aplicar filtros de qualidade dos dados
+            # 2. Aplicar filtros de qualidade dos dados
             # Manter apenas dados com categoria válida (não nan, não nula)
             df_raw = df_raw[df_raw['category'].notna()]
             df_raw = df_raw[df_raw['category'] != 'nan']
             df_raw = df_raw[df_raw['category'].str.strip() != '']
             
-            # 5. Remover duplicatas exatas
-            df_raw = df_raw.drop_duplicates(subset=['category', 'subcategory', 'description', 'value', 'type', 'date'])
-            
-            # 6. Filtrar por anos válidos (mesmos anos do Excel: 2023-2025)
+            # 3. Filtrar por anos válidos (mesmos anos do Excel: 2023-2025)
             df_raw['date'] = pd.to_datetime(df_raw['date'])
             df_raw['ano'] = df_raw['date'].dt.year
             df_raw = df_raw[df_raw['ano'].isin([2023, 2024, 2025])]
@@ -443,9 +434,7 @@ async def get_dfc_postgresql(
             # Converter de volta para lista de dicts
             data = df_raw.to_dict('records')
             
-            print(f"🧹 Dados filtrados (removidos fictícios): {original_count} → {len(data)} registros")
-            print(f"🎯 Meta Excel: 15338 registros")
-            print(f"📊 Diferença: {len(data) - 15338} registros")
+            print(f"🧹 Células mensais filtradas (removidos fictícios): {original_count} → {len(data)}")
         
         print(f"🔍 DFC PostgreSQL - Iniciando processamento")
         print(f"📊 Total de registros financeiros: {len(data)}")
@@ -467,29 +456,12 @@ async def get_dfc_postgresql(
         df['trimestre'] = df['date'].dt.to_period('Q').astype(str)
         
         # 🔧 SEPARAR OPERADORES DOS NOMES DAS CATEGORIAS
-        # Extrair operador e nome limpo das categorias que vieram do Excel
-        def extrair_operador_e_nome(categoria):
-            """Extrai operador e nome limpo da categoria do Excel"""
-            if pd.isna(categoria) or categoria == 'nan':
-                return None, None
-            
-            categoria_str = str(categoria).strip()
-            
-            # Padrão: ( OPERADOR ) NOME
-            import re
-            match = re.match(r'\(\s*([=+\-+/\*])\s*\)\s*(.*)', categoria_str)
-            if match:
-                operador = match.group(1)
-                nome_limpo = match.group(2).strip()
-                return operador, nome_limpo
-            else:
-                # Se não tem operador, é um nome direto
-                return None, categoria_str
-        
-        # Aplicar separação nas categorias
-        df[['operador_categoria', 'nome_categoria']] = df['category'].apply(
-            lambda x: pd.Series(extrair_operador_e_nome(x))
-        )
+        # Operador e nome limpo vêm do dicionário de rótulos compartilhado com as
+        # estruturas Excel (cada categoria distinta é interpretada uma única vez)
+        from helpers.structure_helper import rotulos_contas
+        sem_categoria = df['category'].isna() | (df['category'] == 'nan')
+        df['operador_categoria'] = rotulos_contas.operadores(df['category']).where(~sem_categoria, None)
+        df['nome_categoria'] = rotulos_contas.nomes(df['category']).where(~sem_categoria, None)
         
         # Usar nome_categoria para os matches, mantendo o operador para cálculos
         df['category_clean'] = df['nome_categoria']
@@ -893,6 +865,8 @@ async def get_dfc_postgresql(
         finally:
             session.close()
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         print(f"❌ Erro no DFC: {str(e)}")
         import traceback
@@ -1068,11 +1042,14 @@ async def get_dre_postgresql(
     """Endpoint DRE para PostgreSQL - usando estruturas migradas do Excel"""
     
     try:
-        # Buscar todos os dados financeiros - FILTRAR dados inconsistentes
-        data = repository.get_financial_data(
+        # Somas mensais da tabela de fatos (financial_data_mensal), base competência.
+        # Dados fictícios (IDs 15354-15533, criados em 08/08/2025) e duplicatas
+        # exatas já ficam de fora na tabela (descartado)
+        data = repository.get_monthly_financial_data(
+            base=BASE_COMPETENCIA,
             start_date=date(2020, 1, 1),
             end_date=date(2030, 12, 31),
-            limit=100000
+            incluir_descartados=False
         )
         
         # Filtrar dados fictícios e inconsistentes - REMOVENDO DADOS DE EXEMPLO
@@ -1081,29 +1058,16 @@ async def get_dre_postgresql(
             df_raw = pd.DataFrame(data)
             original_count = len(df_raw)
             
-            # 1. REMOVER DADOS FICTÍCIOS específicos (IDs 15354-15533)
-            if 'id' in df_raw.columns:
-                df_raw = df_raw[~df_raw['id'].between(15354, 15533)]
-            
-            # 2. REMOVER dados criados em 08/08/2025 (dados fictícios)
-            if 'created_at' in df_raw.columns:
-                df_raw['created_at'] = pd.to_datetime(df_raw['created_at'])
-                df_raw = df_raw[~(df_raw['created_at'].dt.date == pd.to_datetime('2025-08-08').date())]
-            
-            # 3. REMOVER dados com source = "Sistema ERP" (fictícios)
-            if 'source' in df_raw.columns:
-                df_raw = df_raw[df_raw['source'] != 'Sistema ERP']
+            # 1. REMOVER dados com source = "Sistema ERP" (fictícios)
+            df_raw = df_raw[df_raw['source'] != 'Sistema ERP']
             
-            # 4. Aplicar filtros de qualidade dos dados
+            # 2. Aplicar filtros de qualidade dos dados
             # Manter apenas dados com categoria válida (não nan, não nula)
             df_raw = df_raw[df_raw['category'].notna()]
             df_raw = df_raw[df_raw['category'] != 'nan']
             df_raw = df_raw[df_raw['category'].str.strip() != '']
             
-            # 5. Remover duplicatas exatas
-            df_raw = df_raw.drop_duplicates(subset=['category', 'subcategory', 'description', 'value', 'type', 'date'])
-            
-            # 6. Filtrar por anos válidos (mesmos anos do Excel: 2023-2025)
+            # 3. Filtrar por anos válidos (mesmos anos do Excel: 2023-2025)
             df_raw['date'] = pd.to_datetime(df_raw['date'])
             df_raw['ano'] = df_raw['date'].dt.year
             df_raw = df_raw[df_raw['ano'].isin([2023, 2024, 2025])]
@@ -1111,9 +1075,7 @@ async def get_dre_postgresql(
             # Converter de volta para lista de dicts
             data = df_raw.to_dict('records')
             
-            print(f"🧹 Dados filtrados (removidos fictícios): {original_count} → {len(data)} registros")
-            print(f"🎯 Meta Excel: 15338 registros")
-            print(f"📊 Diferença: {len(data) - 15338} registros")
+            print(f"🧹 Células mensais filtradas (removidos fictícios): {original_count} → {len(data)}")
         
         print(f"🔍 DRE PostgreSQL - Iniciando processamento")
         print(f"📊 Total de registros financeiros: {len(data)}")
@@ -1132,7 +1094,7 @@ async def get_dre_postgresql(
         
         # Usar as colunas corretas da tabela financial_data (como na versão Excel)
         df['competencia'] = pd.to_datetime(df['competencia'], errors="coerce")
-        df['mes_ano'] = df['competencia'].dt.to_period("M").astype(str)
+        df['mes'] = df['competencia'].dt.to_period("M").astype(str)
         df['ano'] = df['competencia'].dt.year
         df['trimestre'] = df['competencia'].dt.to_period("Q").apply(lambda p: f"{p.year}-T{p.quarter}")
         
@@ -1141,7 +1103,7 @@ async def get_dre_postgresql(
         df = df.dropna(subset=['competencia', 'valor_original'])
         
         # Períodos únicos
-        meses = sorted(df['mes_ano'].dropna().unique())
+        meses = sorted(df['mes'].dropna().unique())
         anos = sorted(set(int(a) for a in df['ano'].dropna().unique()))
         trimestres = sorted(df['trimestre'].dropna().unique())
         
@@ -1466,6 +1428,8 @@ async def get_dre_postgresql(
         finally:
             session.close()
         
+    except TabelaFatosIndisponivel:
+        raise
     except Exception as e:
         print(f"❌ Erro no DRE: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar DRE: {str(e)}")
@@ -1,130 +1,186 @@
+import numpy as np
 import pandas as pd
-from .financial_utils import (
-    calcular_analise_vertical, calcular_analise_horizontal, 
-    calcular_realizado_vs_orcado
-)
+
+# Saída das análises: "12.34%"/"–" (padrão) ou números com null (format=numeric)
+FORMATO_NUMERICO = "numeric"
+SEM_ANALISE = "–"
+CASAS_DECIMAIS_ANALISE = 2
+
+
+def formato_numerico(formato):
+    """Indica se o parâmetro format da query pede análises numéricas"""
+    return (formato or "").lower() == FORMATO_NUMERICO
+
+
+def sem_analise(numerico=False):
+    """Valor de uma análise que não se aplica ("–" ou None no formato numérico)"""
+    return None if numerico else SEM_ANALISE
+
+
+# Sufixo de cada chave de análise → eixo de períodos usado na serialização
+EIXOS_ANALISE = {
+    "real_vs_orcamento": ("mensais", "trimestrais", "anuais", "total"),
+    "horizontal": ("mensais", "trimestrais", "anuais"),
+    "vertical": ("mensais", "trimestrais", "anuais", "total"),
+    "vertical_orcamentos": ("mensais", "trimestrais", "anuais", "total"),
+    "horizontal_orcamentos": ("mensais", "trimestrais", "anuais"),
+}
+
+
+def _percentual(numerador, denominador):
+    """(numerador / denominador) * 100, com NaN onde o denominador é zero ou indefinido"""
+    numerador, denominador = np.broadcast_arrays(
+        np.asarray(numerador, dtype=np.float64), np.asarray(denominador, dtype=np.float64)
+    )
+    validos = (denominador != 0) & ~np.isnan(denominador)
+    resultado = np.full(numerador.shape, np.nan)
+    np.divide(numerador, denominador, out=resultado, where=validos)
+    resultado[validos] *= 100
+    return resultado
+
+
+def _matriz(valores, n_linhas):
+    """Converte valores em matriz linhas × períodos (aceita listas vazias)"""
+    matriz = np.asarray(valores, dtype=np.float64)
+    return matriz.reshape(n_linhas, -1) if matriz.size else np.zeros((n_linhas, 0))
+
+
+def calcular_variacao(matriz):
+    """Variação percentual sobre a coluna anterior (primeira coluna indefinida)"""
+    resultado = np.full(matriz.shape, np.nan)
+    if matriz.shape[1] > 1:
+        anterior = matriz[:, :-1]
+        resultado[:, 1:] = _percentual(matriz[:, 1:] - anterior, anterior)
+    return resultado
+
+
+def calcular_analises_lote(valores_mes, valores_tri, valores_ano, valores_total,
+                           orcamentos_mes, orcamentos_tri, orcamentos_ano, orcamento_total,
+                           base_vertical=None, familias=None):
+    """Calcula as análises de várias linhas de uma vez
+
+    Recebe matrizes linhas × períodos (mês, trimestre, ano) e vetores de totais
+    por linha; base_vertical é um escalar ou um vetor por linha. Retorna matrizes
+    numéricas (NaN onde a análise não se aplica) com as chaves de
+    calcular_analises_completas; a formatação fica para serializar_analises.
+    familias (prefixos de EIXOS_ANALISE, vindos de fields=) limita as análises
+    calculadas; None calcula todas.
+    """
+    totais_reais = np.atleast_1d(np.asarray(valores_total, dtype=np.float64))
+    n_linhas = len(totais_reais)
+    reais = {
+        "mensais": _matriz(valores_mes, n_linhas),
+        "trimestrais": _matriz(valores_tri, n_linhas),
+        "anuais": _matriz(valores_ano, n_linhas),
+        "total": totais_reais,
+    }
+    orcados = {
+        "mensais": _matriz(orcamentos_mes, n_linhas),
+        "trimestrais": _matriz(orcamentos_tri, n_linhas),
+        "anuais": _matriz(orcamentos_ano, n_linhas),
+        "total": np.atleast_1d(np.asarray(orcamento_total, dtype=np.float64)),
+    }
+
+    base = np.asarray(np.nan if base_vertical is None else base_vertical, dtype=np.float64)
+    base = np.broadcast_to(base, reais["total"].shape)
+
+    def pedida(familia):
+        return familias is None or familia in familias
+
+    analises = {}
+    for eixo in ("mensais", "trimestrais", "anuais", "total"):
+        base_eixo = base if eixo == "total" else base[:, None]
+        if pedida("real_vs_orcamento"):
+            analises[f"real_vs_orcamento_{eixo}"] = _percentual(reais[eixo], orcados[eixo])
+        if pedida("vertical"):
+            analises[f"vertical_{eixo}"] = _percentual(reais[eixo], base_eixo)
+        if pedida("vertical_orcamentos"):
+            analises[f"vertical_orcamentos_{eixo}"] = _percentual(orcados[eixo], base_eixo)
+        if eixo != "total":
+            if pedida("horizontal"):
+                analises[f"horizontal_{eixo}"] = calcular_variacao(reais[eixo])
+            if pedida("horizontal_orcamentos"):
+                analises[f"horizontal_orcamentos_{eixo}"] = calcular_variacao(orcados[eixo])
+    return analises
+
+
+def formatar_percentuais(matriz, numerico=False):
+    """Formata uma matriz de percentuais como "12.34%" (ou "–" quando indefinido)
+
+    No formato numérico não há formatação de texto: os percentuais saem como
+    float arredondado e os indefinidos como None.
+    """
+    matriz = np.asarray(matriz, dtype=np.float64)
+    if matriz.size == 0:
+        return matriz.astype(object)
+    indefinidos = np.isnan(matriz)
+    if numerico:
+        texto = np.round(matriz, CASAS_DECIMAIS_ANALISE).astype(object)
+        texto[indefinidos] = None
+        return texto
+    texto = np.char.mod("%.2f%%", np.nan_to_num(matriz)).astype(object)
+    texto[indefinidos] = SEM_ANALISE
+    return texto
+
+
+def serializar_analises(analises, meses_unicos, trimestres_unicos, anos_unicos, numerico=False, n_linhas=None):
+    """Converte o resultado de calcular_analises_lote em um dicionário de análises por linha
+
+    Só as famílias presentes (calculadas) entram em cada linha; n_linhas é
+    obrigatório quando nenhuma análise foi calculada (fields= sem análises).
+    """
+    rotulos = {
+        "mensais": list(meses_unicos),
+        "trimestrais": list(trimestres_unicos),
+        "anuais": [str(ano) for ano in anos_unicos],
+    }
+    if n_linhas is None:
+        n_linhas = len(next(iter(analises.values()))) if analises else 0
+    linhas = [{} for _ in range(n_linhas)]
+
+    for prefixo, eixos in EIXOS_ANALISE.items():
+        if f"{prefixo}_{eixos[0]}" not in analises:
+            continue
+        for eixo in eixos:
+            chave = f"{prefixo}_{eixo}"
+            texto = formatar_percentuais(analises[chave], numerico).tolist()
+            if eixo == "total":
+                for linha, valor in zip(linhas, texto):
+                    linha[chave] = valor
+            else:
+                for linha, valores in zip(linhas, texto):
+                    linha[chave] = dict(zip(rotulos[eixo], valores))
+    return linhas
+
 
 def calcular_analises_completas(valores_mes, valores_tri, valores_ano, valores_total,
                                orcamentos_mes, orcamentos_tri, orcamentos_ano, orcamento_total,
                                meses_unicos, trimestres_unicos, anos_unicos, base_vertical=None):
-    """Calcula todas as análises financeiras para um item"""
-    
-    def safe_real_vs_orcado(real, orcado):
-        try:
-            real_num = float(real) if real is not None else 0
-            orcado_num = float(orcado) if orcado is not None else 0
-            return calcular_realizado_vs_orcado(real_num, orcado_num)
-        except (ValueError, TypeError):
-            return "–"
-    
-    def safe_vertical(valor, base):
-        try:
-            if base is None or base == 0:
-                return "–"
-            return calcular_analise_vertical(valor, base)
-        except (ValueError, TypeError, ZeroDivisionError):
-            return "–"
-    
-    # Real vs Orçamento
-    real_vs_orcamento_mensais = {mes: safe_real_vs_orcado(valores_mes[mes], orcamentos_mes[mes]) for mes in meses_unicos}
-    real_vs_orcamento_trimestrais = {tri: safe_real_vs_orcado(valores_tri[tri], orcamentos_tri[tri]) for tri in trimestres_unicos}
-    real_vs_orcamento_anuais = {str(ano): safe_real_vs_orcado(valores_ano[str(ano)], orcamentos_ano[str(ano)]) for ano in anos_unicos}
-    real_vs_orcamento_total = safe_real_vs_orcado(valores_total, orcamento_total)
-
-    # Horizontal Realizado
-    horizontal_mensais = {}
-    for i, mes in enumerate(meses_unicos):
-        if i == 0:
-            horizontal_mensais[mes] = "–"
-        else:
-            horizontal_mensais[mes] = calcular_analise_horizontal(valores_mes[mes], valores_mes[meses_unicos[i-1]])
-
-    horizontal_trimestrais = {}
-    for i, tri in enumerate(trimestres_unicos):
-        if i == 0:
-            horizontal_trimestrais[tri] = "–"
-        else:
-            horizontal_trimestrais[tri] = calcular_analise_horizontal(valores_tri[tri], valores_tri[trimestres_unicos[i-1]])
-
-    horizontal_anuais = {}
-    for i, ano in enumerate(anos_unicos):
-        if i == 0:
-            horizontal_anuais[str(ano)] = "–"
-        else:
-            horizontal_anuais[str(ano)] = calcular_analise_horizontal(valores_ano[str(ano)], valores_ano[str(anos_unicos[i-1])])
-
-    # Vertical Realizado
-    vertical_mensais = {}
-    for mes in meses_unicos:
-        vertical_mensais[mes] = safe_vertical(valores_mes[mes], base_vertical)
-
-    vertical_trimestrais = {}
-    for tri in trimestres_unicos:
-        vertical_trimestrais[tri] = safe_vertical(valores_tri[tri], base_vertical)
-
-    vertical_anuais = {}
-    for ano in anos_unicos:
-        vertical_anuais[str(ano)] = safe_vertical(valores_ano[str(ano)], base_vertical)
-
-    vertical_total = safe_vertical(valores_total, base_vertical)
-
-    # Vertical Orçamento
-    vertical_orcamentos_mensais = {}
-    for mes in meses_unicos:
-        vertical_orcamentos_mensais[mes] = safe_vertical(orcamentos_mes[mes], base_vertical)
-
-    vertical_orcamentos_trimestrais = {}
-    for tri in trimestres_unicos:
-        vertical_orcamentos_trimestrais[tri] = safe_vertical(orcamentos_tri[tri], base_vertical)
-
-    vertical_orcamentos_anuais = {}
-    for ano in anos_unicos:
-        vertical_orcamentos_anuais[str(ano)] = safe_vertical(orcamentos_ano[str(ano)], base_vertical)
-
-    vertical_orcamentos_total = safe_vertical(orcamento_total, base_vertical)
-
-    # Horizontal Orçamento
-    horizontal_orcamentos_mensais = {}
-    for i, mes in enumerate(meses_unicos):
-        if i == 0:
-            horizontal_orcamentos_mensais[mes] = "–"
-        else:
-            horizontal_orcamentos_mensais[mes] = calcular_analise_horizontal(orcamentos_mes[mes], orcamentos_mes[meses_unicos[i-1]])
-
-    horizontal_orcamentos_trimestrais = {}
-    for i, tri in enumerate(trimestres_unicos):
-        if i == 0:
-            horizontal_orcamentos_trimestrais[tri] = "–"
-        else:
-            horizontal_orcamentos_trimestrais[tri] = calcular_analise_horizontal(orcamentos_tri[tri], orcamentos_tri[trimestres_unicos[i-1]])
-
-    horizontal_orcamentos_anuais = {}
-    for i, ano in enumerate(anos_unicos):
-        if i == 0:
-            horizontal_orcamentos_anuais[str(ano)] = "–"
-        else:
-            horizontal_orcamentos_anuais[str(ano)] = calcular_analise_horizontal(orcamentos_ano[str(ano)], orcamentos_ano[str(anos_unicos[i-1])])
-
-    return {
-        "real_vs_orcamento_mensais": real_vs_orcamento_mensais,
-        "real_vs_orcamento_trimestrais": real_vs_orcamento_trimestrais,
-        "real_vs_orcamento_anuais": real_vs_orcamento_anuais,
-        "real_vs_orcamento_total": real_vs_orcamento_total,
-        "horizontal_mensais": horizontal_mensais,
-        "horizontal_trimestrais": horizontal_trimestrais,
-        "horizontal_anuais": horizontal_anuais,
-        "vertical_mensais": vertical_mensais,
-        "vertical_trimestrais": vertical_trimestrais,
-        "vertical_anuais": vertical_anuais,
-        "vertical_total": vertical_total,
-        "vertical_orcamentos_mensais": vertical_orcamentos_mensais,
-        "vertical_orcamentos_trimestrais": vertical_orcamentos_trimestrais,
-        "vertical_orcamentos_anuais": vertical_orcamentos_anuais,
-        "vertical_orcamentos_total": vertical_orcamentos_total,
-        "horizontal_orcamentos_mensais": horizontal_orcamentos_mensais,
-        "horizontal_orcamentos_trimestrais": horizontal_orcamentos_trimestrais,
-        "horizontal_orcamentos_anuais": horizontal_orcamentos_anuais
-    }
+    """Calcula todas as análises financeiras para um item (uma linha de calcular_analises_lote)"""
+    anos = [str(ano) for ano in anos_unicos]
+    analises = calcular_analises_lote(
+        [[valores_mes[mes] for mes in meses_unicos]],
+        [[valores_tri[tri] for tri in trimestres_unicos]],
+        [[valores_ano[ano] for ano in anos]],
+        [valores_total],
+        [[orcamentos_mes[mes] for mes in meses_unicos]],
+        [[orcamentos_tri[tri] for tri in trimestres_unicos]],
+        [[orcamentos_ano[ano] for ano in anos]],
+        [orcamento_total],
+        [base_vertical if base_vertical is not None else np.nan]
+    )
+    return serializar_analises(analises, meses_unicos, trimestres_unicos, anos_unicos)[0]
+
+
+def calcular_analises_cubo(cubo, base_vertical=None, familias=None):
+    """Análises de todas as linhas de um FinancialCube (ver calcular_analises_lote)"""
+    from .cube_helper import REAL, ORCADO
+
+    return calcular_analises_lote(
+        cubo.mensal[:, :, REAL], cubo.trimestral[:, :, REAL], cubo.anual[:, :, REAL], cubo.total[:, REAL],
+        cubo.mensal[:, :, ORCADO], cubo.trimestral[:, :, ORCADO], cubo.anual[:, :, ORCADO], cubo.total[:, ORCADO],
+        base_vertical, familias
+    )
 
 def calcular_pmr_pmp(df_con, origem):
     """Calcula PMR (Prazo Médio de Recebimento) e PMP (Prazo Médio de Pagamento)"""
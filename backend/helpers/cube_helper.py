@@ -0,0 +1,402 @@
+"""
+Cubo denso conta × mês × cenário (realizado/orçado) para DRE e DFC
+
+Os valores mensais são somados em uma única passada agrupada sobre a base; os
+rollups de trimestre, ano e total saem de reshape-sum sobre um calendário denso
+(anos completos de 12 meses), sem novas varreduras da base.
+"""
+import numpy as np
+import pandas as pd
+from .data_processor import rotulo_mes, rotulo_trimestre, codigo_mes
+
+# Índices do eixo de cenário
+REAL = 0
+ORCADO = 1
+
+
+class FinancialCube:
+    """Valores por conta em cada período observado, para realizado e orçado
+
+    Arrays: mensal (contas × meses × 2), trimestral (contas × trimestres × 2),
+    anual (contas × anos × 2) e total (contas × 2).
+    """
+
+    def __init__(self, contas, meses, trimestres, anos, mensal, trimestral, anual, total):
+        self.contas = tuple(contas)
+        self.indice = {nome: i for i, nome in enumerate(self.contas)}
+        self.meses = list(meses)
+        self.trimestres = list(trimestres)
+        self.anos = list(anos)
+        self.mensal = mensal
+        self.trimestral = trimestral
+        self.anual = anual
+        self.total = total
+
+    def __contains__(self, nome):
+        return nome in self.indice
+
+    def _linhas(self, array, nomes):
+        """Linhas do array para os nomes dados (zeros para contas ausentes)"""
+        resultado = np.zeros((len(nomes),) + array.shape[1:])
+        for i, nome in enumerate(nomes):
+            idx = self.indice.get(nome)
+            if idx is not None:
+                resultado[i] = array[idx]
+        return resultado
+
+    def selecionar(self, nomes):
+        """Novo cubo apenas com as contas dadas, na ordem dada"""
+        nomes = list(nomes)
+        return FinancialCube(
+            nomes, self.meses, self.trimestres, self.anos,
+            self._linhas(self.mensal, nomes), self._linhas(self.trimestral, nomes),
+            self._linhas(self.anual, nomes), self._linhas(self.total, nomes)
+        )
+
+    def total_conta(self, nome, cenario=REAL):
+        idx = self.indice.get(nome)
+        return float(self.total[idx, cenario]) if idx is not None else 0
+
+    def totais(self, cenario=REAL):
+        """{conta: total} de todas as contas do cubo"""
+        return dict(zip(self.contas, self.total[:, cenario].tolist()))
+
+    def empilhar(self, outro):
+        """Novo cubo com as linhas deste cubo seguidas das linhas de outro (mesmos períodos)"""
+        return FinancialCube(
+            self.contas + tuple(outro.contas), self.meses, self.trimestres, self.anos,
+            np.concatenate([self.mensal, outro.mensal]), np.concatenate([self.trimestral, outro.trimestral]),
+            np.concatenate([self.anual, outro.anual]), np.concatenate([self.total, outro.total])
+        )
+
+    def posicoes_meses(self, inicio=None, fim=None):
+        """Posições dos meses entre inicio e fim ('AAAA-MM', inclusivos; None = sem limite)"""
+        return np.array([
+            i for i, mes in enumerate(self.meses)
+            if (inicio is None or mes >= inicio) and (fim is None or mes <= fim)
+        ], dtype=np.int64)
+
+    def fatiar(self, inicio=None, fim=None):
+        """Novo cubo apenas com os meses entre inicio e fim ('AAAA-MM', inclusivos)
+
+        Trimestres, anos e total são refeitos a partir dos meses mantidos: um
+        trimestre cortado pelo intervalo soma apenas os seus meses dentro dele.
+        """
+        if inicio is None and fim is None:
+            return self
+        posicoes = self.posicoes_meses(inicio, fim)
+        codigos = np.array([codigo_mes(self.meses[i]) for i in posicoes], dtype=np.int64)
+        mensal = self.mensal[:, posicoes]
+
+        def rollup(codigos_periodo):
+            unicos, posicao = np.unique(codigos_periodo, return_inverse=True)
+            resultado = np.zeros((mensal.shape[0], len(unicos), 2))
+            np.add.at(resultado, (slice(None), posicao), mensal)
+            return unicos, resultado
+
+        codigos_tri, trimestral = rollup(codigos // 3)
+        anos, anual = rollup(codigos // 12)
+        return FinancialCube(
+            self.contas, [self.meses[i] for i in posicoes], [rotulo_trimestre(int(c)) for c in codigos_tri],
+            [int(a) for a in anos], mensal, trimestral, anual, mensal.sum(axis=1)
+        )
+
+    def somar(self, nome):
+        """Novo cubo com uma única linha: a soma de todas as linhas deste cubo"""
+        return FinancialCube(
+            [nome], self.meses, self.trimestres, self.anos,
+            self.mensal.sum(axis=0, keepdims=True), self.trimestral.sum(axis=0, keepdims=True),
+            self.anual.sum(axis=0, keepdims=True), self.total.sum(axis=0, keepdims=True)
+        )
+
+    def arredondar_periodos(self):
+        """Novo cubo com os valores por período arredondados (totais mantidos)"""
+        return FinancialCube(
+            self.contas, self.meses, self.trimestres, self.anos,
+            np.round(self.mensal), np.round(self.trimestral), np.round(self.anual), self.total
+        )
+
+    def periodos_conta(self, nome):
+        """Valores de uma conta em todos os períodos, no formato dos payloads DRE/DFC"""
+        idx = self.indice.get(nome)
+        if idx is None:
+            zeros = {
+                "valores_mensais": {mes: 0 for mes in self.meses},
+                "valores_trimestrais": {tri: 0 for tri in self.trimestres},
+                "valores_anuais": {str(ano): 0 for ano in self.anos},
+            }
+            return {
+                **zeros,
+                "orcamentos_mensais": dict(zeros["valores_mensais"]),
+                "orcamentos_trimestrais": dict(zeros["valores_trimestrais"]),
+                "orcamentos_anuais": dict(zeros["valores_anuais"]),
+                "valor": 0,
+                "orcamento_total": 0,
+            }
+        return self.periodos_linha(idx)
+
+    def periodos_linha(self, idx, familias=None):
+        """Como periodos_conta, pela posição da linha (linhas com nomes repetidos)
+
+        familias (fields=) limita as séries montadas a "valores" e/ou "orcamentos";
+        None monta as duas.
+        """
+        anos = [str(ano) for ano in self.anos]
+        periodos = {}
+        if familias is None or "valores" in familias:
+            periodos.update({
+                "valor": float(self.total[idx, REAL]),
+                "valores_mensais": dict(zip(self.meses, self.mensal[idx, :, REAL].tolist())),
+                "valores_trimestrais": dict(zip(self.trimestres, self.trimestral[idx, :, REAL].tolist())),
+                "valores_anuais": dict(zip(anos, self.anual[idx, :, REAL].tolist())),
+            })
+        if familias is None or "orcamentos" in familias:
+            periodos.update({
+                "orcamentos_mensais": dict(zip(self.meses, self.mensal[idx, :, ORCADO].tolist())),
+                "orcamentos_trimestrais": dict(zip(self.trimestres, self.trimestral[idx, :, ORCADO].tolist())),
+                "orcamentos_anuais": dict(zip(anos, self.anual[idx, :, ORCADO].tolist())),
+                "orcamento_total": float(self.total[idx, ORCADO]),
+            })
+        return periodos
+
+    def por_periodo(self, cenario, nomes):
+        """Dicionários {período: {conta: valor}} usados no topo dos payloads"""
+        sub = self.selecionar(nomes)
+        nomes = list(nomes)
+
+        def montar(rotulos, array):
+            return {
+                rotulo: dict(zip(nomes, array[:, j, cenario].tolist()))
+                for j, rotulo in enumerate(rotulos)
+            }
+
+        return {
+            "mensais": montar(self.meses, sub.mensal),
+            "trimestrais": montar(self.trimestres, sub.trimestral),
+            "anuais": montar([str(ano) for ano in self.anos], sub.anual),
+            "total": dict(zip(nomes, sub.total[:, cenario].tolist())),
+        }
+
+
+def saldos_acumulados(movimento, saldo_anterior=None):
+    """Saldos inicial e final acumulando um cubo de movimentações período a período
+
+    Em cada granularidade (mês, trimestre, ano) o saldo final é a soma acumulada
+    das movimentações e o saldo inicial é o saldo final do período anterior. O
+    primeiro período parte de saldo_anterior (linhas × cenários; zero quando não
+    dado). No total, o saldo inicial é saldo_anterior e o final soma o total movimentado.
+    Retorna (saldo_inicial, saldo_final), com as mesmas linhas do cubo dado.
+    """
+    if saldo_anterior is None:
+        saldo_anterior = np.zeros_like(movimento.total)
+
+    def acumular(array):
+        final = np.cumsum(array, axis=1) + saldo_anterior[:, None, :]
+        inicial = np.empty_like(final)
+        inicial[:, :1] = saldo_anterior[:, None, :]
+        inicial[:, 1:] = final[:, :-1]
+        return inicial, final
+
+    mensal_inicial, mensal_final = acumular(movimento.mensal)
+    tri_inicial, tri_final = acumular(movimento.trimestral)
+    anual_inicial, anual_final = acumular(movimento.anual)
+
+    eixos = (movimento.contas, movimento.meses, movimento.trimestres, movimento.anos)
+    saldo_inicial = FinancialCube(*eixos, mensal_inicial, tri_inicial, anual_inicial, saldo_anterior.copy())
+    saldo_final = FinancialCube(*eixos, mensal_final, tri_final, anual_final, saldo_anterior + movimento.total)
+    return saldo_inicial, saldo_final
+
+
+def _agregar(codigos_linha, n_linhas, codigos_mes, cenarios, valores, meses_obs):
+    """Soma valores por (linha, mês, cenário) em uma única passada e deriva os rollups
+
+    meses_obs são os códigos de mês (ano * 12 + mês - 1) mantidos no resultado e
+    devem incluir todos os códigos de codigos_mes.
+    Retorna (meses, trimestres, anos, mensal, trimestral, anual, total).
+    """
+    if len(meses_obs) == 0:
+        vazio = np.zeros((n_linhas, 0, 2))
+        return [], [], [], vazio, vazio, vazio, np.zeros((n_linhas, 2))
+
+    # Calendário denso alinhado a anos completos
+    inicio = (meses_obs.min() // 12) * 12
+    n_anos = meses_obs.max() // 12 - inicio // 12 + 1
+    n_meses = n_anos * 12
+
+    # Uma única passada agrupada: chave = (linha, mês denso, cenário)
+    chaves = (codigos_linha * n_meses + (codigos_mes - inicio)) * 2 + cenarios
+    denso = np.bincount(chaves, weights=valores, minlength=n_linhas * n_meses * 2).reshape(n_linhas, n_anos, 12, 2)
+
+    trimestral_denso = denso.reshape(n_linhas, n_anos, 4, 3, 2).sum(axis=3).reshape(n_linhas, n_anos * 4, 2)
+    anual_denso = denso.sum(axis=2)
+    mensal_denso = denso.reshape(n_linhas, n_meses, 2)
+
+    # Recorta apenas os períodos observados na base
+    codigos_tri = np.unique(meses_obs // 3)
+    anos_obs = np.unique(meses_obs // 12)
+
+    return (
+        [rotulo_mes(int(c)) for c in meses_obs],
+        [rotulo_trimestre(int(c)) for c in codigos_tri],
+        [int(a) for a in anos_obs],
+        mensal_denso[:, meses_obs - inicio],
+        trimestral_denso[:, codigos_tri - inicio // 3],
+        anual_denso[:, anos_obs - inicio // 12],
+        denso.sum(axis=(1, 2)),
+    )
+
+
+def _colunas_cenarios(df_real, df_orc, colunas):
+    """Concatena as colunas dadas das bases realizada e orçada, com o código do cenário"""
+    frames = [(df_real, REAL), (df_orc, ORCADO)]
+    dados = {
+        coluna: np.concatenate([df[coluna].to_numpy() for df, _ in frames]) for coluna in colunas
+    }
+    dados["cenario"] = np.concatenate([np.full(len(df), cenario, dtype=np.int64) for df, cenario in frames])
+    return dados
+
+
+def montar_cubo(df_real, df_orc, conta_column, valor_column, contas=None):
+    """Monta o cubo a partir das bases realizada e orçada já preparadas (periodo_mes/periodo_tri)
+
+    As contas dadas vêm primeiro (na ordem da estrutura); contas presentes apenas
+    nos dados entram em seguida.
+    """
+    dados = _colunas_cenarios(df_real, df_orc, [conta_column, "periodo_mes", valor_column])
+    codigos_mes = dados["periodo_mes"].astype(np.int64)
+
+    # Eixo de contas
+    contas = list(dict.fromkeys(contas or []))
+    indice = {nome: i for i, nome in enumerate(contas)}
+    for nome in pd.unique(pd.Series(dados[conta_column]).dropna()):
+        if nome not in indice:
+            indice[nome] = len(contas)
+            contas.append(nome)
+
+    idx_conta = pd.Series(dados[conta_column]).map(indice).to_numpy(dtype=np.float64)
+    validos = ~np.isnan(idx_conta)
+
+    periodos = _agregar(
+        idx_conta[validos].astype(np.int64), len(contas), codigos_mes[validos], dados["cenario"][validos],
+        dados[valor_column].astype(np.float64)[validos], np.unique(codigos_mes)
+    )
+    return FinancialCube(contas, *periodos)
+
+
+class IndiceClassificacoes:
+    """Classificações de cada conta em todos os períodos e cenários
+
+    Um único cubo com uma linha por par (conta, classificação), ordenado por
+    conta; cada conta ocupa uma faixa contígua de linhas. As contagens de
+    lançamentos por mês (realizados por conta e por par, e de qualquer cenário
+    por par) dizem quais contas e classificações aparecem em um intervalo.
+    primeiras_linhas guarda, por par e mês, a posição do primeiro lançamento da
+    classificação na base: as classificações saem na ordem em que aparecem.
+    """
+
+    def __init__(self, cubo, faixas, contas, realizado_contas, realizado_linhas, lancamentos_linhas,
+                 primeiras_linhas):
+        self.cubo = cubo
+        self.faixas = faixas
+        self.contas = contas
+        self.realizado_contas = realizado_contas
+        self.realizado_linhas = realizado_linhas
+        self.lancamentos_linhas = lancamentos_linhas
+        self.primeiras_linhas = primeiras_linhas
+        self.contas_realizado = frozenset(
+            conta for conta, n in zip(contas, realizado_contas.sum(axis=1)) if n > 0
+        )
+        self.linhas_realizado = realizado_linhas.sum(axis=1) > 0
+        self.linhas_presentes = lancamentos_linhas.sum(axis=1) > 0
+        self.ordem_linhas = primeiras_linhas.min(axis=1, initial=np.iinfo(np.int64).max)
+
+    def fatiar(self, inicio=None, fim=None):
+        """Novo índice apenas com os meses entre inicio e fim ('AAAA-MM', inclusivos)"""
+        if inicio is None and fim is None:
+            return self
+        posicoes = self.cubo.posicoes_meses(inicio, fim)
+        return IndiceClassificacoes(
+            self.cubo.fatiar(inicio, fim), self.faixas, self.contas,
+            self.realizado_contas[:, posicoes], self.realizado_linhas[:, posicoes],
+            self.lancamentos_linhas[:, posicoes], self.primeiras_linhas[:, posicoes]
+        )
+
+    def classificacoes(self, conta, somente_realizadas=False):
+        """Cubo com as classificações da conta (None quando a conta não tem realizado)
+
+        Apenas classificações com lançamentos nos meses do índice; somente_realizadas
+        deixa de fora também as presentes apenas no orçamento.
+        """
+        if conta not in self.contas_realizado:
+            return None
+        faixa = self.faixas.get(conta)
+        if faixa is None:
+            return None
+        linhas = np.arange(*faixa)
+        linhas = linhas[(self.linhas_realizado if somente_realizadas else self.linhas_presentes)[linhas]]
+        linhas = linhas[np.argsort(self.ordem_linhas[linhas], kind="stable")]
+        cubo = self.cubo
+        return FinancialCube(
+            [cubo.contas[i] for i in linhas], cubo.meses, cubo.trimestres, cubo.anos,
+            cubo.mensal[linhas], cubo.trimestral[linhas], cubo.anual[linhas], cubo.total[linhas]
+        )
+
+
+def montar_indice_classificacoes(df_real, df_orc, conta_column, classificacao_column, valor_column):
+    """Monta o índice (conta, classificação, mês, cenário) em uma única passada agrupada
+
+    Os meses do índice são os mesmos de montar_cubo para as mesmas bases.
+    """
+    dados = _colunas_cenarios(df_real, df_orc, [conta_column, classificacao_column, "periodo_mes", valor_column])
+    codigos_mes = dados["periodo_mes"].astype(np.int64)
+    meses_obs = np.unique(codigos_mes)
+
+    # Pares (conta, classificação) agrupados por conta
+    codigos_conta, contas = pd.factorize(dados[conta_column])
+    codigos_classificacao, classificacoes = pd.factorize(dados[classificacao_column])
+    validos = (codigos_conta >= 0) & (codigos_classificacao >= 0)
+    pares, codigos_par = np.unique(
+        codigos_conta[validos].astype(np.int64) * len(classificacoes) + codigos_classificacao[validos],
+        return_inverse=True
+    )
+
+    periodos = _agregar(
+        codigos_par.astype(np.int64), len(pares), codigos_mes[validos], dados["cenario"][validos],
+        dados[valor_column].astype(np.float64)[validos], meses_obs
+    )
+
+    faixas = {}
+    for i, codigo in enumerate(pares // len(classificacoes) if len(classificacoes) else []):
+        conta = contas[codigo]
+        inicio, _ = faixas.get(conta, (i, i))
+        faixas[conta] = (inicio, i + 1)
+
+    nomes = [classificacoes[c] for c in (pares % len(classificacoes) if len(classificacoes) else [])]
+
+    # Lançamentos realizados por (conta, mês) e por (par, mês); lançamentos de qualquer cenário por (par, mês)
+    posicao_mes = np.searchsorted(meses_obs, codigos_mes)
+    realizado = dados["cenario"] == REAL
+    com_conta = realizado & (codigos_conta >= 0)
+    realizado_contas = np.bincount(
+        codigos_conta[com_conta].astype(np.int64) * len(meses_obs) + posicao_mes[com_conta],
+        minlength=len(contas) * len(meses_obs)
+    ).reshape(len(contas), len(meses_obs))
+    realizado_linhas = np.bincount(
+        codigos_par.astype(np.int64) * len(meses_obs) + posicao_mes[validos],
+        weights=realizado[validos], minlength=len(pares) * len(meses_obs)
+    ).reshape(len(pares), len(meses_obs))
+    lancamentos_linhas = np.bincount(
+        codigos_par.astype(np.int64) * len(meses_obs) + posicao_mes[validos],
+        minlength=len(pares) * len(meses_obs)
+    ).reshape(len(pares), len(meses_obs))
+
+    # Primeiro lançamento de cada classificação por mês (em qualquer conta), repetido por par
+    primeiras = np.full((len(classificacoes), len(meses_obs)), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(
+        primeiras, (codigos_classificacao[validos], posicao_mes[validos]), np.flatnonzero(validos)
+    )
+    primeiras_linhas = primeiras[pares % len(classificacoes)] if len(classificacoes) else primeiras[:0]
+    return IndiceClassificacoes(
+        FinancialCube(nomes, *periodos), faixas, list(contas), realizado_contas, realizado_linhas,
+        lancamentos_linhas, primeiras_linhas
+    )
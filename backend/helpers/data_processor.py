@@ -1,20 +1,155 @@
+import re
+import numpy as np
 import pandas as pd
 
-def processar_dados_financeiros(df, date_column, valor_column="valor"):
-    """Processa dados financeiros básicos"""
-    df[date_column] = pd.to_datetime(df[date_column], errors="coerce")
-    df["mes_ano"] = df[date_column].dt.to_period("M").astype(str)
-    df["ano"] = df[date_column].dt.year
-    df["trimestre"] = df[date_column].dt.to_period("Q").apply(lambda p: f"{p.year}-T{p.quarter}")
+# granularity=: rótulos da lista de períodos e sufixo das séries de cada granularidade
+GRANULARIDADES = {
+    "mes": ("meses", "_mensais"),
+    "trimestre": ("trimestres", "_trimestrais"),
+    "ano": ("anos", "_anuais"),
+}
+
+# fields=: famílias de campos de cada linha -> (chaves exatas, prefixos das séries).
+# As famílias de orçamento vêm antes das análises de mesmo prefixo (horizontal_orcamentos_*
+# também começa com horizontal_); analise_* são os nomes usados pela DRE N0 (PostgreSQL).
+CAMPOS = {
+    "valores": ({"valor", "valor_total"}, ("valores_",)),
+    "orcamentos": ({"orcamento_total"}, ("orcamentos_",)),
+    "real_vs_orcamento": (set(), ("real_vs_orcamento_",)),
+    "horizontal_orcamentos": (set(), ("horizontal_orcamentos_",)),
+    "vertical_orcamentos": (set(), ("vertical_orcamentos_",)),
+    "horizontal": (set(), ("horizontal_", "analise_horizontal_")),
+    "vertical": (set(), ("vertical_", "analise_vertical_")),
+}
+
+def _rotulos_periodo(codigos, formatar):
+    """Converte códigos inteiros de período em categórico ordenado com rótulos legíveis"""
+    valores_unicos = np.unique(codigos)
+    return pd.Categorical.from_codes(
+        np.searchsorted(valores_unicos, codigos),
+        categories=[formatar(int(c)) for c in valores_unicos],
+        ordered=True
+    )
+
+def rotulo_mes(codigo):
+    """Rótulo 'AAAA-MM' de um código periodo_mes"""
+    return f"{codigo // 12}-{codigo % 12 + 1:02d}"
+
+def codigo_mes(rotulo):
+    """Código periodo_mes de um rótulo 'AAAA-MM' (inverso de rotulo_mes)"""
+    ano, mes = rotulo.split("-")
+    return int(ano) * 12 + int(mes) - 1
+
+def rotulo_trimestre(codigo):
+    """Rótulo 'AAAA-TQ' de um código periodo_tri"""
+    return f"{codigo // 4}-T{codigo % 4 + 1}"
+
+def validar_intervalo_meses(inicio=None, fim=None, granularidade=None):
+    """Valida start/end ('AAAA-MM') e granularity; retorna a mensagem de erro ou None"""
+    for nome, valor in (("start", inicio), ("end", fim)):
+        if valor is not None and not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", valor):
+            return f"Parâmetro {nome} inválido: use o formato AAAA-MM"
+    if inicio is not None and fim is not None and inicio > fim:
+        return "Parâmetro start deve ser anterior ou igual a end"
+    if granularidade is not None and granularidade not in GRANULARIDADES:
+        return f"Parâmetro granularity inválido: use {', '.join(GRANULARIDADES)}"
+    return None
+
+def validar_campos(fields):
+    """Famílias pedidas em fields= ("valores,horizontal", ...); retorna (campos, erro)
+
+    Sem fields, campos é None (todas as famílias).
+    """
+    if fields is None or not fields.strip():
+        return None, None
+    campos = frozenset(campo.strip() for campo in fields.split(",") if campo.strip())
+    desconhecidos = sorted(campos - set(CAMPOS))
+    if desconhecidos:
+        return None, f"Parâmetro fields inválido ({', '.join(desconhecidos)}): use {', '.join(CAMPOS)}"
+    return campos, None
+
+def familia_campo(chave):
+    """Família (CAMPOS) de uma chave do payload, ou None para chaves fora das famílias (nome, tipo...)"""
+    for familia, (exatas, prefixos) in CAMPOS.items():
+        if chave in exatas or chave.startswith(prefixos):
+            return familia
+    return None
+
+def pedido(campos, familia):
+    """Indica se a família entra na resposta (campos None = todas)"""
+    return campos is None or familia in campos
+
+def filtrar_campos(payload, campos):
+    """Remove do payload (e das classificações aninhadas) as famílias fora de fields="""
+    if campos is None:
+        return payload
+
+    def filtrar(valor):
+        if isinstance(valor, dict):
+            resultado = {}
+            for chave, item in valor.items():
+                familia = familia_campo(chave) if isinstance(chave, str) else None
+                if familia is None:
+                    resultado[chave] = filtrar(item)
+                elif familia in campos:
+                    resultado[chave] = item
+            return resultado
+        if isinstance(valor, list):
+            return [filtrar(item) for item in valor]
+        return valor
+
+    return filtrar(payload)
 
+def filtrar_granularidade(payload, granularidade):
+    """Remove do payload (e das classificações aninhadas) as séries das outras granularidades"""
+    if granularidade is None:
+        return payload
+    removidas = [rotulos for nome, rotulos in GRANULARIDADES.items() if nome != granularidade]
+    chaves = {lista for lista, _ in removidas}
+    sufixos = tuple(sufixo for _, sufixo in removidas)
+
+    def filtrar(valor):
+        if isinstance(valor, dict):
+            return {
+                chave: filtrar(item) for chave, item in valor.items()
+                if chave not in chaves and not chave.endswith(sufixos)
+            }
+        if isinstance(valor, list):
+            return [filtrar(item) for item in valor]
+        return valor
+
+    return filtrar(payload)
+
+def preparar_base_periodos(df, date_column, valor_column="valor"):
+    """Prepara a base com as colunas de período já calculadas (uma vez por versão dos dados)
+
+    Gera mes_ano/trimestre/ano categóricos e os códigos inteiros periodo_mes
+    (ano * 12 + mês - 1) e periodo_tri (ano * 4 + trimestre - 1). O frame
+    retornado é novo: a base original não é alterada.
+    """
+    df = df.copy()
+    df[date_column] = pd.to_datetime(df[date_column], errors="coerce")
     df[valor_column] = pd.to_numeric(df[valor_column], errors="coerce")
     df = df.dropna(subset=[date_column, valor_column])
 
+    datas = df[date_column]
+    anos = datas.dt.year.to_numpy(dtype=np.int32)
+    periodo_mes = anos * 12 + datas.dt.month.to_numpy(dtype=np.int32) - 1
+    periodo_tri = anos * 4 + datas.dt.quarter.to_numpy(dtype=np.int32) - 1
+
+    df["periodo_mes"] = periodo_mes
+    df["periodo_tri"] = periodo_tri
+    df["mes_ano"] = _rotulos_periodo(periodo_mes, rotulo_mes)
+    df["trimestre"] = _rotulos_periodo(periodo_tri, rotulo_trimestre)
+    df["ano"] = pd.Categorical(anos, ordered=True)
+    return df
+
+def listar_periodos(df):
+    """Lista meses, anos e trimestres presentes em uma base preparada"""
     meses_unicos = sorted(df["mes_ano"].dropna().unique())
     anos_unicos = sorted(set(int(a) for a in df["ano"].dropna().unique()))
     trimestres_unicos = sorted(df["trimestre"].dropna().unique())
-
-    return df, meses_unicos, anos_unicos, trimestres_unicos
+    return meses_unicos, anos_unicos, trimestres_unicos
 
 def separar_realizado_orcamento(df, origem_column="origem"):
     """Separa dados realizados e orçamentários"""
@@ -23,124 +158,24 @@ def separar_realizado_orcamento(df, origem_column="origem"):
     
     return df_real, df_orc
 
-def calcular_totais_por_periodo(df_real, df_orc, meses_unicos, trimestres_unicos, anos_unicos, 
-                               conta_column, valor_column="valor"):
-    """Calcula totais por período para realizado e orçamento"""
-    
-    # Realizado
-    total_real_por_mes = {
-        mes: df_real[df_real["mes_ano"] == mes].groupby(conta_column)[valor_column].sum().to_dict()
-        for mes in meses_unicos
-    }
-
-    # Orçamento
-    total_orc_por_mes = {
-        mes: df_orc[df_orc["mes_ano"] == mes].groupby(conta_column)[valor_column].sum().to_dict()
-        for mes in meses_unicos
-    }
-
-    # Trimestres
-    total_real_por_tri = {}
-    total_orc_por_tri = {}
-
-    for tri in trimestres_unicos:
-        meses_do_tri = df_real[df_real["trimestre"] == tri]["mes_ano"].unique()
-        soma_real = {}
-        soma_orc = {}
-        for mes in meses_do_tri:
-            for conta, valor in total_real_por_mes.get(mes, {}).items():
-                soma_real[conta] = soma_real.get(conta, 0) + valor
-            for conta, valor in total_orc_por_mes.get(mes, {}).items():
-                soma_orc[conta] = soma_orc.get(conta, 0) + valor
-        total_real_por_tri[tri] = soma_real
-        total_orc_por_tri[tri] = soma_orc
-
-    # Anos
-    total_real_por_ano = {}
-    total_orc_por_ano = {}
-    for ano in anos_unicos:
-        meses_do_ano = [m for m in meses_unicos if m.startswith(str(ano))]
-        soma_real = {}
-        soma_orc = {}
-        for mes in meses_do_ano:
-            for conta, valor in total_real_por_mes.get(mes, {}).items():
-                soma_real[conta] = soma_real.get(conta, 0) + valor
-            for conta, valor in total_orc_por_mes.get(mes, {}).items():
-                soma_orc[conta] = soma_orc.get(conta, 0) + valor
-        total_real_por_ano[ano] = soma_real
-        total_orc_por_ano[ano] = soma_orc
-
-    # Totais gerais
-    total_geral_real = {}
-    total_geral_orc = {}
-    for mes in meses_unicos:
-        if mes in total_real_por_mes:
-            for conta, valor in total_real_por_mes[mes].items():
-                total_geral_real[conta] = total_geral_real.get(conta, 0) + valor
-        if mes in total_orc_por_mes:
-            for conta, valor in total_orc_por_mes[mes].items():
-                total_geral_orc[conta] = total_geral_orc.get(conta, 0) + valor
-
-    return {
-        'total_real_por_mes': total_real_por_mes,
-        'total_orc_por_mes': total_orc_por_mes,
-        'total_real_por_tri': total_real_por_tri,
-        'total_orc_por_tri': total_orc_por_tri,
-        'total_real_por_ano': total_real_por_ano,
-        'total_orc_por_ano': total_orc_por_ano,
-        'total_geral_real': total_geral_real,
-        'total_geral_orc': total_geral_orc
-    }
-
-def calcular_totalizadores(valores_dict, estrutura):
-    """Calcula totalizadores dinamicamente baseados na estrutura"""
-    totalizadores = {}
-    
-    for item in estrutura:
-        totalizador_nome = item["totalizador"]
-        if totalizador_nome and totalizador_nome not in totalizadores:
-            totalizadores[totalizador_nome] = 0
-        
-        if totalizador_nome:
-            valor_conta = valores_dict.get(item["nome"], 0)
-            if item["tipo"] in ["+", "+/-"]:
-                totalizadores[totalizador_nome] += valor_conta
-            elif item["tipo"] == "-":
-                totalizadores[totalizador_nome] -= valor_conta
-    
-    return totalizadores
-
-def calcular_mom(df_filtrado, date_column, origem):
-    """Calcula variação Month over Month (MoM)"""
-    try:
-        # Agrupar por mês e somar valores
-        df_mensal = df_filtrado.groupby(
-            df_filtrado[date_column].dt.to_period('M')
-        )['valor'].sum().reset_index()
-        
-        # Ordenar por data
-        df_mensal = df_mensal.sort_values(date_column)
-        
-        # Calcular variação MoM
-        df_mensal['valor_anterior'] = df_mensal['valor'].shift(1)
-        df_mensal['variacao_absoluta'] = df_mensal['valor'] - df_mensal['valor_anterior']
-        df_mensal['variacao_percentual'] = (
-            (df_mensal['valor'] - df_mensal['valor_anterior']) / 
-            df_mensal['valor_anterior'] * 100
-        ).round(2)
-        
-        # Preparar dados para retorno
-        mom_data = []
-        for _, row in df_mensal.iterrows():
-            mom_data.append({
-                "mes": str(row[date_column]),
-                "valor_atual": round(row['valor'], 2),
-                "valor_anterior": round(row['valor_anterior'], 2) if pd.notna(row['valor_anterior']) else None,
-                "variacao_absoluta": round(row['variacao_absoluta'], 2) if pd.notna(row['variacao_absoluta']) else None,
-                "variacao_percentual": row['variacao_percentual'] if pd.notna(row['variacao_percentual']) else None
-            })
-        
-        return mom_data
-        
-    except Exception as e:
-        return [] 
\ No newline at end of file
+def calcular_mom_mensal(codigos_mes, valores_mensais):
+    """Variação Month over Month (MoM) a partir das somas mensais já agregadas
+
+    codigos_mes são códigos periodo_mes crescentes, um por mês com lançamentos.
+    """
+    valores = np.asarray(valores_mensais, dtype=np.float64)
+    anteriores = np.concatenate([[np.nan], valores[:-1]])
+    variacoes = valores - anteriores
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentuais = np.round(variacoes / anteriores * 100, 2)
+
+    mom_data = []
+    for codigo, valor, anterior, variacao, percentual in zip(codigos_mes, valores, anteriores, variacoes, percentuais):
+        mom_data.append({
+            "mes": rotulo_mes(int(codigo)),
+            "valor_atual": round(valor, 2),
+            "valor_anterior": round(anterior, 2) if pd.notna(anterior) else None,
+            "variacao_absoluta": round(variacao, 2) if pd.notna(variacao) else None,
+            "variacao_percentual": percentual if pd.notna(percentual) else None
+        })
+    return mom_data
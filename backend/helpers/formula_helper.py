@@ -0,0 +1,127 @@
+"""
+Motor de fórmulas das estruturas DRE/DFC
+
+Os operadores da estrutura (+, -, +/-, =) são compilados uma vez por versão da
+estrutura em coeficientes esparsos (linha do totalizador, conta de entrada,
+coeficiente). Todos os totalizadores, em todos os períodos e nos dois cenários,
+saem de um único produto sobre o cubo de contas.
+"""
+import numpy as np
+from .cube_helper import FinancialCube
+
+
+class FormulaEstrutura:
+    """Totalizadores de uma estrutura como matriz esparsa de coeficientes (formato COO)
+
+    Cada termo soma coeficiente × valor (ou × |valor|, quando absoluto) da conta
+    de entrada na linha do totalizador.
+    """
+
+    def __init__(self, resultados, entradas, linhas, colunas, coeficientes, absolutos=None):
+        self.resultados = list(resultados)
+        self.entradas = list(entradas)
+        self.linhas = np.asarray(linhas, dtype=np.int64)
+        self.colunas = np.asarray(colunas, dtype=np.int64)
+        self.coeficientes = np.asarray(coeficientes, dtype=np.float64)
+        self.absolutos = (
+            np.zeros(len(self.linhas), dtype=bool) if absolutos is None
+            else np.asarray(absolutos, dtype=bool)
+        )
+
+    def _produto(self, valores):
+        """Aplica os coeficientes a uma matriz entradas × (...) e retorna resultados × (...)"""
+        termos = valores[self.colunas]
+        termos = np.where(self.absolutos.reshape((-1,) + (1,) * (termos.ndim - 1)), np.abs(termos), termos)
+        termos = termos * self.coeficientes.reshape((-1,) + (1,) * (termos.ndim - 1))
+        resultado = np.zeros((len(self.resultados),) + valores.shape[1:])
+        np.add.at(resultado, self.linhas, termos)
+        return resultado
+
+    def aplicar(self, cubo):
+        """Novo FinancialCube com uma linha por totalizador, nos períodos do cubo dado"""
+        entradas = cubo.selecionar(self.entradas)
+
+        # Mês, trimestre, ano e total lado a lado: um único produto para tudo
+        blocos = [entradas.mensal, entradas.trimestral, entradas.anual, entradas.total[:, None, :]]
+        cortes = np.cumsum([bloco.shape[1] for bloco in blocos])[:-1]
+        mensal, trimestral, anual, total = np.split(self._produto(np.concatenate(blocos, axis=1)), cortes, axis=1)
+
+        return FinancialCube(
+            self.resultados, cubo.meses, cubo.trimestres, cubo.anos,
+            mensal, trimestral, anual, total[:, 0, :]
+        )
+
+    def aplicar_valores(self, valores_dict):
+        """Aplica a fórmula a um dicionário {conta: valor} e retorna {totalizador: valor}"""
+        valores = np.array([valores_dict.get(nome, 0) for nome in self.entradas], dtype=np.float64)
+        return dict(zip(self.resultados, self._produto(valores).tolist()))
+
+
+class _Compilador:
+    """Acumula termos (totalizador, conta, coeficiente) enquanto a estrutura é percorrida"""
+
+    def __init__(self, resultados):
+        self.resultados = list(resultados)
+        self.posicao_resultado = {nome: i for i, nome in enumerate(self.resultados)}
+        self.entradas = []
+        self.posicao_entrada = {}
+        self.termos = []
+
+    def adicionar(self, resultado, conta, coeficiente, absoluto=False):
+        coluna = self.posicao_entrada.get(conta)
+        if coluna is None:
+            coluna = self.posicao_entrada[conta] = len(self.entradas)
+            self.entradas.append(conta)
+        self.termos.append((self.posicao_resultado[resultado], coluna, coeficiente, absoluto))
+
+    def compilar(self):
+        linhas, colunas, coeficientes, absolutos = zip(*self.termos) if self.termos else ((), (), (), ())
+        return FormulaEstrutura(self.resultados, self.entradas, linhas, colunas, coeficientes, absolutos)
+
+
+def compilar_formula_dre(estrutura_dre):
+    """Compila os totalizadores (=) da DRE
+
+    Cada totalizador soma os itens anteriores a ele: + e +/- entram com o próprio
+    sinal e - sempre subtrai o valor absoluto.
+    """
+    resultados = list(dict.fromkeys(item["nome"] for item in estrutura_dre if item["tipo"] == "="))
+    compilador = _Compilador(resultados)
+
+    # Primeira ocorrência de cada nome: os contribuintes são os itens antes dela
+    primeira = {}
+    for i, item in enumerate(estrutura_dre):
+        primeira.setdefault(item["nome"], i)
+
+    for item in estrutura_dre:
+        if item["tipo"] != "=":
+            continue
+        for anterior in estrutura_dre[:primeira[item["nome"]]]:
+            if anterior["tipo"] in ["+", "+/-"]:
+                compilador.adicionar(item["nome"], anterior["nome"], 1)
+            elif anterior["tipo"] == "-":
+                compilador.adicionar(item["nome"], anterior["nome"], -1, absoluto=True)
+    return compilador.compilar()
+
+
+def compilar_formula_dfc(estrutura_dfc):
+    """Compila os totalizadores da DFC com sinal (+ e +/- somam, - subtrai)"""
+    resultados = list(dict.fromkeys(item["totalizador"] for item in estrutura_dfc if item["totalizador"]))
+    compilador = _Compilador(resultados)
+    for item in estrutura_dfc:
+        if not item["totalizador"]:
+            continue
+        if item["tipo"] in ["+", "+/-"]:
+            compilador.adicionar(item["totalizador"], item["nome"], 1)
+        elif item["tipo"] == "-":
+            compilador.adicionar(item["totalizador"], item["nome"], -1)
+    return compilador.compilar()
+
+
+def compilar_soma_dfc(estrutura_dfc, totalizadores_ordenados):
+    """Compila a soma simples das contas de cada totalizador DFC (valores exibidos na linha)"""
+    compilador = _Compilador(totalizadores_ordenados)
+    for item in estrutura_dfc:
+        if item["totalizador"] in compilador.posicao_resultado:
+            compilador.adicionar(item["totalizador"], item["nome"], 1)
+    return compilador.compilar()
@@ -0,0 +1,106 @@
+"""
+Pool de processos para os relatórios da planilha Excel (/dre, /dre/classificacoes, /dfc)
+
+A montagem dos relatórios é CPU (pandas/numpy e Python puro): em threads ela
+disputa o GIL e ocupa o threadpool do Starlette, e endpoints baratos ficam na
+fila. Aqui ela roda em um pool limitado de processos:
+
+- cada worker mantém o próprio WorkbookStore (carregado do snapshot colunar na
+  inicialização), então só os parâmetros da query atravessam o processo; o
+  orçamento WORKBOOK_MEMORY_BUDGET_MB é dividido entre o processo da API e os
+  workers (helpers/workbook_store.py);
+- o worker devolve o JSON já serializado, com a versão da planilha usada;
+- com REPORT_POOL_WORKERS=0 (ou se o pool quebrar) a montagem volta a rodar
+  no threadpool, como antes.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+REPORT_POOL_WORKERS = int(os.getenv("REPORT_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Cabeçalho com a versão da planilha usada na montagem (conferido pelo cache de respostas)
+CABECALHO_VERSAO = "X-Data-Version"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def serializar_json(payload):
+    """Mesmos bytes que o JSONResponse do FastAPI geraria para o payload"""
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _inicializar_worker():
+    """Carrega a planilha padrão ao subir o worker, para o primeiro relatório já sair quente"""
+    from .workbook_store import get_workbook_store, DEFAULT_WORKBOOK
+
+    try:
+        get_workbook_store(DEFAULT_WORKBOOK).get_snapshot()
+    except Exception as e:
+        print(f"⚠️ Worker de relatórios sem planilha pré-carregada: {e}")
+
+
+def _executar(funcao, *argumentos):
+    """Monta o relatório (funcao(*argumentos) -> (versao, payload)) e serializa no próprio worker"""
+    versao, payload = funcao(*argumentos)
+    return versao, serializar_json(payload)
+
+
+def obter_pool():
+    """Pool compartilhado (criado no primeiro uso); spawn evita herdar threads e locks do servidor"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=REPORT_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_worker,
+            )
+        return _pool
+
+
+def encerrar_pool(esperar=False):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=esperar, cancel_futures=True)
+
+
+async def executar_relatorio(funcao, *argumentos):
+    """Roda funcao(*argumentos) em um worker e devolve a Response JSON
+
+    funcao precisa ser uma função de módulo (picklable) que recebe apenas
+    parâmetros simples (dict da query, strings) e retorna
+    (versao da planilha ou None, payload).
+    """
+    if REPORT_POOL_WORKERS > 0:
+        try:
+            loop = asyncio.get_running_loop()
+            versao, corpo = await loop.run_in_executor(obter_pool(), _executar, funcao, *argumentos)
+        except BrokenProcessPool as e:
+            # Worker morto (ex.: falta de memória): recria o pool no próximo request
+            print(f"❌ Pool de relatórios quebrado, montando no servidor: {e}")
+            encerrar_pool()
+            versao, corpo = await run_in_threadpool(_executar, funcao, *argumentos)
+    else:
+        versao, corpo = await run_in_threadpool(_executar, funcao, *argumentos)
+
+    return Response(
+        corpo, media_type="application/json", headers={CABECALHO_VERSAO: versao} if versao else None
+    )
+
+
+def status_pool():
+    with _pool_lock:
+        ativo = _pool is not None
+    return {"workers": REPORT_POOL_WORKERS, "ativo": ativo}
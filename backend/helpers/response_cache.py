@@ -0,0 +1,235 @@
+"""
+Cache de respostas dos endpoints da planilha Excel (/dre, /dre/classificacoes/{conta}, /dfc, /receber, /pagar)
+
+A resposta depende apenas da versão da planilha e dos parâmetros da query, então
+é memoizada já serializada, por (versão, rota, parâmetros normalizados):
+
+- LRU em memória com limite de bytes (por processo);
+- camada Redis opcional (quando REDIS_URL está definido), compartilhada pelos workers;
+- ETag forte derivado da própria chave: um If-None-Match igual retorna 304 sem
+  calcular nem serializar nada.
+
+A versão é a da planilha do cliente/grupo pedido na query, então cada cliente
+tem suas próprias entradas.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+import redis
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+from config.redis_config import ENABLE_CACHE, RESPONSE_CACHE_MAX_MB, RESPONSE_CACHE_TTL
+from .workbook_store import get_workbook_store, resolver_workbook
+from .report_pool import CABECALHO_VERSAO
+
+# Rotas cacheadas -> a resposta também depende do dia corrente (prazos calculados a partir de hoje)
+ROTAS_CACHEADAS = {
+    "/dre": False,
+    "/dfc": False,
+    "/receber": True,
+    "/pagar": True,
+}
+
+# Prefixos de rotas com parâmetro no caminho -> mesmo significado de ROTAS_CACHEADAS
+PREFIXOS_CACHEADOS = {
+    "/dre/classificacoes/": False,
+}
+
+REDIS_RETRY_INTERVAL = 60  # segundos sem tentar o Redis depois de uma falha
+
+
+class LRUBytes:
+    """LRU de respostas serializadas limitado pelo total de bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave):
+        with self._lock:
+            corpo = self._itens.get(chave)
+            if corpo is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return corpo
+
+    def set(self, chave, corpo):
+        if len(corpo) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._itens[chave] = corpo
+            self._bytes += len(corpo)
+            while self._bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def status(self):
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class RedisRespostas:
+    """Camada Redis opcional; falhas desligam a camada por REDIS_RETRY_INTERVAL segundos"""
+
+    def __init__(self, url, ttl):
+        self.url = url
+        self.ttl = ttl
+        self._cliente = None
+        self._falhou_em = None
+
+    def _conectar(self):
+        if not self.url:
+            return None
+        if self._falhou_em is not None and time.time() - self._falhou_em < REDIS_RETRY_INTERVAL:
+            return None
+        if self._cliente is None:
+            self._cliente = redis.from_url(self.url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return self._cliente
+
+    def _falha(self, e):
+        print(f"❌ Cache Redis de respostas indisponível: {e}")
+        self._falhou_em = time.time()
+        self._cliente = None
+
+    def get(self, chave):
+        cliente = self._conectar()
+        if cliente is None:
+            return None
+        try:
+            return cliente.get(chave)
+        except Exception as e:
+            self._falha(e)
+            return None
+
+    def set(self, chave, corpo):
+        cliente = self._conectar()
+        if cliente is None:
+            return
+        try:
+            cliente.setex(chave, self.ttl, corpo)
+        except Exception as e:
+            self._falha(e)
+
+
+memoria = LRUBytes(RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+compartilhado = RedisRespostas(os.getenv("REDIS_URL") if ENABLE_CACHE else None, RESPONSE_CACHE_TTL)
+
+
+def chave_resposta(versao, rota, query_items, dia=None):
+    """Chave (versão, rota, parâmetros normalizados): ordem e parâmetros vazios não importam"""
+    parametros = "&".join(f"{k}={v}" for k, v in sorted(query_items) if v != "")
+    if dia is not None:
+        parametros += f"#dia={dia}"
+    resumo = hashlib.sha1(f"{versao}|{rota}|{parametros}".encode()).hexdigest()
+    return f"excel:{rota}:{resumo}"
+
+
+def etag_resposta(chave):
+    return f'"{chave.rsplit(":", 1)[-1]}"'
+
+
+def _rota_cacheada(rota):
+    """None quando a rota não é cacheada; senão, se a resposta depende do dia corrente"""
+    if rota in ROTAS_CACHEADAS:
+        return ROTAS_CACHEADAS[rota]
+    return next((por_dia for prefixo, por_dia in PREFIXOS_CACHEADOS.items() if rota.startswith(prefixo)), None)
+
+
+
+
+class CacheRespostasMiddleware(BaseHTTPMiddleware):
+    """Serve as rotas da planilha do cache (ou 304) quando a versão não mudou"""
+
+    async def dispatch(self, request, call_next):
+        rota = request.url.path
+        por_dia = _rota_cacheada(rota)
+        if request.method != "GET" or por_dia is None:
+            return await call_next(request)
+
+        filename, erro = resolver_workbook(
+            request.query_params.get("cliente"), request.query_params.get("grupo")
+        )
+        if erro:
+            return await call_next(request)
+
+        # Sem ler a planilha no event loop: sem versão carregada (cold start, cliente
+        # novo, versão descartada pelo orçamento) o request segue sem cache e carrega
+        store = get_workbook_store(filename)
+        snapshot = store.peek_atualizado()
+        if snapshot is None:
+            return await call_next(request)
+        versao = snapshot.versao
+
+        dia = date.today().isoformat() if por_dia else None
+        chave = chave_resposta(versao, rota, request.query_params.multi_items(), dia)
+        etag = etag_resposta(chave)
+        cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag in [valor.strip() for valor in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=cabecalhos)
+
+        corpo = memoria.get(chave)
+        origem = "memory"
+        if corpo is None:
+            corpo = compartilhado.get(chave)
+            origem = "redis"
+            if corpo is not None:
+                memoria.set(chave, corpo)
+        if corpo is not None:
+            return Response(corpo, media_type="application/json", headers={**cabecalhos, "X-Cache": origem})
+
+        resposta = await call_next(request)
+        corpo = b"".join([parte async for parte in resposta.body_iterator])
+        cabecalhos_resposta = {
+            nome: valor for nome, valor in resposta.headers.items() if nome.lower() != "content-length"
+        }
+
+        # Só guarda respostas de sucesso calculadas sobre a mesma versão (a troca de versão
+        # no meio do request é vista pela identidade do snapshot, sem recalcular a versão);
+        # relatórios montados no pool de processos informam a versão que o worker usou
+        cacheavel = (
+            resposta.status_code == 200
+            and not corpo.startswith(b'{"error"')
+            and store.peek() is snapshot
+            and resposta.headers.get(CABECALHO_VERSAO, versao) == versao
+        )
+        if cacheavel:
+            memoria.set(chave, corpo)
+            compartilhado.set(chave, corpo)
+            cabecalhos_resposta.update({**cabecalhos, "X-Cache": "miss"})
+
+        return Response(
+            corpo, status_code=resposta.status_code, headers=cabecalhos_resposta, media_type=resposta.media_type
+        )
+
+
+def limpar_cache_respostas():
+    """Descarta as respostas em memória (as chaves no Redis expiram pelo TTL ou mudam com a versão)"""
+    memoria.clear()
+
+
+def status_cache_respostas():
+    return {**memoria.status(), "redis": compartilhado.url is not None}
@@ -0,0 +1,209 @@
+"""
+Snapshot colunar (Arrow/Feather) da planilha Excel
+
+A primeira leitura (ou qualquer leitura após o arquivo mudar) converte as abas
+usadas pela API para arquivos Feather ao lado da planilha. As leituras seguintes
+fazem memory-map desses arquivos em vez de reprocessar o Excel com openpyxl.
+"""
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow é opcional: sem ele a planilha é lida direto do Excel
+    pa = None
+    feather = None
+
+# Abas convertidas no snapshot (base de lançamentos + estruturas DRE/DFC)
+ABAS_SNAPSHOT = ["base", "dre", "dre_n1", "dre_n2", "dfc_n1", "dfc_n2"]
+NA_VALUES = ['', 'NaN', 'N/A', 'null']
+
+# Incrementar quando o formato gravado mudar, para invalidar snapshots antigos
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFESTO = "manifest.json"
+
+
+def caminho_snapshot(filename):
+    """Retorna o diretório do snapshot, ao lado da planilha"""
+    pasta, nome = os.path.split(os.path.abspath(filename))
+    return os.path.join(pasta, f".{nome}.snapshot")
+
+
+def calcular_hash_arquivo(filename, chunk_size=1024 * 1024):
+    """Calcula o SHA-256 do arquivo em blocos"""
+    sha = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for bloco in iter(lambda: f.read(chunk_size), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, MANIFESTO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_manifesto(pasta, manifesto):
+    destino = os.path.join(pasta, MANIFESTO)
+    temporario = f"{destino}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f)
+    os.replace(temporario, destino)
+
+
+def _manifesto_valido(manifesto, pasta):
+    """Verifica se o manifesto é do formato atual e se todos os arquivos existem"""
+    if not manifesto or manifesto.get("formato") != SNAPSHOT_FORMAT_VERSION:
+        return False
+    return all(
+        os.path.exists(os.path.join(pasta, f"{aba}.feather"))
+        for aba in manifesto.get("abas", [])
+    )
+
+
+def _tipar_para_arrow(df):
+    """Ajusta colunas que o Arrow não consegue tipar (ex.: números e textos misturados)
+
+    Aplicado ao DataFrame lido do Excel antes de gravar o snapshot, para que a
+    leitura direta e a do snapshot devolvam os mesmos tipos.
+    """
+    if not all(isinstance(col, str) for col in df.columns):
+        df.columns = [str(col) for col in df.columns]
+
+    for coluna in df.columns:
+        if df[coluna].dtype != object:
+            continue
+        tipo = pd.api.types.infer_dtype(df[coluna], skipna=True)
+        if tipo.startswith("mixed"):
+            df[coluna] = df[coluna].where(df[coluna].isna(), df[coluna].astype(str))
+    return df
+
+
+def _ler_excel(filename, abas):
+    """Lê as abas solicitadas abrindo a planilha uma única vez"""
+    excel = pd.ExcelFile(filename, engine="openpyxl")
+    frames = {
+        aba: _tipar_para_arrow(excel.parse(aba, na_values=NA_VALUES))
+        for aba in abas
+        if aba in excel.sheet_names
+    }
+    return frames, list(excel.sheet_names)
+
+
+def _gravar_snapshot(pasta, frames, abas_planilha, assinatura):
+    """Grava as abas em Feather e, por último, o manifesto"""
+    os.makedirs(pasta, exist_ok=True)
+    for aba, df in frames.items():
+        destino = os.path.join(pasta, f"{aba}.feather")
+        temporario = f"{destino}.tmp"
+        feather.write_feather(df, temporario)
+        os.replace(temporario, destino)
+
+    _gravar_manifesto(pasta, {
+        "formato": SNAPSHOT_FORMAT_VERSION,
+        "abas": list(frames.keys()),
+        "abas_planilha": abas_planilha,
+        "criado_em": time.time(),
+        **assinatura,
+    })
+
+
+def _tabela_para_pandas(tabela):
+    """Converte a tabela Arrow; datas fora do intervalo de datetime64[ns] ficam como objeto
+
+    É o mesmo tipo que a leitura direta do Excel produz para essas colunas.
+    """
+    try:
+        return tabela.to_pandas()
+    except pa.ArrowInvalid:
+        colunas = {}
+        for nome in tabela.column_names:
+            coluna = tabela.column(nome)
+            try:
+                colunas[nome] = coluna.to_pandas()
+            except pa.ArrowInvalid:
+                colunas[nome] = coluna.to_pandas(timestamp_as_object=True)
+        return pd.DataFrame(colunas)
+
+
+def _ler_snapshot(pasta, abas):
+    frames = {}
+    for aba in abas:
+        tabela = feather.read_table(os.path.join(pasta, f"{aba}.feather"), memory_map=True)
+        frames[aba] = _tabela_para_pandas(tabela)
+    return frames
+
+
+def carregar_abas(filename, abas=None):
+    """Carrega abas da planilha usando o snapshot colunar quando ele está atualizado
+
+    Retorna (frames, info), onde frames é {aba: DataFrame} e info traz o hash da
+    planilha e a origem da leitura ("snapshot" ou "excel").
+    """
+    abas = list(abas or ABAS_SNAPSHOT)
+    stat = os.stat(filename)
+
+    if feather is None:
+        frames, _ = _ler_excel(filename, abas)
+        return frames, {"hash": None, "origem": "excel", "mtime": stat.st_mtime}
+
+    pasta = caminho_snapshot(filename)
+    manifesto = _ler_manifesto(pasta)
+    valido = _manifesto_valido(manifesto, pasta)
+    if valido and any(
+        aba not in manifesto["abas"] and aba in manifesto.get("abas_planilha", [])
+        for aba in abas
+    ):
+        # Aba existente na planilha mas ainda fora do snapshot: regrava incluindo-a
+        valido = False
+    abas_snapshot = [aba for aba in abas if valido and aba in manifesto["abas"]]
+
+    # Mesmo mtime e tamanho: snapshot atual, sem precisar calcular hash
+    if valido and manifesto["mtime"] == stat.st_mtime and manifesto["tamanho"] == stat.st_size:
+        return _ler_snapshot(pasta, abas_snapshot), {
+            "hash": manifesto["hash"], "origem": "snapshot", "mtime": stat.st_mtime
+        }
+
+    # mtime mudou (ex.: arquivo copiado ou "tocado"): confirma pelo conteúdo
+    hash_atual = calcular_hash_arquivo(filename)
+    assinatura = {"hash": hash_atual, "mtime": stat.st_mtime, "tamanho": stat.st_size}
+
+    if valido and manifesto["hash"] == hash_atual:
+        try:
+            _gravar_manifesto(pasta, {**manifesto, **assinatura})
+        except OSError as e:
+            print(f"⚠️ Não foi possível atualizar o manifesto do snapshot: {e}")
+        return _ler_snapshot(pasta, abas_snapshot), {
+            "hash": hash_atual, "origem": "snapshot", "mtime": stat.st_mtime
+        }
+
+    # Conteúdo novo: lê o Excel uma vez e regrava o snapshot completo
+    start_time = time.time()
+    abas_leitura = set(ABAS_SNAPSHOT) | set(abas) | set((manifesto or {}).get("abas", []))
+    frames, abas_planilha = _ler_excel(filename, sorted(abas_leitura))
+    print(f"📄 Excel '{os.path.basename(filename)}' lido em {time.time() - start_time:.2f}s")
+
+    try:
+        _gravar_snapshot(pasta, frames, abas_planilha, assinatura)
+    except Exception as e:
+        # Diretório somente leitura ou coluna não suportada: segue sem snapshot
+        print(f"⚠️ Não foi possível gravar o snapshot colunar: {e}")
+
+    return {aba: frames[aba] for aba in abas if aba in frames}, {
+        "hash": hash_atual, "origem": "excel", "mtime": stat.st_mtime
+    }
+
+
+def ler_aba(filename, aba):
+    """Lê uma única aba da planilha (via snapshot quando disponível)"""
+    frames, _ = carregar_abas(filename, [aba])
+    if aba not in frames:
+        raise ValueError(f"Worksheet named '{aba}' not found")
+    return frames[aba]
@@ -1,5 +1,13 @@
+import numpy as np
 import pandas as pd
 import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from .snapshot_helper import ler_aba
+
+# Marcadores de tipo de operação em uma única expressão: ( + / - ), ( + ), ( - ), ( = ), com ou sem espaços
+PADRAO_TIPO_OPERACAO = re.compile(r'\(\s*(?:\+\s*/\s*-|\+|-|=)\s*\)')
 
 def extrair_tipo_operacao(texto):
     """Extrai o tipo de operação de um texto como '( + ) Recebimentos Operacionais'"""
@@ -35,34 +43,105 @@ def extrair_nome_conta(texto):
     if not texto or pd.isna(texto):
         return ""
     
-    texto = str(texto).strip()
-    
-    # Remover todos os padrões de tipo de operação
-    padroes_para_remover = [
-        r'\(\s*\+\s*/\s*-\s*\)',  # ( + / - )
-        r'\(\s*\+\s*\)',          # ( + )
-        r'\(\s*-\s*\)',           # ( - )
-        r'\(\s*=\s*\)',           # ( = )
-        r'\(\+/-\)',              # (+/-)
-        r'\(\+\)',                # (+)
-        r'\(-\)',                  # (-)
-        r'\(=\)',                 # (=)
-    ]
-    
-    for padrao in padroes_para_remover:
-        texto = re.sub(padrao, '', texto)
+    return _extrair_nome_conta(str(texto).strip())
+
+@lru_cache(maxsize=4096)
+def _extrair_nome_conta(texto):
+    # Remover todos os padrões de tipo de operação (inclusive os que aparecem após uma remoção)
+    removidos = 1
+    while removidos:
+        texto, removidos = PADRAO_TIPO_OPERACAO.subn('', texto)
     
     return texto.strip()
 
+class RotuloConta(namedtuple("RotuloConta", ["nome", "operador", "id"])):
+    """Rótulo "( + ) Nome" interpretado: nome limpo, operador (None sem marcador) e id do nome"""
+
+    @property
+    def tipo(self):
+        """Tipo de operação como em extrair_tipo_operacao ("=" quando não há marcador)"""
+        return self.operador or "="
+
+class DicionarioRotulos:
+    """Rótulos de conta interpretados uma única vez por processo, compartilhado
+    pelas estruturas Excel, pelo repositório e pelos endpoints PostgreSQL
+
+    O id é o mesmo para nomes limpos iguais (sem diferenciar maiúsculas), então
+    contas são comparadas por inteiros em vez de strings.
+    """
+
+    def __init__(self):
+        self._rotulos = {}
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def id_nome(self, nome):
+        """Id de um nome limpo (o mesmo dos rótulos que se reduzem a ele)"""
+        chave = nome.lower()
+        try:
+            return self._ids[chave]
+        except KeyError:
+            with self._lock:
+                return self._ids.setdefault(chave, len(self._ids))
+
+    def rotulo(self, texto):
+        """RotuloConta de um rótulo bruto (texto)"""
+        try:
+            return self._rotulos[texto]
+        except KeyError:
+            pass
+        nome = extrair_nome_conta(texto)
+        operador = extrair_tipo_operacao(texto) if PADRAO_TIPO_OPERACAO.search(texto) else None
+        rotulo = RotuloConta(nome, operador, self.id_nome(nome))
+        with self._lock:
+            return self._rotulos.setdefault(texto, rotulo)
+
+    def _por_valor(self, valores, converter):
+        """Rótulos dos valores distintos e a posição de cada valor entre eles"""
+        unicos = pd.unique(valores)
+        rotulos = [self.rotulo(converter(valor)) for valor in unicos]
+        return rotulos, pd.Index(unicos).get_indexer(valores)
+
+    def ids(self, valores, converter=str):
+        """Array de ids dos nomes limpos de uma coluna (cada valor distinto interpretado uma vez)"""
+        rotulos, posicoes = self._por_valor(valores, converter)
+        return np.array([rotulo.id for rotulo in rotulos], dtype=np.int64)[posicoes]
+
+    def nomes(self, valores, converter=str):
+        """Série de nomes limpos de uma coluna, no mesmo índice"""
+        rotulos, posicoes = self._por_valor(valores, converter)
+        nomes = np.array([rotulo.nome for rotulo in rotulos] + [None], dtype=object)
+        return pd.Series(nomes[posicoes], index=valores.index)
+
+    def operadores(self, valores, converter=str):
+        """Série de operadores de uma coluna (None quando o rótulo não tem marcador)"""
+        rotulos, posicoes = self._por_valor(valores, converter)
+        operadores = np.array([rotulo.operador for rotulo in rotulos] + [None], dtype=object)
+        return pd.Series(operadores[posicoes], index=valores.index)
+
+rotulos_contas = DicionarioRotulos()
+
+def interpretar_rotulo(texto):
+    """Atalho para rotulos_contas.rotulo"""
+    return rotulos_contas.rotulo(str(texto))
+
 def carregar_estrutura_dfc(filename):
     """Carrega a estrutura DFC das abas dfc_n2 e dfc_n1 da planilha"""
     try:
         # Carregar estrutura dfc_n2
-        df_estrutura_n2 = pd.read_excel(filename, sheet_name="dfc_n2")
+        df_estrutura_n2 = ler_aba(filename, "dfc_n2")
         
         # Carregar estrutura dfc_n1 para ordenação
-        df_estrutura_n1 = pd.read_excel(filename, sheet_name="dfc_n1")
+        df_estrutura_n1 = ler_aba(filename, "dfc_n1")
         
+        return montar_estrutura_dfc(df_estrutura_n2, df_estrutura_n1)
+    except Exception as e:
+        print(f"❌ Erro ao carregar estrutura DFC: {e}")
+        return []
+
+def montar_estrutura_dfc(df_estrutura_n2, df_estrutura_n1):
+    """Monta a estrutura DFC a partir das abas dfc_n2 e dfc_n1 já carregadas"""
+    try:
         # Criar mapeamento de dfc_n1 para dfc_n1_id
         mapeamento_n1 = {}
         for _, row in df_estrutura_n1.iterrows():
@@ -78,9 +157,10 @@ def carregar_estrutura_dfc(filename):
             dfc_n2_id = row.get('dfc_n2_id', 0)
             
             if dfc_n2 and dfc_n2 != 'nan':
-                nome = extrair_nome_conta(dfc_n2)
-                tipo = extrair_tipo_operacao(dfc_n2)
-                totalizador = extrair_nome_conta(dfc_n1) if dfc_n1 and dfc_n1 != 'nan' else ""
+                rotulo = interpretar_rotulo(dfc_n2)
+                nome = rotulo.nome
+                tipo = rotulo.tipo
+                totalizador = interpretar_rotulo(dfc_n1).nome if dfc_n1 and dfc_n1 != 'nan' else ""
                 
                 estrutura.append({
                     "nome": nome,
@@ -102,8 +182,19 @@ def carregar_estrutura_dre(filename="db_bluefit - Copia.xlsx"):
     """Carrega a estrutura DRE das abas dre_n2 e dre_n1 da planilha"""
     try:
         # Ler a aba dre_n2
-        df_estrutura_n2 = pd.read_excel(filename, sheet_name="dre_n2")
+        df_estrutura_n2 = ler_aba(filename, "dre_n2")
+        
+        # Carregar estrutura dre_n1 para ordenação
+        df_estrutura_n1 = ler_aba(filename, "dre_n1")
         
+        return montar_estrutura_dre(df_estrutura_n2, df_estrutura_n1)
+    except Exception as e:
+        print(f"❌ Erro ao carregar estrutura DRE: {e}")
+        return []
+
+def montar_estrutura_dre(df_estrutura_n2, df_estrutura_n1):
+    """Monta a estrutura DRE a partir das abas dre_n2 e dre_n1 já carregadas"""
+    try:
         if df_estrutura_n2.empty:
             print("⚠️ Aba dre_n2 está vazia")
             return []
@@ -113,9 +204,6 @@ def carregar_estrutura_dre(filename="db_bluefit - Copia.xlsx"):
             print("⚠️ Colunas dre_n2 ou dre_n1 não encontradas na aba dre_n2")
             return []
         
-        # Carregar estrutura dre_n1 para ordenação
-        df_estrutura_n1 = pd.read_excel(filename, sheet_name="dre_n1")
-        
         # Criar mapeamento de dre_n1 para dre_n1_id
         mapeamento_n1 = {}
         for _, row in df_estrutura_n1.iterrows():
@@ -131,9 +219,10 @@ def carregar_estrutura_dre(filename="db_bluefit - Copia.xlsx"):
             dre_n2_id = row.get('dre_n2_id', 0)
             
             if pd.notna(dre_n2) and str(dre_n2).strip():
-                nome = extrair_nome_conta(str(dre_n2))
-                tipo = extrair_tipo_operacao(str(dre_n2))
-                totalizador = extrair_nome_conta(str(dre_n1)) if pd.notna(dre_n1) and str(dre_n1).strip() else ""
+                rotulo = interpretar_rotulo(dre_n2)
+                nome = rotulo.nome
+                tipo = rotulo.tipo
+                totalizador = interpretar_rotulo(dre_n1).nome if pd.notna(dre_n1) and str(dre_n1).strip() else ""
                 
                 estrutura.append({
                     "nome": nome,
@@ -156,8 +245,16 @@ def carregar_estrutura_dre_simplificada(filename="db_bluefit - Copia.xlsx"):
     """Carrega a estrutura DRE da aba 'dre' com estrutura simplificada"""
     try:
         # Ler a aba dre
-        df_estrutura = pd.read_excel(filename, sheet_name="dre")
+        df_estrutura = ler_aba(filename, "dre")
         
+        return montar_estrutura_dre_simplificada(df_estrutura)
+    except Exception as e:
+        print(f"❌ Erro ao carregar estrutura DRE simplificada: {e}")
+        return []
+
+def montar_estrutura_dre_simplificada(df_estrutura):
+    """Monta a estrutura DRE simplificada a partir da aba 'dre' já carregada"""
+    try:
         if df_estrutura.empty:
             print("⚠️ Aba dre está vazia")
             return []
@@ -173,8 +270,9 @@ def carregar_estrutura_dre_simplificada(filename="db_bluefit - Copia.xlsx"):
             dre_id = row.get('dre_id', 0)
             
             if pd.notna(dre) and str(dre).strip():
-                nome = extrair_nome_conta(str(dre))
-                tipo = extrair_tipo_operacao(str(dre))
+                rotulo = interpretar_rotulo(dre)
+                nome = rotulo.nome
+                tipo = rotulo.tipo
                 
                 estrutura.append({
                     "nome": nome,
@@ -193,6 +291,17 @@ def carregar_estrutura_dre_simplificada(filename="db_bluefit - Copia.xlsx"):
         print(f"❌ Erro ao carregar estrutura DRE simplificada: {e}")
         return [] 
 
+def mapear_ordem_dfc_n1(df_estrutura_n1):
+    """Mapeia o nome limpo de cada totalizador dfc_n1 para seu dfc_n1_id"""
+    mapeamento_n1_ordenacao = {}
+    for _, row in df_estrutura_n1.iterrows():
+        dfc_n1 = str(row.get('dfc_n1', ''))
+        dfc_n1_id = row.get('dfc_n1_id', 0)
+        if dfc_n1 and dfc_n1 != 'nan':
+            nome_limpo = interpretar_rotulo(dfc_n1).nome
+            mapeamento_n1_ordenacao[nome_limpo] = dfc_n1_id
+    return mapeamento_n1_ordenacao
+
 def verificar_correspondencia_dados_estrutura(df, estrutura, coluna_dados, nome_estrutura="estrutura"):
     """Verifica e normaliza a correspondência entre dados e estrutura"""
     contas_dados = set(df[coluna_dados].unique())
@@ -211,39 +320,49 @@ def verificar_correspondencia_dados_estrutura(df, estrutura, coluna_dados, nome_
         "correspondencia_perfeita": len(contas_sem_dados) == 0 and len(contas_sem_estrutura) == 0
     }
 
-def normalizar_nomes_contas(df, coluna, estrutura):
-    """Tenta normalizar nomes de contas para melhorar correspondência"""
-    # Criar mapeamento de normalização
-    mapeamento = {}
-    
-    # Para cada conta nos dados, tentar encontrar correspondência na estrutura
-    for conta_dados in df[coluna].unique():
-        if pd.isna(conta_dados):
-            continue
-            
-        conta_dados_str = str(conta_dados).strip()
-        
-        # Buscar correspondência exata
-        if conta_dados_str in [item["nome"] for item in estrutura]:
-            continue
-            
-        # Buscar correspondência parcial (case insensitive)
+class IndiceNormalizacao:
+    """Nomes da estrutura indexados para normalizar os nomes de conta dos dados
+
+    Montado uma vez por versão da estrutura: nomes exatos e um dicionário
+    nome em minúsculas -> nome canônico (o primeiro da estrutura).
+    """
+
+    def __init__(self, estrutura):
+        self.nomes = frozenset(item["nome"] for item in estrutura)
+        self.minusculas = {}
         for item in estrutura:
-            if conta_dados_str.lower() == item["nome"].lower():
-                mapeamento[conta_dados_str] = item["nome"]
-                break
-        
-        # Se não encontrou, tentar extrair o nome da conta
-        nome_extraido = extrair_nome_conta(conta_dados_str)
-        if nome_extraido and nome_extraido != conta_dados_str:
-            # Verificar se o nome extraído existe na estrutura
-            for item in estrutura:
-                if nome_extraido.lower() == item["nome"].lower():
-                    mapeamento[conta_dados_str] = item["nome"]
-                    break
+            self.minusculas.setdefault(item["nome"].lower(), item["nome"])
+
+    def normalizar(self, conta):
+        """Nome canônico para a conta dos dados, ou None quando não há o que trocar"""
+        if not isinstance(conta, str) or conta != conta.strip() or conta in self.nomes:
+            return None
+
+        # Correspondência case insensitive; o nome extraído (sem o tipo) tem prioridade
+        canonico = self.minusculas.get(conta.lower())
+        nome_extraido = extrair_nome_conta(conta)
+        if nome_extraido and nome_extraido != conta:
+            canonico = self.minusculas.get(nome_extraido.lower(), canonico)
+        return canonico
+
+def normalizar_nomes_contas(df, coluna, estrutura, indice=None):
+    """Tenta normalizar nomes de contas para melhorar correspondência
+
+    indice é o IndiceNormalizacao da estrutura, quando já montado.
+    """
+    if indice is None:
+        indice = IndiceNormalizacao(estrutura)
+
+    # Criar mapeamento de normalização para as contas distintas dos dados
+    mapeamento = {}
+    for conta_dados in pd.unique(df[coluna].dropna()):
+        canonico = indice.normalizar(conta_dados)
+        if canonico is not None:
+            mapeamento[conta_dados] = canonico
     
     # Aplicar mapeamento se encontrado
     if mapeamento:
-        df[coluna] = df[coluna].replace(mapeamento)
+        mapeado = df[coluna].map(mapeamento)
+        df[coluna] = mapeado.where(mapeado.notna(), df[coluna])
     
-    return df 
\ No newline at end of file
+    return df
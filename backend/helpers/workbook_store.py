@@ -0,0 +1,409 @@
+"""
+Store das planilhas Excel compartilhado pelos endpoints /dre, /dfc, /receber, /pagar e /health
+
+Carrega todas as abas em uma única passada por versão do arquivo, monta as
+estruturas DRE/DFC uma vez e entrega visões somente leitura para os handlers.
+Há um store por planilha (cliente/grupo, ver WORKBOOKS). WORKBOOK_MEMORY_BUDGET_MB
+é o orçamento do servidor (processo da API + workers do pool de relatórios, cada
+um com seus próprios stores), dividido igualmente entre os processos; ao carregar
+uma versão, cada processo descarta o cliente usado há mais tempo até caber na sua parte.
+"""
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+from .snapshot_helper import carregar_abas
+from .data_processor import preparar_base_periodos, listar_periodos
+from .structure_helper import (
+    montar_estrutura_dre_simplificada, montar_estrutura_dfc, mapear_ordem_dfc_n1, IndiceNormalizacao
+)
+from .formula_helper import compilar_formula_dre, compilar_formula_dfc, compilar_soma_dfc
+from .dfc_helper import obter_totalizadores_ordenados
+from .report_pool import REPORT_POOL_WORKERS
+
+CACHE_TIMEOUT = 300  # 5 minutos
+WORKBOOK_POLL_INTERVAL = int(os.getenv("WORKBOOK_POLL_INTERVAL", "5"))  # segundos
+WORKBOOK_MEMORY_BUDGET_MB = int(os.getenv("WORKBOOK_MEMORY_BUDGET_MB", "1024"))  # todas as planilhas, todos os processos
+# Parte de cada processo: o da API e cada worker do pool mantêm cópias próprias das planilhas
+WORKBOOK_MEMORY_BUDGET_PROCESSO_MB = WORKBOOK_MEMORY_BUDGET_MB / (max(REPORT_POOL_WORKERS, 0) + 1)
+
+
+def _carregar_registro():
+    """Planilha de cada cliente/grupo; EXCEL_WORKBOOKS="cliente=arquivo.xlsx;..." substitui o padrão"""
+    configurado = os.getenv("EXCEL_WORKBOOKS")
+    if not configurado:
+        return {"bluefit": "db_bluefit - Copia.xlsx", "tag": "db_TAG - Copia.xlsx"}
+    registro = {}
+    for item in configurado.split(";"):
+        cliente, _, arquivo = item.partition("=")
+        if cliente.strip() and arquivo.strip():
+            registro[cliente.strip().lower()] = arquivo.strip()
+    return registro
+
+
+WORKBOOKS = _carregar_registro()
+DEFAULT_CLIENTE = os.getenv("EXCEL_DEFAULT_CLIENTE", next(iter(WORKBOOKS))).lower()
+DEFAULT_WORKBOOK = WORKBOOKS[DEFAULT_CLIENTE]
+
+
+def resolver_workbook(cliente=None, grupo=None):
+    """Arquivo da planilha do cliente (ou grupo) pedido: retorna (filename, erro)
+
+    Sem cliente nem grupo, usa a planilha padrão (DEFAULT_CLIENTE).
+    """
+    nome = (cliente or grupo or DEFAULT_CLIENTE).strip().lower()
+    filename = WORKBOOKS.get(nome)
+    if filename is None:
+        return None, f"Cliente desconhecido: {nome} (use {', '.join(WORKBOOKS)})"
+    return filename, None
+
+
+def estimar_memoria(valor, vistos=None):
+    """Bytes aproximados de um objeto derivado (frames, arrays, cubos e coleções)
+
+    Objetos compartilhados são contados uma vez; DataFrames e arrays contam os
+    buffers próprios (strings de colunas object são compartilhadas com as abas).
+    """
+    if vistos is None:
+        vistos = set()
+    if id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=False).sum())
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return int(valor.memory_usage(deep=False))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(
+            estimar_memoria(chave, vistos) + estimar_memoria(item, vistos) for chave, item in valor.items()
+        )
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(estimar_memoria(item, vistos) for item in valor)
+    if hasattr(valor, "__dict__") and not isinstance(valor, type):
+        return sys.getsizeof(valor) + estimar_memoria(vars(valor), vistos)
+    return sys.getsizeof(valor)
+
+
+def _congelar_estrutura(estrutura):
+    """Converte a lista de itens da estrutura em tupla de mapeamentos somente leitura"""
+    return tuple(MappingProxyType(dict(item)) for item in estrutura)
+
+
+class WorkbookSnapshot:
+    """Uma versão carregada da planilha: abas, estruturas e derivados"""
+
+    def __init__(self, filename, frames, info):
+        self.filename = filename
+        self.versao = info.get("hash") or f"mtime:{info.get('mtime')}"
+        self.mtime = info.get("mtime")
+        self.origem = info.get("origem")
+        self.carregado_em = time.time()
+        self._frames = frames
+        self._derivados = {}
+        self._derivados_lock = threading.Lock()
+        self._memoria_abas = sum(int(df.memory_usage(index=True, deep=True).sum()) for df in frames.values())
+        self._memoria_derivados = 0
+
+        # Estruturas parseadas e validadas uma única vez por versão
+        self.estrutura_dre = _congelar_estrutura(
+            montar_estrutura_dre_simplificada(frames["dre"]) if "dre" in frames else []
+        )
+        self.estrutura_dfc = _congelar_estrutura(
+            montar_estrutura_dfc(frames["dfc_n2"], frames["dfc_n1"])
+            if "dfc_n2" in frames and "dfc_n1" in frames else []
+        )
+        self.ordem_dfc_n1 = MappingProxyType(
+            mapear_ordem_dfc_n1(frames["dfc_n1"]) if "dfc_n1" in frames else {}
+        )
+
+        # Índices de normalização dos nomes de conta dos dados
+        self.normalizacao_dre = IndiceNormalizacao(self.estrutura_dre)
+        self.normalizacao_dfc = IndiceNormalizacao(self.estrutura_dfc)
+
+        # Operadores das estruturas compilados em coeficientes esparsos (totalizadores)
+        self.totalizadores_dfc = tuple(obter_totalizadores_ordenados(self.estrutura_dfc, self.ordem_dfc_n1))
+        self.formula_dre = compilar_formula_dre(self.estrutura_dre)
+        self.formula_dfc = compilar_formula_dfc(self.estrutura_dfc)
+        self.soma_dfc = compilar_soma_dfc(self.estrutura_dfc, self.totalizadores_dfc)
+
+    def aba(self, nome):
+        """Retorna uma visão da aba (cópia rasa: colunas novas não alteram o store)"""
+        df = self._frames.get(nome)
+        if df is None:
+            return None
+        return df.copy(deep=False)
+
+    @property
+    def base(self):
+        return self.aba("base")
+
+    def derivado(self, chave, fabrica):
+        """Calcula (uma única vez por versão) e memoiza um dado derivado da planilha"""
+        try:
+            return self._derivados[chave]
+        except KeyError:
+            pass
+        with self._derivados_lock:
+            if chave not in self._derivados:
+                valor = fabrica()
+                self._memoria_derivados += estimar_memoria(valor)
+                self._derivados[chave] = valor
+            return self._derivados[chave]
+
+    def memoria(self):
+        """Bytes aproximados da versão: abas carregadas e derivados memoizados"""
+        return {
+            "abas": self._memoria_abas,
+            "derivados": self._memoria_derivados,
+            "total": self._memoria_abas + self._memoria_derivados,
+        }
+
+    def base_periodos(self, date_column, valor_column):
+        """Base preparada com períodos já calculados: (df, meses, anos, trimestres)
+
+        O frame é compartilhado entre requests; os handlers apenas fatiam.
+        """
+        def preparar():
+            df = preparar_base_periodos(self._frames["base"], date_column, valor_column)
+            return (df,) + listar_periodos(df)
+
+        df, meses, anos, trimestres = self.derivado(("base_periodos", date_column, valor_column), preparar)
+        return df.copy(deep=False), list(meses), list(anos), list(trimestres)
+
+    def status(self):
+        base = self._frames.get("base")
+        return {
+            "versao": self.versao,
+            "origem": self.origem,
+            "carregado_em": self.carregado_em,
+            "idade": time.time() - self.carregado_em,
+            "abas": sorted(self._frames.keys()),
+            "data_rows": len(base) if base is not None else 0,
+            "data_columns": len(base.columns) if base is not None else 0,
+        }
+
+
+class WorkbookStore:
+    """Mantém a versão atual da planilha com recarga em background (stale-while-revalidate)
+
+    Os requests sempre recebem a última versão boa; quando o arquivo muda ou o TTL
+    expira, uma única recarga roda em background e a nova versão é trocada
+    atomicamente ao final. Só o primeiro carregamento (cold start) bloqueia.
+    """
+
+    def __init__(self, filename=DEFAULT_WORKBOOK, timeout=CACHE_TIMEOUT, intervalo=WORKBOOK_POLL_INTERVAL):
+        self.filename = filename
+        self.timeout = timeout
+        self.intervalo = intervalo
+        self._snapshot = None
+        self._last_checked = 0
+        self._ultimo_erro = None
+        self._reload_lock = threading.Lock()
+        self._agenda_lock = threading.Lock()
+        self._recarga_agendada = False
+        self._monitor = None
+        self._parar_monitor = threading.Event()
+        self.ultimo_acesso = 0
+
+    def _desatualizado(self, snapshot, now):
+        try:
+            mtime = os.path.getmtime(self.filename)
+        except OSError:
+            return False
+        return snapshot.mtime != mtime or now - self._last_checked > self.timeout
+
+    def _recarregar(self):
+        """Carrega a versão atual do arquivo e troca a versão em memória (chamar com o lock)"""
+        try:
+            frames, info = carregar_abas(self.filename)
+            atual = self._snapshot
+            if atual is not None and info.get("hash") and info["hash"] == atual.versao:
+                # Mesmo conteúdo: mantém a versão atual e seus derivados
+                atual.mtime = info.get("mtime")
+            else:
+                # Troca atômica: a nova versão só fica visível depois de pronta
+                self._snapshot = WorkbookSnapshot(self.filename, frames, info)
+            self._ultimo_erro = None
+        except Exception as e:
+            # Mantém a última versão boa
+            print(f"❌ Erro ao carregar Excel: {e}")
+            self._ultimo_erro = str(e)
+        finally:
+            self._last_checked = time.time()
+
+    def _recarregar_em_background(self):
+        try:
+            with self._reload_lock:
+                self._recarregar()
+        finally:
+            with self._agenda_lock:
+                self._recarga_agendada = False
+        # Fora do lock: descartar outro store pega o lock dele
+        aplicar_orcamento_memoria(self)
+
+    def revalidar(self, bloquear=False):
+        """Dispara a recarga; ignora se já houver uma agendada ou em andamento"""
+        with self._agenda_lock:
+            if self._recarga_agendada:
+                return False
+            self._recarga_agendada = True
+        if bloquear:
+            self._recarregar_em_background()
+        else:
+            threading.Thread(target=self._recarregar_em_background, daemon=True).start()
+        return True
+
+    def get_snapshot(self):
+        """Retorna a última versão boa da planilha (ou None se nunca pôde ser carregada)"""
+        self.ultimo_acesso = time.time()
+        snapshot = self._snapshot
+        if snapshot is None:
+            if not os.path.exists(self.filename):
+                return None
+            # Cold start: apenas uma thread carrega, as demais aguardam o resultado
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self._recarregar()
+            snapshot = self._snapshot
+            aplicar_orcamento_memoria(self)
+        elif self._desatualizado(snapshot, time.time()):
+            self.revalidar()
+        return snapshot
+
+    def get_dataframe(self, aba="base"):
+        """Atalho para a visão de uma aba da versão atual"""
+        snapshot = self.get_snapshot()
+        return snapshot.aba(aba) if snapshot is not None else None
+
+    def peek(self):
+        """Retorna a versão em memória sem verificar o arquivo"""
+        return self._snapshot
+
+    def peek_atualizado(self):
+        """Versão em memória sem carregar a planilha (None quando nada está carregado)
+
+        Se o arquivo mudou, agenda a recarga em background e retorna a versão atual.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self._desatualizado(snapshot, time.time()):
+            self.revalidar()
+        return snapshot
+
+    def clear(self):
+        with self._reload_lock:
+            self._snapshot = None
+            self._last_checked = 0
+
+    def _monitorar(self):
+        # Polling de mtime: recarrega assim que o arquivo muda, sem esperar um request
+        while not self._parar_monitor.wait(self.intervalo):
+            snapshot = self._snapshot
+            if snapshot is not None and self._desatualizado(snapshot, time.time()):
+                self.revalidar(bloquear=True)
+
+    def iniciar_monitoramento(self):
+        """Inicia a thread que observa o arquivo e recarrega em background"""
+        if self._monitor is not None and self._monitor.is_alive():
+            return
+        self._parar_monitor.clear()
+        self._monitor = threading.Thread(target=self._monitorar, name=f"workbook-monitor:{self.filename}", daemon=True)
+        self._monitor.start()
+
+    def parar_monitoramento(self):
+        self._parar_monitor.set()
+
+    def memoria(self):
+        """Bytes da versão em memória (0 quando descarregada)"""
+        snapshot = self._snapshot
+        return snapshot.memoria()["total"] if snapshot is not None else 0
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "arquivo": self.filename,
+            "carregado": snapshot is not None,
+            "memoria": snapshot.memoria() if snapshot is not None else None,
+            "ultimo_acesso": self.ultimo_acesso or None,
+            "versao": snapshot.versao if snapshot is not None else None,
+            "idade": time.time() - snapshot.carregado_em if snapshot is not None else None,
+            "ultima_verificacao": self._last_checked or None,
+            "recarregando": self._recarga_agendada,
+            "monitorando": self._monitor is not None and self._monitor.is_alive(),
+            "ultimo_erro": self._ultimo_erro,
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+_monitorando = False
+
+
+def get_workbook_store(filename=DEFAULT_WORKBOOK):
+    """Retorna o store compartilhado da planilha (um por arquivo)"""
+    with _stores_lock:
+        store = _stores.get(filename)
+        if store is None:
+            store = WorkbookStore(filename)
+            _stores[filename] = store
+            if _monitorando:
+                store.iniciar_monitoramento()
+        return store
+
+
+def aplicar_orcamento_memoria(protegido=None):
+    """Descarrega as planilhas usadas há mais tempo até a soma caber na parte do processo
+
+    Conferido quando uma versão é carregada (não a cada request); os derivados
+    montados depois entram na conta da próxima carga. protegido (o store que
+    acabou de ser carregado) nunca é descartado, mesmo sozinho acima do
+    orçamento. Um store descarregado volta no próximo request.
+    """
+    limite = WORKBOOK_MEMORY_BUDGET_PROCESSO_MB * 1024 * 1024
+    with _stores_lock:
+        stores = list(_stores.values())
+    carregados = [store for store in stores if store.peek() is not None]
+    total = sum(store.memoria() for store in carregados)
+    for store in sorted(carregados, key=lambda store: store.ultimo_acesso):
+        if total <= limite:
+            break
+        # Stores recarregando são pulados para não bloquear o request atual
+        if store is protegido or store._recarga_agendada:
+            continue
+        total -= store.memoria()
+        print(f"♻️ Planilha {store.filename} descarregada (orçamento de memória de {WORKBOOK_MEMORY_BUDGET_PROCESSO_MB:.0f} MB por processo)")
+        store.clear()
+
+
+def status_workbooks():
+    """Status de cada planilha do registro (memória, versão e último acesso), por cliente"""
+    status = {}
+    for cliente, filename in WORKBOOKS.items():
+        with _stores_lock:
+            store = _stores.get(filename)
+        status[cliente] = store.status() if store is not None else {"arquivo": filename, "carregado": False}
+    return status
+
+
+def iniciar_monitoramento_workbooks():
+    """Inicia o monitoramento em background das planilhas conhecidas (e das que forem abertas depois)"""
+    global _monitorando
+    get_workbook_store(DEFAULT_WORKBOOK)
+    with _stores_lock:
+        _monitorando = True
+        stores = list(_stores.values())
+    for store in stores:
+        store.iniciar_monitoramento()
+
+
+def parar_monitoramento_workbooks():
+    global _monitorando
+    with _stores_lock:
+        _monitorando = False
+        stores = list(_stores.values())
+    for store in stores:
+        store.parar_monitoramento()
@@ -14,7 +14,10 @@ from .analysis_helper_postgresql import (
     calcular_analise_vertical_postgresql,
     calcular_realizado_vs_orcado_postgresql,
     calcular_analises_completas_postgresql,
-    calcular_analises_horizontais_movimentacoes_postgresql
+    calcular_analises_horizontais_movimentacoes_postgresql,
+    formato_numerico_postgresql,
+    sem_analise_postgresql,
+    formatar_percentual_postgresql
 )
 from .data_processor_postgresql import (
     processar_dados_financeiros_postgresql,
@@ -45,6 +48,9 @@ __all__ = [
     'calcular_realizado_vs_orcado_postgresql',
     'calcular_analises_completas_postgresql',
     'calcular_analises_horizontais_movimentacoes_postgresql',
+    'formato_numerico_postgresql',
+    'sem_analise_postgresql',
+    'formatar_percentual_postgresql',
     
     # Processamento de dados
     'processar_dados_financeiros_postgresql',
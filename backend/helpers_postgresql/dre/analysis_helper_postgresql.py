@@ -2,7 +2,7 @@
 Helper para análises financeiras PostgreSQL - versão independente da versão Excel
 """
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
 def determinar_base_analise_vertical(nome_conta: str, valores_periodo: Dict[str, float], faturamento_periodo: Dict[str, float]) -> Dict[str, float]:
     """Determina a base apropriada para análise vertical de cada conta"""
@@ -40,36 +40,52 @@ def determinar_base_analise_vertical(nome_conta: str, valores_periodo: Dict[str,
     
     return bases
 
-def calcular_analise_vertical_postgresql(valor: float, base: float, tipo_conta: str = None) -> str:
+def formato_numerico_postgresql(formato: Optional[str]) -> bool:
+    """Indica se o parâmetro format da query pede análises numéricas (format=numeric)"""
+    return (formato or "").lower() == "numeric"
+
+def sem_analise_postgresql(numerico: bool = False) -> Optional[str]:
+    """Valor de uma análise que não se aplica ("–" ou None no formato numérico)"""
+    return None if numerico else "–"
+
+def formatar_percentual_postgresql(percentual: float, numerico: bool = False) -> Union[str, float]:
+    """Formata um percentual como "12.34%" ou, no formato numérico, como float arredondado"""
+    if numerico:
+        return round(percentual, 2)
+    return f"{percentual:.2f}%"
+
+def calcular_analise_vertical_postgresql(valor: float, base: float, tipo_conta: str = None,
+                                         numerico: bool = False) -> Union[str, float, None]:
     """Calcula análise vertical (percentual do total) para PostgreSQL com base apropriada"""
     try:
         if base == 0:
-            return "–"
+            return sem_analise_postgresql(numerico)
         
         # Validar se os valores são números válidos
         if not isinstance(valor, (int, float)) or not isinstance(base, (int, float)):
-            return "–"
+            return sem_analise_postgresql(numerico)
         
         if pd.isna(valor) or pd.isna(base):
-            return "–"
+            return sem_analise_postgresql(numerico)
         
         # Calcular percentual
         percentual = (valor / base) * 100
         
-        return f"{percentual:.2f}%"
+        return formatar_percentual_postgresql(percentual, numerico)
         
     except (ValueError, TypeError, ZeroDivisionError) as e:
-        return "–"
+        return sem_analise_postgresql(numerico)
 
-def calcular_analise_horizontal_postgresql(valor_atual: float, valor_anterior: float) -> str:
+def calcular_analise_horizontal_postgresql(valor_atual: float, valor_anterior: float,
+                                           numerico: bool = False) -> Union[str, float, None]:
     """Calcula análise horizontal (variação percentual) para PostgreSQL"""
     try:
         if valor_anterior == 0:
-            return "–"
+            return sem_analise_postgresql(numerico)
         variacao = ((valor_atual - valor_anterior) / valor_anterior) * 100
-        return f"{variacao:.2f}%"
+        return formatar_percentual_postgresql(variacao, numerico)
     except (ValueError, TypeError, ZeroDivisionError):
-        return "–"
+        return sem_analise_postgresql(numerico)
 
 def calcular_realizado_vs_orcado_postgresql(realizado: float, orcado: float) -> str:
     """Calcula realizado vs orçado (percentual) para PostgreSQL"""
@@ -219,29 +235,29 @@ def calcular_analises_horizontais_movimentacoes_postgresql(valores_mensais: Dict
                                                          valores_trimestrais: Dict[str, float], 
                                                          valores_anuais: Dict[str, float], 
                                                          meses_unicos: list, trimestres_unicos: list, 
-                                                         anos_unicos: list):
+                                                         anos_unicos: list, numerico: bool = False):
     """Calcula análises horizontais para movimentações (PostgreSQL)"""
     
     horizontal_mensais = {}
     for i, mes in enumerate(meses_unicos):
         if i == 0:
-            horizontal_mensais[mes] = "–"
+            horizontal_mensais[mes] = sem_analise_postgresql(numerico)
         else:
-            horizontal_mensais[mes] = calcular_analise_horizontal_postgresql(valores_mensais[mes], valores_mensais[meses_unicos[i-1]])
+            horizontal_mensais[mes] = calcular_analise_horizontal_postgresql(valores_mensais[mes], valores_mensais[meses_unicos[i-1]], numerico)
 
     horizontal_trimestrais = {}
     for i, tri in enumerate(trimestres_unicos):
         if i == 0:
-            horizontal_trimestrais[tri] = "–"
+            horizontal_trimestrais[tri] = sem_analise_postgresql(numerico)
         else:
-            horizontal_trimestrais[tri] = calcular_analise_horizontal_postgresql(valores_trimestrais[tri], valores_trimestrais[trimestres_unicos[i-1]])
+            horizontal_trimestrais[tri] = calcular_analise_horizontal_postgresql(valores_trimestrais[tri], valores_trimestrais[trimestres_unicos[i-1]], numerico)
 
     horizontal_anuais = {}
     for i, ano in enumerate(anos_unicos):
         if i == 0:
-            horizontal_anuais[str(ano)] = "–"
+            horizontal_anuais[str(ano)] = sem_analise_postgresql(numerico)
         else:
-            horizontal_anuais[str(ano)] = calcular_analise_horizontal_postgresql(valores_anuais[str(ano)], valores_anuais[str(anos_unicos[i-1])])
+            horizontal_anuais[str(ano)] = calcular_analise_horizontal_postgresql(valores_anuais[str(ano)], valores_anuais[str(anos_unicos[i-1])], numerico)
 
     return {
         "horizontal_mensais": horizontal_mensais,
@@ -7,6 +7,7 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from sqlalchemy import text
 from database.connection_sqlalchemy import get_engine
+from database.monthly_facts import exigir_tabela_fatos
 from helpers_postgresql.dre.cache_helper import get_cache
 from helpers_postgresql.dre.analysis_helper_postgresql import calcular_analise_horizontal_postgresql, calcular_analise_vertical_postgresql
 
@@ -43,41 +44,39 @@ class AnalyticsCacheHelper:
             
         try:
             with self.engine.connect() as connection:
-                # Buscar dados históricos para análises
+                exigir_tabela_fatos(connection)
+                # Buscar dados históricos para análises (somas mensais de financial_data_mensal)
                 if tipo_periodo == "mensal":
                     query = text("""
                         SELECT 
-                            TO_CHAR(competencia, 'YYYY-MM') as periodo,
-                            SUM(valor_original) as valor_total
-                        FROM financial_data 
-                        WHERE dre_n2 = :dre_n2_name
-                        AND valor_original IS NOT NULL 
-                        AND competencia IS NOT NULL
-                        GROUP BY TO_CHAR(competencia, 'YYYY-MM')
+                            TO_CHAR(mes, 'YYYY-MM') as periodo,
+                            SUM(valor_real + valor_orcamento) as valor_total
+                        FROM financial_data_mensal
+                        WHERE base = 'competencia'
+                        AND conta_n2 = :dre_n2_name
+                        GROUP BY TO_CHAR(mes, 'YYYY-MM')
                         ORDER BY periodo
                     """)
                 elif tipo_periodo == "trimestral":
                     query = text("""
                         SELECT 
-                            CONCAT(EXTRACT(YEAR FROM competencia), '-Q', EXTRACT(QUARTER FROM competencia)) as periodo,
-                            SUM(valor_original) as valor_total
-                        FROM financial_data 
-                        WHERE dre_n2 = :dre_n2_name
-                        AND valor_original IS NOT NULL 
-                        AND competencia IS NOT NULL
-                        GROUP BY CONCAT(EXTRACT(YEAR FROM competencia), '-Q', EXTRACT(QUARTER FROM competencia))
+                            CONCAT(EXTRACT(YEAR FROM mes), '-Q', EXTRACT(QUARTER FROM mes)) as periodo,
+                            SUM(valor_real + valor_orcamento) as valor_total
+                        FROM financial_data_mensal
+                        WHERE base = 'competencia'
+                        AND conta_n2 = :dre_n2_name
+                        GROUP BY CONCAT(EXTRACT(YEAR FROM mes), '-Q', EXTRACT(QUARTER FROM mes))
                         ORDER BY periodo
                     """)
                 else:  # anual
                     query = text("""
                         SELECT 
-                            EXTRACT(YEAR FROM competencia)::text as periodo,
-                            SUM(valor_original) as valor_total
-                        FROM financial_data 
-                        WHERE dre_n2 = :dre_n2_name
-                        AND valor_original IS NOT NULL 
-                        AND competencia IS NOT NULL
-                        GROUP BY EXTRACT(YEAR FROM competencia)
+                            EXTRACT(YEAR FROM mes)::text as periodo,
+                            SUM(valor_real + valor_orcamento) as valor_total
+                        FROM financial_data_mensal
+                        WHERE base = 'competencia'
+                        AND conta_n2 = :dre_n2_name
+                        GROUP BY EXTRACT(YEAR FROM mes)
                         ORDER BY periodo
                     """)
                 
@@ -101,13 +100,12 @@ class AnalyticsCacheHelper:
                 analises_verticais = {}
                 faturamento_query = text("""
                     SELECT 
-                        TO_CHAR(competencia, 'YYYY-MM') as periodo,
-                        SUM(valor_original) as valor_faturamento
-                    FROM financial_data 
-                    WHERE dre_n2 = '( + ) Faturamento'
-                    AND valor_original IS NOT NULL 
-                    AND competencia IS NOT NULL
-                    GROUP BY TO_CHAR(competencia, 'YYYY-MM')
+                        TO_CHAR(mes, 'YYYY-MM') as periodo,
+                        SUM(valor_real + valor_orcamento) as valor_faturamento
+                    FROM financial_data_mensal
+                    WHERE base = 'competencia'
+                    AND conta_n2 = '( + ) Faturamento'
+                    GROUP BY TO_CHAR(mes, 'YYYY-MM')
                 """)
                 
                 faturamento_result = connection.execute(faturamento_query)
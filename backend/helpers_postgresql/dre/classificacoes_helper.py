@@ -4,6 +4,8 @@ Helper para funções de classificações do DRE N0
 from typing import Dict, Any, List
 from sqlalchemy import text
 from sqlalchemy.engine import Connection
+from database.monthly_facts import exigir_tabela_fatos
+from database.classification_map import exigir_mapa_classificacoes
 from helpers_postgresql.dre.analysis_helper_postgresql import calcular_analise_horizontal_postgresql, calcular_analise_vertical_postgresql
 
 class ClassificacoesHelper:
@@ -19,7 +21,8 @@ class ClassificacoesHelper:
         else:
             print("⚠️ Nenhum empresa_id fornecido - retornando dados de todas as empresas")
         
-        # FLUXO CORRIGIDO: financial_data → de_para → plano_de_contas → classificacao_dre_n2
+        # FLUXO CORRIGIDO: financial_data_mensal → classificacao_plano_contas (de_para → plano_de_contas → dre_n2)
+        # Somas mensais da tabela de fatos (base competência), uma linha por classificação e mês
         # CORREÇÃO CRÍTICA: Adicionar empresa_id em TODOS os JOINs para isolamento total
         # PROBLEMA IDENTIFICADO: Dados se misturavam entre empresas
         # 🆕 NOVA CORREÇÃO: Suportar múltiplas empresas separadas por vírgula
@@ -28,45 +31,47 @@ class ClassificacoesHelper:
         if empresa_id and ',' in empresa_id:
             # Múltiplas empresas - usar IN
             empresa_ids = [id.strip() for id in empresa_id.split(',') if id.strip()]
-            empresa_filter = "AND fd.empresa_id = ANY(:empresa_ids)"
+            empresa_filter = "AND f.empresa_id = ANY(:empresa_ids)"
             params = {"dre_n2_name": dre_n2_name, "empresa_ids": empresa_ids}
         elif empresa_id:
             # Uma empresa - usar igual
-            empresa_filter = "AND fd.empresa_id = :empresa_id"
+            empresa_filter = "AND f.empresa_id = :empresa_id"
             params = {"dre_n2_name": dre_n2_name, "empresa_id": empresa_id}
         else:
             # Nenhuma empresa - sem filtro
             empresa_filter = ""
             params = {"dre_n2_name": dre_n2_name}
         
+        # Uma soma por conta do plano e mês: fatos mensais com a classificação já
+        # mapeada (classificacao_plano_contas), join por igualdade em (empresa_id, classificacao)
+        # A conta DRE N2 é casada pelo nome limpo (sem "( + )"...), sem diferenciar maiúsculas
         query = text("""
-            SELECT DISTINCT 
-                pc.nome_conta as classificacao,
-                pc.nome_conta as nome,  -- 🆕 NOVO: Campo 'nome' para o frontend
-                pc.nome_conta as descricao,  -- 🆕 NOVO: Campo 'descricao' para exibição
-                fd.valor_original,
-                TO_CHAR(fd.competencia, 'YYYY-MM') as periodo_mensal,
-                CONCAT(EXTRACT(YEAR FROM fd.competencia), '-Q', EXTRACT(QUARTER FROM fd.competencia)) as periodo_trimestral,
-                EXTRACT(YEAR FROM fd.competencia)::text as periodo_anual
-            FROM financial_data fd
-            JOIN de_para dp ON fd.classificacao = dp.descricao_origem
-                AND dp.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            JOIN plano_de_contas pc ON dp.descricao_destino = pc.conta_pai
-                AND pc.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            WHERE pc.classificacao_dre_n2 LIKE '%' || :dre_n2_name || '%'
-            AND fd.classificacao IS NOT NULL 
-            AND fd.classificacao::text <> ''
-            AND fd.classificacao::text <> 'nan'
-            AND fd.valor_original IS NOT NULL 
-            AND fd.competencia IS NOT NULL
+            SELECT 
+                m.nome_conta as classificacao,
+                m.nome_conta as nome,  -- 🆕 NOVO: Campo 'nome' para o frontend
+                m.nome_conta as descricao,  -- 🆕 NOVO: Campo 'descricao' para exibição
+                SUM(f.valor_real + f.valor_orcamento) as valor_original,
+                SUM(f.quantidade) as quantidade,
+                TO_CHAR(f.mes, 'YYYY-MM') as periodo_mensal,
+                CONCAT(EXTRACT(YEAR FROM f.mes), '-Q', EXTRACT(QUARTER FROM f.mes)) as periodo_trimestral,
+                EXTRACT(YEAR FROM f.mes)::text as periodo_anual
+            FROM classificacao_plano_contas m
+            JOIN financial_data_mensal f ON f.empresa_id = m.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
+                AND f.classificacao = m.classificacao
+            WHERE m.dre_n2_nome = nome_conta_limpo(:dre_n2_name)
+            AND f.base = 'competencia'
+            AND f.classificacao NOT IN ('', 'nan')
             """ + empresa_filter + """
-            ORDER BY pc.nome_conta, TO_CHAR(fd.competencia, 'YYYY-MM')
+            GROUP BY m.nome_conta, f.mes
+            ORDER BY m.nome_conta, f.mes
         """)
         
+        exigir_mapa_classificacoes(connection)
+        exigir_tabela_fatos(connection)
         result = connection.execute(query, params)
         dados = result.fetchall()
         
-        print(f"📊 Encontradas {len(dados)} classificações únicas para {dre_n2_name}")
+        print(f"📊 Encontradas {len(dados)} somas mensais de classificações para {dre_n2_name}")
         if empresa_id:
             print(f"🏢 Filtradas por empresa_id: {empresa_id}")
         
@@ -93,38 +98,35 @@ class ClassificacoesHelper:
         if empresa_id and ',' in empresa_id:
             # Múltiplas empresas - usar IN
             empresa_ids = [id.strip() for id in empresa_id.split(',') if id.strip()]
-            empresa_filter = "AND fd.empresa_id = ANY(:empresa_ids)"
+            empresa_filter = "AND f.empresa_id = ANY(:empresa_ids)"
             params = {"empresa_ids": empresa_ids}
         elif empresa_id:
             # Uma empresa - usar igual
-            empresa_filter = "AND fd.empresa_id = :empresa_id"
+            empresa_filter = "AND f.empresa_id = :empresa_id"
             params = {"empresa_id": empresa_id}
         else:
             # Nenhuma empresa - sem filtro
             empresa_filter = ""
             params = {}
         
+        # Somas mensais da tabela de fatos (base competência), classificações já mapeadas
         faturamento_query = text("""
             SELECT 
-                TO_CHAR(fd.competencia, 'YYYY-MM') as periodo_mensal,
-                CONCAT(EXTRACT(YEAR FROM fd.competencia), '-Q', EXTRACT(QUARTER FROM fd.competencia)) as periodo_trimestral,
-                EXTRACT(YEAR FROM fd.competencia)::text as periodo_anual,
-                SUM(fd.valor_original) as valor_faturamento
-            FROM financial_data fd
-            JOIN de_para dp ON fd.classificacao = dp.descricao_origem
-                AND dp.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            JOIN plano_de_contas pc ON dp.descricao_destino = pc.conta_pai
-                AND pc.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            WHERE pc.classificacao_dre_n2 LIKE '%( + ) Faturamento%'  -- ✅ FILTRO CORRIGIDO
-            AND fd.valor_original IS NOT NULL 
-            AND fd.competencia IS NOT NULL
+                TO_CHAR(f.mes, 'YYYY-MM') as periodo_mensal,
+                CONCAT(EXTRACT(YEAR FROM f.mes), '-Q', EXTRACT(QUARTER FROM f.mes)) as periodo_trimestral,
+                EXTRACT(YEAR FROM f.mes)::text as periodo_anual,
+                SUM(f.valor_real + f.valor_orcamento) as valor_faturamento
+            FROM classificacao_plano_contas m
+            JOIN financial_data_mensal f ON f.empresa_id = m.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
+                AND f.classificacao = m.classificacao
+            WHERE m.classificacao_dre_n2 LIKE '%( + ) Faturamento%'  -- ✅ FILTRO CORRIGIDO
+            AND f.base = 'competencia'
             """ + empresa_filter + """
-            GROUP BY 
-                TO_CHAR(fd.competencia, 'YYYY-MM'),
-                CONCAT(EXTRACT(YEAR FROM fd.competencia), '-Q', EXTRACT(QUARTER FROM fd.competencia)),
-                EXTRACT(YEAR FROM fd.competencia)
+            GROUP BY f.mes
         """)
         
+        exigir_mapa_classificacoes(connection)
+        exigir_tabela_fatos(connection)
         faturamento_result = connection.execute(faturamento_query, params)
         return faturamento_result.fetchall()
 
@@ -220,8 +222,8 @@ class ClassificacoesHelper:
             classificacoes_agrupadas[classificacao]['valores_anuais'][periodo_anual] += valor
             anos.add(periodo_anual)
             
-            # Totais
-            classificacoes_agrupadas[classificacao]['total_lancamentos'] += 1
+            # Totais (cada linha é a soma de um mês; quantidade conta os lançamentos)
+            classificacoes_agrupadas[classificacao]['total_lancamentos'] += row.quantidade
             classificacoes_agrupadas[classificacao]['valor_total'] += valor
         
         # Converter para lista e ordenar por valor total
@@ -244,7 +246,7 @@ class ClassificacoesHelper:
         else:
             print("⚠️ Nenhum empresa_id fornecido - retornando dados de todas as empresas")
         
-        # FLUXO: financial_data → de_para → plano_de_contas → classificacao_dre_n2 → nome
+        # FLUXO: classificacao_plano_contas (mesmo mapeamento das somas) → financial_data → nome
         # NOVO NÍVEL: Agora buscamos por financial_data.nome para cada classificação
         query = text("""
             SELECT DISTINCT 
@@ -258,13 +260,11 @@ class ClassificacoesHelper:
                 fd.documento,
                 fd.banco,
                 fd.conta_corrente
-            FROM financial_data fd
-            JOIN de_para dp ON fd.classificacao = dp.descricao_origem
-                AND dp.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            JOIN plano_de_contas pc ON dp.descricao_destino = pc.conta_pai
-                AND pc.empresa_id = fd.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
-            WHERE pc.classificacao_dre_n2 LIKE '%' || :dre_n2_name || '%'
-            AND pc.nome_conta = :nome_classificacao  -- ✅ FILTRO POR CLASSIFICAÇÃO ESPECÍFICA
+            FROM classificacao_plano_contas m
+            JOIN financial_data fd ON fd.empresa_id::text = m.empresa_id  -- ✅ ISOLAMENTO CRÍTICO
+                AND fd.classificacao = m.classificacao
+            WHERE m.dre_n2_nome = nome_conta_limpo(:dre_n2_name)
+            AND m.nome_conta = :nome_classificacao  -- ✅ FILTRO POR CLASSIFICAÇÃO ESPECÍFICA
             AND fd.nome IS NOT NULL 
             AND fd.nome::text <> ''
             AND fd.nome::text <> 'nan'
@@ -282,6 +282,7 @@ class ClassificacoesHelper:
         if empresa_id:
             params["empresa_id"] = empresa_id
         
+        exigir_mapa_classificacoes(connection)
         result = connection.execute(query, params)
         dados = result.fetchall()
         
@@ -1,219 +1,188 @@
 """
 Helper para funções principais do DRE N0
 """
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional, FrozenSet
 from sqlalchemy import text
 from sqlalchemy.engine import Connection
 from helpers_postgresql.dre.analysis_helper_postgresql import (
-    calcular_analise_vertical_postgresql, determinar_base_analise_vertical, calcular_analises_horizontais_movimentacoes_postgresql
+    calcular_analise_vertical_postgresql, determinar_base_analise_vertical, calcular_analises_horizontais_movimentacoes_postgresql,
+    sem_analise_postgresql, formatar_percentual_postgresql
 )
+from database.monthly_facts import exigir_tabela_fatos
+from helpers_postgresql.dre.materialized_view_helper import dre_n0_view
+
+# SELECT de v_dre_n0_completo (uma linha por conta DRE N0; dre_n0_id é único)
+SQL_DRE_N0_COMPLETO = """
+    WITH dados_limpos AS (
+        -- Somas mensais da tabela de fatos (financial_data_mensal, base competência)
+        SELECT 
+            f.conta_n1_id as dre_n1_id,
+            f.conta_n2_id as dre_n2_id,
+            f.mes as competencia,
+            f.valor_real + f.valor_orcamento as valor_original,
+            TO_CHAR(f.mes, 'YYYY-MM') as periodo_mensal,
+            CONCAT(EXTRACT(YEAR FROM f.mes), '-Q', EXTRACT(QUARTER FROM f.mes)) as periodo_trimestral,
+            EXTRACT(YEAR FROM f.mes)::text as periodo_anual
+        FROM financial_data_mensal f
+        WHERE f.base = 'competencia'
+        AND (f.conta_n1_id <> '' OR f.conta_n2_id <> '')
+    ),
+    estrutura_n0 AS (
+        SELECT 
+            ds0.id as dre_n0_id,
+            ds0.name as nome_conta,
+            ds0.operation_type as tipo_operacao,
+            ds0.order_index as ordem,
+            ds0.description as descricao,
+            ds0.dre_niveis,
+            ds0.dre_n1_id,
+            ds0.dre_n2_id
+        FROM dre_structure_n0 ds0
+        WHERE ds0.is_active = true
+    ),
+    valores_por_mes AS (
+        -- Soma mensal de cada conta N0: a única passagem pelos dados. O OR por
+        -- nível virou dois joins por igualdade (dre_niveis é exclusivo)
+        SELECT 
+            e.dre_n0_id,
+            e.tipo_operacao,
+            d.periodo_mensal,
+            d.periodo_trimestral,
+            d.periodo_anual,
+            SUM(d.valor_original) as valor
+        FROM estrutura_n0 e
+        JOIN dados_limpos d ON e.dre_n1_id::text = d.dre_n1_id
+        WHERE e.dre_niveis = 'dre_n1' AND e.tipo_operacao != '='
+        GROUP BY e.dre_n0_id, e.tipo_operacao, d.periodo_mensal, d.periodo_trimestral, d.periodo_anual
+        
+        UNION ALL
+        
+        SELECT 
+            e.dre_n0_id,
+            e.tipo_operacao,
+            d.periodo_mensal,
+            d.periodo_trimestral,
+            d.periodo_anual,
+            SUM(d.valor_original) as valor
+        FROM estrutura_n0 e
+        JOIN dados_limpos d ON e.dre_n2_id::text = d.dre_n2_id
+        WHERE e.dre_niveis = 'dre_n2' AND e.tipo_operacao != '='
+        GROUP BY e.dre_n0_id, e.tipo_operacao, d.periodo_mensal, d.periodo_trimestral, d.periodo_anual
+    ),
+    valores_periodos AS (
+        -- Meses, trimestres e anos a partir das somas mensais (GROUPING SETS);
+        -- o sinal da conta é aplicado à soma de cada período
+        SELECT 
+            v.dre_n0_id,
+            CASE 
+                WHEN GROUPING(v.periodo_mensal) = 0 THEN 'mensal'
+                WHEN GROUPING(v.periodo_trimestral) = 0 THEN 'trimestral'
+                ELSE 'anual'
+            END as granularidade,
+            COALESCE(v.periodo_mensal, v.periodo_trimestral, v.periodo_anual) as periodo,
+            CASE 
+                WHEN v.tipo_operacao = '+' THEN ABS(SUM(v.valor))
+                WHEN v.tipo_operacao = '-' THEN -ABS(SUM(v.valor))
+                WHEN v.tipo_operacao = '+/-' THEN SUM(v.valor)
+                ELSE 0
+            END as valor_calculado
+        FROM valores_por_mes v
+        GROUP BY GROUPING SETS (
+            (v.dre_n0_id, v.tipo_operacao, v.periodo_mensal),
+            (v.dre_n0_id, v.tipo_operacao, v.periodo_trimestral),
+            (v.dre_n0_id, v.tipo_operacao, v.periodo_anual)
+        )
+    ),
+    valores_agregados AS (
+        SELECT 
+            e.dre_n0_id,
+            e.nome_conta,
+            e.tipo_operacao,
+            e.ordem,
+            e.descricao,
+            
+            -- Valores mensais
+            COALESCE(
+                jsonb_object_agg(p.periodo, p.valor_calculado) FILTER (WHERE p.granularidade = 'mensal'),
+                '{}'::jsonb
+            ) as valores_mensais,
+            
+            -- Valores trimestrais
+            COALESCE(
+                jsonb_object_agg(p.periodo, p.valor_calculado) FILTER (WHERE p.granularidade = 'trimestral'),
+                '{}'::jsonb
+            ) as valores_trimestrais,
+            
+            -- Valores anuais
+            COALESCE(
+                jsonb_object_agg(p.periodo, p.valor_calculado) FILTER (WHERE p.granularidade = 'anual'),
+                '{}'::jsonb
+            ) as valores_anuais
+            
+        FROM estrutura_n0 e
+        LEFT JOIN valores_periodos p ON e.dre_n0_id = p.dre_n0_id
+        WHERE e.tipo_operacao != '='
+        GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao
+    )
+    SELECT 
+        dre_n0_id,
+        nome_conta,
+        tipo_operacao,
+        ordem,
+        descricao,
+        'CAR' as origem,
+        'BLUEFIT' as empresa,
+        valores_mensais,
+        valores_trimestrais,
+        valores_anuais,
+        '{}'::jsonb as orcamentos_mensais,
+        '{}'::jsonb as orcamentos_trimestrais,
+        '{}'::jsonb as orcamentos_anuais,
+        0 as orcamento_total,
+        0 as valor_total,
+        'v_dre_n0_relacionamentos_corrigidos' as source
+        
+    FROM valores_agregados
+    
+    UNION ALL
+    
+    -- Adicionar contas totalizadoras com valores vazios (serão calculadas no Python)
+    SELECT 
+        ds0.id as dre_n0_id,
+        ds0.name as nome_conta,
+        ds0.operation_type as tipo_operacao,
+        ds0.order_index as ordem,
+        ds0.description as descricao,
+        'CAR' as origem,
+        'BLUEFIT' as empresa,
+        '{}'::jsonb as valores_mensais,
+        '{}'::jsonb as valores_trimestrais,
+        '{}'::jsonb as valores_anuais,
+        '{}'::jsonb as orcamentos_mensais,
+        '{}'::jsonb as orcamentos_trimestrais,
+        '{}'::jsonb as orcamentos_anuais,
+        0 as orcamento_total,
+        0 as valor_total,
+        'v_dre_n0_totalizadores' as source
+    FROM dre_structure_n0 ds0
+    WHERE ds0.is_active = true AND ds0.operation_type = '='
+    
+    ORDER BY ordem
+"""
 
 class DreN0Helper:
     """Helper para operações principais do DRE N0"""
     
     @staticmethod
     def create_dre_n0_view(connection: Connection) -> bool:
-        """Cria ou recria a view v_dre_n0_completo"""
+        """Cria ou recria v_dre_n0_completo (materializada com ENABLE_MATERIALIZED_VIEWS)
+
+        A view lê a tabela de fatos mensais: antes da criação dela (inicialização
+        ou migrações), TabelaFatosIndisponivel.
+        """
+        exigir_tabela_fatos(connection)
         try:
-            # Forçar recriação da view
-            drop_view = text("DROP VIEW IF EXISTS v_dre_n0_completo")
-            connection.execute(drop_view)
-            
-            # Criar view corrigida com relacionamentos corretos usando IDs
-            create_view = text("""
-                CREATE OR REPLACE VIEW v_dre_n0_completo AS
-                WITH dados_limpos AS (
-                    -- Filtrar dados válidos da financial_data usando IDs corrigidos
-                    SELECT 
-                        fd.dre_n1_id,
-                        fd.dre_n2_id,
-                        fd.competencia,
-                        fd.valor_original,
-                        TO_CHAR(fd.competencia, 'YYYY-MM') as periodo_mensal,
-                        CONCAT(EXTRACT(YEAR FROM fd.competencia), '-Q', EXTRACT(QUARTER FROM fd.competencia)) as periodo_trimestral,
-                        EXTRACT(YEAR FROM fd.competencia)::text as periodo_anual
-                    FROM financial_data fd
-                    WHERE (fd.dre_n1_id IS NOT NULL OR fd.dre_n2_id IS NOT NULL)
-                    AND fd.valor_original IS NOT NULL 
-                    AND fd.competencia IS NOT NULL
-                ),
-                estrutura_n0 AS (
-                    SELECT 
-                        ds0.id as dre_n0_id,
-                        ds0.name as nome_conta,
-                        ds0.operation_type as tipo_operacao,
-                        ds0.order_index as ordem,
-                        ds0.description as descricao,
-                        ds0.dre_niveis,
-                        ds0.dre_n1_id,
-                        ds0.dre_n2_id
-                    FROM dre_structure_n0 ds0
-                    WHERE ds0.is_active = true
-                ),
-                valores_mensais AS (
-                    -- Valores mensais agregados usando relacionamentos por ID
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_mensal,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        -- Usar relacionamentos por ID em vez de match por nome
-                        (e.dre_niveis = 'dre_n1' AND e.dre_n1_id = d.dre_n1_id)
-                        OR
-                        (e.dre_niveis = 'dre_n2' AND e.dre_n2_id = d.dre_n2_id)
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_mensal
-                ),
-                valores_trimestrais AS (
-                    -- Valores trimestrais agregados usando relacionamentos por ID
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_trimestral,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        -- Usar relacionamentos por ID em vez de match por nome
-                        (e.dre_niveis = 'dre_n1' AND e.dre_n1_id = d.dre_n1_id)
-                        OR
-                        (e.dre_niveis = 'dre_n2' AND e.dre_n2_id = d.dre_n2_id)
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_trimestral
-                ),
-                valores_anuais AS (
-                    -- Valores anuais agregados usando relacionamentos por ID
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        d.periodo_anual,
-                        CASE 
-                            WHEN e.tipo_operacao = '+' THEN ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '-' THEN -ABS(SUM(d.valor_original))
-                            WHEN e.tipo_operacao = '+/-' THEN SUM(d.valor_original)
-                            ELSE 0
-                        END as valor_calculado
-                    FROM estrutura_n0 e
-                    LEFT JOIN dados_limpos d ON (
-                        -- Usar relacionamentos por ID em vez de match por nome
-                        (e.dre_niveis = 'dre_n1' AND e.dre_n1_id = d.dre_n1_id)
-                        OR
-                        (e.dre_niveis = 'dre_n2' AND e.dre_n2_id = d.dre_n2_id)
-                    )
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao, d.periodo_anual
-                ),
-                valores_agregados AS (
-                    SELECT 
-                        e.dre_n0_id,
-                        e.nome_conta,
-                        e.tipo_operacao,
-                        e.ordem,
-                        e.descricao,
-                        
-                        -- Valores mensais
-                        COALESCE(
-                            jsonb_object_agg(
-                                vm.periodo_mensal,
-                                vm.valor_calculado
-                            ) FILTER (WHERE vm.periodo_mensal IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_mensais,
-                        
-                        -- Valores trimestrais
-                        COALESCE(
-                            jsonb_object_agg(
-                                vt.periodo_trimestral,
-                                vt.valor_calculado
-                            ) FILTER (WHERE vt.periodo_trimestral IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_trimestrais,
-                        
-                        -- Valores anuais
-                        COALESCE(
-                            jsonb_object_agg(
-                                va.periodo_anual,
-                                va.valor_calculado
-                            ) FILTER (WHERE va.periodo_anual IS NOT NULL),
-                            '{}'::jsonb
-                        ) as valores_anuais
-                        
-                    FROM estrutura_n0 e
-                    LEFT JOIN valores_mensais vm ON e.dre_n0_id = vm.dre_n0_id
-                    LEFT JOIN valores_trimestrais vt ON e.dre_n0_id = vt.dre_n0_id
-                    LEFT JOIN valores_anuais va ON e.dre_n0_id = va.dre_n0_id
-                    WHERE e.tipo_operacao != '='
-                    GROUP BY e.dre_n0_id, e.nome_conta, e.tipo_operacao, e.ordem, e.descricao
-                )
-                SELECT 
-                    dre_n0_id,
-                    nome_conta,
-                    tipo_operacao,
-                    ordem,
-                    descricao,
-                    'CAR' as origem,
-                    'BLUEFIT' as empresa,
-                    valores_mensais,
-                    valores_trimestrais,
-                    valores_anuais,
-                    '{}'::jsonb as orcamentos_mensais,
-                    '{}'::jsonb as orcamentos_trimestrais,
-                    '{}'::jsonb as orcamentos_anuais,
-                    0 as orcamento_total,
-                    0 as valor_total,
-                    'v_dre_n0_relacionamentos_corrigidos' as source
-                    
-                FROM valores_agregados
-                
-                UNION ALL
-                
-                -- Adicionar contas totalizadoras com valores vazios (serão calculadas no Python)
-                SELECT 
-                    ds0.id as dre_n0_id,
-                    ds0.name as nome_conta,
-                    ds0.operation_type as tipo_operacao,
-                    ds0.order_index as ordem,
-                    ds0.description as descricao,
-                    'CAR' as origem,
-                    'BLUEFIT' as empresa,
-                    '{}'::jsonb as valores_mensais,
-                    '{}'::jsonb as valores_trimestrais,
-                    '{}'::jsonb as valores_anuais,
-                    '{}'::jsonb as orcamentos_mensais,
-                    '{}'::jsonb as orcamentos_trimestrais,
-                    '{}'::jsonb as orcamentos_anuais,
-                    0 as orcamento_total,
-                    0 as valor_total,
-                    'v_dre_n0_totalizadores' as source
-                FROM dre_structure_n0 ds0
-                WHERE ds0.is_active = true AND ds0.operation_type = '='
-                
-                ORDER BY ordem;
-            """)
-            
-            connection.execute(create_view)
+            dre_n0_view.criar(connection, SQL_DRE_N0_COMPLETO)
             connection.commit()
             return True
             
@@ -223,14 +192,8 @@ class DreN0Helper:
     
     @staticmethod
     def check_view_exists(connection: Connection) -> bool:
-        """Verifica se a view v_dre_n0_completo existe"""
-        check_view = text("""
-            SELECT EXISTS (
-                SELECT 1 FROM pg_views WHERE viewname = 'v_dre_n0_completo'
-            )
-        """)
-        result = connection.execute(check_view)
-        return result.scalar()
+        """Verifica se v_dre_n0_completo existe no formato configurado (view ou materializada)"""
+        return dre_n0_view.existe(connection)
     
     @staticmethod
     def fetch_dre_n0_data(connection: Connection) -> List[Any]:
@@ -336,8 +299,14 @@ class DreN0Helper:
         return result.fetchall()
     
     @staticmethod
-    def process_dre_items(rows: List[Any]) -> Tuple[List[Dict], set, set, set]:
-        """Processa dados da DRE para o formato esperado pelo frontend"""
+    def process_dre_items(rows: List[Any], numerico: bool = False,
+                          campos: Optional[FrozenSet[str]] = None) -> Tuple[List[Dict], set, set, set]:
+        """Processa dados da DRE para o formato esperado pelo frontend
+
+        Com numerico=True as análises saem como números (None quando não se aplicam).
+        campos (fields=) limita as análises calculadas: horizontal e vertical só
+        entram quando pedidas; None calcula todas.
+        """
         dre_items = []
         meses = set()
         trimestres = set()
@@ -383,7 +352,7 @@ class DreN0Helper:
             
             dre_item = DreN0Helper._create_dre_item(
                 row, valores_mensais_numeros, valores_trimestrais_numeros, 
-                valores_anuais_numeros, tem_classificacoes, faturamento_data
+                valores_anuais_numeros, tem_classificacoes, faturamento_data, numerico, campos
             )
             
             dre_items.append(dre_item)
@@ -407,7 +376,8 @@ class DreN0Helper:
         # Processar totalizadores
         for tot in totalizadores:
             dre_item_tot = DreN0Helper._create_totalizador_item(
-                tot, valores_reais_por_periodo, valores_reais_por_nome, meses, trimestres, anos, faturamento_data, dre_items
+                tot, valores_reais_por_periodo, valores_reais_por_nome, meses, trimestres, anos, faturamento_data, dre_items,
+                numerico, campos
             )
             dre_items.append(dre_item_tot)
         
@@ -418,35 +388,40 @@ class DreN0Helper:
     
     @staticmethod
     def _create_dre_item(row: Any, valores_mensais: Dict, valores_trimestrais: Dict, 
-                         valores_anuais: Dict, tem_classificacoes: bool, faturamento_data: Any = None) -> Dict:
-        """Cria item DRE individual"""
+                         valores_anuais: Dict, tem_classificacoes: bool, faturamento_data: Any = None,
+                         numerico: bool = False, campos: Optional[FrozenSet[str]] = None) -> Dict:
+        """Cria item DRE individual (análises limitadas a campos, quando dado)"""
         
         # Usar função já existente para calcular análises horizontais
         meses_ordenados = sorted(valores_mensais.keys())
         trimestres_ordenados = sorted(valores_trimestrais.keys())
         anos_ordenados = sorted(valores_anuais.keys())
+        horizontal = campos is None or "horizontal" in campos
+        vertical = campos is None or "vertical" in campos
         
         # Calcular análises usando funções já existentes
         analises = calcular_analises_horizontais_movimentacoes_postgresql(
             valores_mensais, valores_trimestrais, valores_anuais,
-            meses_ordenados, trimestres_ordenados, anos_ordenados
-        )
+            meses_ordenados, trimestres_ordenados, anos_ordenados, numerico
+        ) if horizontal else {}
+        vazio = sem_analise_postgresql(numerico)
+        cem_por_cento = formatar_percentual_postgresql(100, numerico)
         
         # Calcular análises verticais (baseado no faturamento)
         analise_vertical_mensal = {}
         analise_vertical_trimestral = {}
         analise_vertical_anual = {}
         
-        if faturamento_data and faturamento_data.valores_mensais:
+        if vertical and faturamento_data and faturamento_data.valores_mensais:
             faturamento_mensais = faturamento_data.valores_mensais or {}
             faturamento_trimestrais = faturamento_data.valores_trimestrais or {}
             faturamento_anuais = faturamento_data.valores_anuais or {}
             
             # Para o Faturamento (ordem 1), a AV é sempre 100%
             if row.ordem == 1:
-                analise_vertical_mensal = {mes: "100.00%" for mes in valores_mensais.keys()}
-                analise_vertical_trimestral = {tri: "100.00%" for tri in valores_trimestrais.keys()}
-                analise_vertical_anual = {ano: "100.00%" for ano in valores_anuais.keys()}
+                analise_vertical_mensal = {mes: cem_por_cento for mes in valores_mensais.keys()}
+                analise_vertical_trimestral = {tri: cem_por_cento for tri in valores_trimestrais.keys()}
+                analise_vertical_anual = {ano: cem_por_cento for ano in valores_anuais.keys()}
             else:
                 # Para outras contas, usar função já existente com base apropriada
                 # Determinar base apropriada para cada período
@@ -456,22 +431,22 @@ class DreN0Helper:
                 
                 for mes in valores_mensais.keys():
                     base_mes = bases_mensais.get(mes, faturamento_mensais.get(mes, 0))
-                    analise_vertical_mensal[mes] = calcular_analise_vertical_postgresql(valores_mensais[mes], base_mes, row.nome_conta)
+                    analise_vertical_mensal[mes] = calcular_analise_vertical_postgresql(valores_mensais[mes], base_mes, row.nome_conta, numerico)
                 
                 for tri in valores_trimestrais.keys():
                     base_tri = bases_trimestrais.get(tri, faturamento_trimestrais.get(tri, 0))
-                    analise_vertical_trimestral[tri] = calcular_analise_vertical_postgresql(valores_trimestrais[tri], base_tri, row.nome_conta)
+                    analise_vertical_trimestral[tri] = calcular_analise_vertical_postgresql(valores_trimestrais[tri], base_tri, row.nome_conta, numerico)
                 
                 for ano in valores_anuais.keys():
                     base_ano = bases_anuais.get(ano, faturamento_anuais.get(str(ano), 0))
-                    analise_vertical_anual[ano] = calcular_analise_vertical_postgresql(valores_anuais[ano], base_ano, row.nome_conta)
-        else:
+                    analise_vertical_anual[ano] = calcular_analise_vertical_postgresql(valores_anuais[ano], base_ano, row.nome_conta, numerico)
+        elif vertical:
             # Fallback se não houver dados de faturamento
-            analise_vertical_mensal = {mes: "–" for mes in valores_mensais.keys()}
-            analise_vertical_trimestral = {tri: "–" for tri in valores_trimestrais.keys()}
-            analise_vertical_anual = {ano: "–" for ano in valores_anuais.keys()}
+            analise_vertical_mensal = {mes: vazio for mes in valores_mensais.keys()}
+            analise_vertical_trimestral = {tri: vazio for tri in valores_trimestrais.keys()}
+            analise_vertical_anual = {ano: vazio for ano in valores_anuais.keys()}
         
-        return {
+        item = {
             "tipo": row.tipo_operacao,
             "nome": row.nome_conta,
             "ordem": row.ordem,
@@ -485,20 +460,22 @@ class DreN0Helper:
             "orcamento_total": 0.0,
             "classificacoes": [],
             # Análise Horizontal e Vertical para contas reais (usando funções já existentes)
-            "analise_horizontal_mensal": analises["horizontal_mensais"],
+            "analise_horizontal_mensal": analises.get("horizontal_mensais"),
             "analise_vertical_mensal": analise_vertical_mensal,
-            "analise_horizontal_trimestral": analises["horizontal_trimestrais"],
+            "analise_horizontal_trimestral": analises.get("horizontal_trimestrais"),
             "analise_vertical_trimestral": analise_vertical_trimestral,
-            "analise_horizontal_anual": analises["horizontal_anuais"],
+            "analise_horizontal_anual": analises.get("horizontal_anuais"),
             "analise_vertical_anual": analise_vertical_anual,
             # NOVAS COLUNAS: AV total dinâmica por período
             # COLUNAS DE AV REMOVIDAS - frontend calcula tudo dinamicamente
         }
+        return DreN0Helper._remover_analises(item, horizontal, vertical)
     
     @staticmethod
     def _create_totalizador_item(tot: Any, valores_reais_por_periodo: Dict, valores_reais_por_nome: Dict,
-                                meses: set, trimestres: set, anos: set, faturamento_data: Any = None, dre_items: List[Dict] = None) -> Dict:
-        """Cria item totalizador com cálculos"""
+                                meses: set, trimestres: set, anos: set, faturamento_data: Any = None, dre_items: List[Dict] = None,
+                                numerico: bool = False, campos: Optional[FrozenSet[str]] = None) -> Dict:
+        """Cria item totalizador com cálculos (análises limitadas a campos, quando dado)"""
         
         # Calcular totalizadores mensais
         valores_mensais = {}
@@ -596,22 +573,26 @@ class DreN0Helper:
         trimestres_ordenados = sorted(trimestres)
         anos_ordenados = sorted(anos)
         
+        horizontal = campos is None or "horizontal" in campos
+        vertical = campos is None or "vertical" in campos
+        
         # Usar função já existente para análises horizontais
         analises_horizontais = calcular_analises_horizontais_movimentacoes_postgresql(
             valores_mensais, valores_trimestrais, valores_anuais,
-            meses_ordenados, trimestres_ordenados, anos_ordenados
-        )
+            meses_ordenados, trimestres_ordenados, anos_ordenados, numerico
+        ) if horizontal else {}
+        vazio = sem_analise_postgresql(numerico)
         
-        analise_horizontal_mensal = analises_horizontais["horizontal_mensais"]
-        analise_horizontal_trimestral = analises_horizontais["horizontal_trimestrais"]
-        analise_horizontal_anual = analises_horizontais["horizontal_anuais"]
+        analise_horizontal_mensal = analises_horizontais.get("horizontal_mensais")
+        analise_horizontal_trimestral = analises_horizontais.get("horizontal_trimestrais")
+        analise_horizontal_anual = analises_horizontais.get("horizontal_anuais")
         
         # Calcular análises verticais para totalizadores
         analise_vertical_mensal = {}
         analise_vertical_trimestral = {}
         analise_vertical_anual = {}
         
-        if faturamento_data and faturamento_data.valores_mensais:
+        if vertical and faturamento_data and faturamento_data.valores_mensais:
             faturamento_mensais = faturamento_data.valores_mensais or {}
             faturamento_trimestrais = faturamento_data.valores_trimestrais or {}
             faturamento_anuais = faturamento_data.valores_anuais or {}
@@ -624,22 +605,22 @@ class DreN0Helper:
             
             for mes in meses:
                 base_mes = bases_mensais.get(mes, faturamento_mensais.get(mes, 0))
-                analise_vertical_mensal[mes] = calcular_analise_vertical_postgresql(valores_mensais.get(mes, 0), base_mes, tot.nome_conta)
+                analise_vertical_mensal[mes] = calcular_analise_vertical_postgresql(valores_mensais.get(mes, 0), base_mes, tot.nome_conta, numerico)
             
             for tri in trimestres:
                 base_tri = bases_trimestrais.get(tri, faturamento_trimestrais.get(tri, 0))
-                analise_vertical_trimestral[tri] = calcular_analise_vertical_postgresql(valores_trimestrais.get(tri, 0), base_tri, tot.nome_conta)
+                analise_vertical_trimestral[tri] = calcular_analise_vertical_postgresql(valores_trimestrais.get(tri, 0), base_tri, tot.nome_conta, numerico)
             
             for ano in anos:
                 base_ano = bases_anuais.get(str(ano), faturamento_anuais.get(str(ano), 0))
-                analise_vertical_anual[str(ano)] = calcular_analise_vertical_postgresql(valores_anuais.get(str(ano), 0), base_ano, tot.nome_conta)
-        else:
+                analise_vertical_anual[str(ano)] = calcular_analise_vertical_postgresql(valores_anuais.get(str(ano), 0), base_ano, tot.nome_conta, numerico)
+        elif vertical:
             # Fallback se não houver dados de faturamento
-            analise_vertical_mensal = {mes: "–" for mes in meses}
-            analise_vertical_trimestral = {tri: "–" for tri in trimestres}
-            analise_vertical_anual = {str(ano): "–" for ano in anos}
+            analise_vertical_mensal = {mes: vazio for mes in meses}
+            analise_vertical_trimestral = {tri: vazio for tri in trimestres}
+            analise_vertical_anual = {str(ano): vazio for ano in anos}
         
-        return {
+        item = {
             "tipo": tot.tipo_operacao,
             "nome": tot.nome_conta,
             "ordem": tot.ordem,
@@ -661,6 +642,16 @@ class DreN0Helper:
             # NOVAS COLUNAS: AV total dinâmica por período
             # COLUNAS DE AV REMOVIDAS - frontend calcula tudo dinamicamente
         }
+        return DreN0Helper._remover_analises(item, horizontal, vertical)
+
+    @staticmethod
+    def _remover_analises(item: Dict, horizontal: bool, vertical: bool) -> Dict:
+        """Retira do item as análises não calculadas (fields= sem horizontal/vertical)"""
+        for analise, calculada in (("horizontal", horizontal), ("vertical", vertical)):
+            if not calculada:
+                for periodo in ("mensal", "trimestral", "anual"):
+                    item.pop(f"analise_{analise}_{periodo}", None)
+        return item
 
     @staticmethod
     def fetch_dre_n0_data_by_multiple_empresas(connection: Connection, empresa_ids: List[str]) -> List[Any]:
@@ -0,0 +1,250 @@
+"""
+Helper para views materializadas (v_dre_n0_completo)
+
+Com ENABLE_MATERIALIZED_VIEWS a view é criada materializada, com índice único,
+e as leituras de /dre-n0/ não agregam financial_data. A atualização usa
+REFRESH MATERIALIZED VIEW CONCURRENTLY (as leituras seguem durante o refresh) e,
+com AUTO_REFRESH_MATERIALIZED_VIEWS, é agendada após escritas em financial_data:
+a primeira escrita abre uma janela de MATERIALIZED_VIEW_REFRESH_DEBOUNCE
+segundos e as escritas dentro dela entram no mesmo refresh. O refresh roda sob
+um advisory lock do Postgres: com vários processos, só um atualiza a view por
+vez e os demais reagendam.
+
+O estado (última atualização, duração, pendências) é do processo.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import redis
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from config.redis_config import (
+    REDIS_URL, ENABLE_MATERIALIZED_VIEWS, AUTO_REFRESH_MATERIALIZED_VIEWS, MATERIALIZED_VIEW_REFRESH_DEBOUNCE
+)
+from database.connection_sqlalchemy import get_engine
+
+# Chaves do cache Redis montadas a partir das views (ver RedisCache.invalidate_dre_cache)
+PADROES_CACHE_DRE = ("dre_n0:*", "classificacoes:*")
+
+
+def _invalidar_cache_dre():
+    """Remove as respostas em cache calculadas sobre a versão anterior da view"""
+    try:
+        cliente = redis.from_url(REDIS_URL, socket_timeout=2)
+        for padrao in PADROES_CACHE_DRE:
+            chaves = list(cliente.scan_iter(padrao))
+            if chaves:
+                cliente.delete(*chaves)
+    except Exception as e:
+        print(f"⚠️ Cache DRE não invalidado após refresh: {e}")
+
+
+class MaterializedViewHelper:
+    """Criação, refresh concorrente com debounce e status de uma view materializada"""
+
+    def __init__(self, nome: str, colunas_unicas: Tuple[str, ...]):
+        self.nome = nome
+        self.colunas_unicas = colunas_unicas
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.pendente_desde: Optional[float] = None
+        self.motivo_pendente: Optional[str] = None
+        self.ultima_atualizacao: Optional[float] = None
+        self.duracao: Optional[float] = None
+        self.ultimo_motivo: Optional[str] = None
+        self.ultimo_erro: Optional[str] = None
+        self.total_atualizacoes = 0
+
+    @property
+    def materializada(self) -> bool:
+        return ENABLE_MATERIALIZED_VIEWS
+
+    def tipo(self, connection: Connection) -> Optional[str]:
+        """'materializada', 'view' ou None quando a relação não existe"""
+        relkind = connection.execute(text("""
+            SELECT c.relkind
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relname = :nome AND n.nspname = current_schema()
+        """), {"nome": self.nome}).scalar()
+        return {"m": "materializada", "v": "view"}.get(relkind)
+
+    def existe(self, connection: Connection) -> bool:
+        """Se a relação existe no formato configurado (uma view comum não serve quando materializada)"""
+        return self.tipo(connection) == ("materializada" if self.materializada else "view")
+
+    def remover(self, connection: Connection):
+        tipo = self.tipo(connection)
+        if tipo == "materializada":
+            connection.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {self.nome}"))
+        elif tipo == "view":
+            connection.execute(text(f"DROP VIEW IF EXISTS {self.nome}"))
+
+    def criar(self, connection: Connection, select_sql: str):
+        """(Re)cria a relação a partir do SELECT; materializada, já populada e com índice único"""
+        self.remover(connection)
+        if not self.materializada:
+            connection.execute(text(f"CREATE VIEW {self.nome} AS {select_sql}"))
+            return
+
+        inicio = time.time()
+        connection.execute(text(f"CREATE MATERIALIZED VIEW {self.nome} AS {select_sql} WITH DATA"))
+        # O índice único é pré-requisito do REFRESH ... CONCURRENTLY
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX {self.nome}_uk ON {self.nome} ({', '.join(self.colunas_unicas)})"
+        ))
+        self._registrar(inicio, "criação", None)
+
+    def _registrar(self, inicio: float, motivo: str, erro: Optional[str]):
+        with self._lock:
+            self.ultimo_motivo = motivo
+            self.ultimo_erro = erro
+            if erro is None:
+                self.ultima_atualizacao = time.time()
+                self.duracao = self.ultima_atualizacao - inicio
+                self.total_atualizacoes += 1
+
+    def atualizar(self, motivo: str = "manual") -> Dict[str, Any]:
+        """REFRESH da view materializada (CONCURRENTLY quando já populada)"""
+        if not self.materializada:
+            return {"success": False, "message": "ENABLE_MATERIALIZED_VIEWS desativado"}
+
+        if not self._refresh_lock.acquire(blocking=False):
+            # Refresh em andamento: as escritas feitas durante ele ficam para o próximo
+            self.agendar(motivo, forcar=True)
+            return {"success": False, "message": f"Refresh de {self.nome} já em andamento; reagendado"}
+
+        ocupado = False
+        try:
+            with self._lock:
+                self.pendente_desde = None
+                self.motivo_pendente = None
+
+            inicio = time.time()
+            try:
+                with get_engine().begin() as connection:
+                    tipo = self.tipo(connection)
+                    if tipo != "materializada":
+                        return {"success": False, "message": f"{self.nome} não é uma view materializada ({tipo})"}
+
+                    # Um refresh por vez entre processos (workers do uvicorn, pool de relatórios):
+                    # com outro em andamento, este fica para depois do debounce
+                    livre = connection.execute(
+                        text("SELECT pg_try_advisory_xact_lock(hashtext(:chave))"),
+                        {"chave": f"refresh:{self.nome}"}
+                    ).scalar()
+                    if not livre:
+                        ocupado = True
+                        return {"success": False, "message": f"Refresh de {self.nome} em andamento em outro processo; reagendado"}
+
+                    populada = connection.execute(
+                        text("SELECT ispopulated FROM pg_matviews WHERE matviewname = :nome"), {"nome": self.nome}
+                    ).scalar()
+                    concorrente = "CONCURRENTLY " if populada else ""
+                    connection.execute(text(f"REFRESH MATERIALIZED VIEW {concorrente}{self.nome}"))
+            except Exception as e:
+                self._registrar(inicio, motivo, str(e))
+                print(f"❌ Erro no refresh de {self.nome}: {e}")
+                return {"success": False, "message": str(e)}
+
+            self._registrar(inicio, motivo, None)
+            _invalidar_cache_dre()
+            print(f"✅ {self.nome} atualizada em {self.duracao:.2f}s ({motivo})")
+            return {"success": True, "duracao_segundos": round(self.duracao, 3)}
+        finally:
+            self._refresh_lock.release()
+            if ocupado:
+                self.agendar(motivo, forcar=True)
+
+    def agendar(self, motivo: str, forcar: bool = False) -> bool:
+        """Registra a escrita pendente e agenda o refresh (com AUTO_REFRESH_MATERIALIZED_VIEWS)
+
+        Sem auto-refresh a pendência fica registrada (status mostra a defasagem)
+        até o próximo refresh manual. Retorna se o refresh foi (ou já estava) agendado.
+        """
+        if not self.materializada:
+            return False
+
+        with self._lock:
+            if self.pendente_desde is None:
+                self.pendente_desde = time.time()
+                self.motivo_pendente = motivo
+            if not (AUTO_REFRESH_MATERIALIZED_VIEWS or forcar):
+                return False
+            if self._timer is None:
+                self._timer = threading.Timer(MATERIALIZED_VIEW_REFRESH_DEBOUNCE, self._executar_agendado)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def _executar_agendado(self):
+        with self._lock:
+            self._timer = None
+            motivo = self.motivo_pendente or "agendado"
+        self.atualizar(motivo)
+
+    def cancelar(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def status(self, connection: Optional[Connection] = None) -> Dict[str, Any]:
+        """Duração do último refresh e defasagem (idade e escritas ainda não refletidas)"""
+        agora = time.time()
+        with self._lock:
+            status = {
+                "view": self.nome,
+                "materializada": self.materializada,
+                "auto_refresh": AUTO_REFRESH_MATERIALIZED_VIEWS,
+                "debounce_segundos": MATERIALIZED_VIEW_REFRESH_DEBOUNCE,
+                "atualizando": self._refresh_lock.locked(),
+                "ultima_atualizacao": (
+                    datetime.fromtimestamp(self.ultima_atualizacao).isoformat() if self.ultima_atualizacao else None
+                ),
+                "duracao_segundos": round(self.duracao, 3) if self.duracao is not None else None,
+                "idade_segundos": round(agora - self.ultima_atualizacao, 1) if self.ultima_atualizacao else None,
+                "pendente": self.pendente_desde is not None,
+                "defasagem_segundos": round(agora - self.pendente_desde, 1) if self.pendente_desde else 0,
+                "ultimo_motivo": self.ultimo_motivo,
+                "ultimo_erro": self.ultimo_erro,
+                "total_atualizacoes": self.total_atualizacoes,
+            }
+
+        if connection is not None:
+            status["tipo"] = self.tipo(connection)
+            if status["tipo"] == "materializada":
+                linha = connection.execute(text("""
+                    SELECT m.ispopulated, pg_total_relation_size(c.oid)
+                    FROM pg_matviews m
+                    JOIN pg_class c ON c.relname = m.matviewname
+                    JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = m.schemaname
+                    WHERE m.matviewname = :nome AND m.schemaname = current_schema()
+                """), {"nome": self.nome}).fetchone()
+                if linha is not None:
+                    status["populada"] = linha[0]
+                    status["tamanho_bytes"] = linha[1]
+        return status
+
+
+dre_n0_view = MaterializedViewHelper("v_dre_n0_completo", ("dre_n0_id",))
+
+# Views materializadas atualizadas após escritas e migrações
+VIEWS_MATERIALIZADAS = [dre_n0_view]
+
+
+def agendar_atualizacao_views(motivo: str = "financial_data") -> bool:
+    """Agenda (com debounce) o refresh das views após escritas em financial_data"""
+    agendadas = [view.agendar(motivo) for view in VIEWS_MATERIALIZADAS]
+    return any(agendadas)
+
+
+def atualizar_views_materializadas(motivo: str = "manual") -> Dict[str, Any]:
+    """Refresh imediato de todas as views materializadas (migrações, endpoint admin)"""
+    return {view.nome: view.atualizar(motivo) for view in VIEWS_MATERIALIZADAS}
+
+
+def status_views_materializadas(connection: Optional[Connection] = None) -> Dict[str, Any]:
+    return {view.nome: view.status(connection) for view in VIEWS_MATERIALIZADAS}
@@ -1,7 +1,8 @@
 import os
+import threading
 import time
-import pandas as pd
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Request, UploadFile, File
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
 import redis
@@ -15,6 +16,15 @@ from endpoints.dre_postgresql_debug import router as dre_postgresql_debug_router
 from endpoints.dre_postgresql_views import router as dre_postgresql_views_router
 from endpoints.dre_n0_postgresql import router as dre_n0_postgresql_router
 from endpoints.backup_admin import router as backup_admin_router
+from helpers.workbook_store import (
+    get_workbook_store, iniciar_monitoramento_workbooks, parar_monitoramento_workbooks, DEFAULT_WORKBOOK,
+    resolver_workbook, status_workbooks
+)
+from helpers.report_pool import encerrar_pool, status_pool
+from helpers.response_cache import CacheRespostasMiddleware, status_cache_respostas
+from database.account_ids import garantir_colunas_contas
+from database.monthly_facts import garantir_tabela_fatos, TabelaFatosIndisponivel
+from database.classification_map import garantir_mapa_classificacoes
 from auth import auth_router
 
 
@@ -37,48 +47,15 @@ def get_redis_client():
         print(f"❌ Erro ao conectar Redis: {e}")
         return None
 
-# --- CACHE GLOBAL PARA O DATAFRAME ---
-_df_cache = {
-    "df": None,
-    "last_loaded": 0,
-    "last_mtime": 0,
-}
-CACHE_TIMEOUT = 300  # 5 minutos ao invés de 1 minuto
+app = FastAPI()
 
-def get_cached_df(filename="db_bluefit - Copia.xlsx"):
-    global _df_cache
-    try:
-        mtime = os.path.getmtime(filename)
-    except Exception:
-        return None
-    now = time.time()
-    # Recarrega se: nunca carregado, arquivo mudou, ou timeout
-    if (
-        _df_cache["df"] is None
-        or _df_cache["last_mtime"] != mtime
-        or now - _df_cache["last_loaded"] > CACHE_TIMEOUT
-    ):
-        try:
-            start_time = time.time()
-            
-            # Otimizar leitura do Excel
-            df = pd.read_excel(
-                filename,
-                engine='openpyxl',  # Engine mais rápida
-                na_values=['', 'NaN', 'N/A', 'null'],  # Valores nulos explícitos
-            )
-            
-            end_time = time.time()
-            
-            _df_cache["df"] = df
-            _df_cache["last_loaded"] = now
-            _df_cache["last_mtime"] = mtime
-        except Exception as e:
-            print(f"❌ Erro ao carregar Excel: {e}")
-            _df_cache["df"] = None
-    return _df_cache["df"]
+@app.exception_handler(TabelaFatosIndisponivel)
+async def tabela_fatos_indisponivel(request: Request, exc: TabelaFatosIndisponivel):
+    """Leituras da tabela de fatos ou do mapa de classificações antes da criação (inicialização em andamento)"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
 
-app = FastAPI()
+# Cache de respostas da planilha (ETag/304); registrado antes do CORS para ficar por dentro dele
+app.add_middleware(CacheRespostasMiddleware)
 
 # CORS Configuration based on environment
 import os
@@ -133,18 +110,61 @@ app.include_router(dre_postgresql_views_router, tags=["dre-postgresql-views"])
 app.include_router(dre_n0_postgresql_router, tags=["dre-n0-postgresql"])
 app.include_router(backup_admin_router, tags=["admin-backups"])
 
+@app.on_event("startup")
+def iniciar_cache_planilhas():
+    """Carrega a planilha em background e passa a observar mudanças no arquivo"""
+    get_workbook_store(DEFAULT_WORKBOOK).revalidar()
+    iniciar_monitoramento_workbooks()
+
+def preparar_agregados_postgres():
+    """Cria (com backfill) a tabela de fatos e o mapa de classificações, fora das requisições
+
+    As leituras não criam nada (respondem 503 até aqui terminar): sem PostgreSQL
+    na subida, tenta de novo a cada minuto.
+    """
+    while True:
+        try:
+            garantir_colunas_contas()
+            garantir_tabela_fatos()
+            garantir_mapa_classificacoes()
+            return
+        except Exception as e:
+            print(f"⚠️ Agregados do PostgreSQL não preparados na inicialização: {e}; nova tentativa em 60s")
+            time.sleep(60)
+
+@app.on_event("startup")
+def iniciar_agregados_postgres():
+    """Em background: o backfill da primeira criação não atrasa a subida da API"""
+    threading.Thread(target=preparar_agregados_postgres, name="preparar-agregados", daemon=True).start()
+
+@app.on_event("shutdown")
+def parar_cache_planilhas():
+    parar_monitoramento_workbooks()
+    encerrar_pool()
+
 @app.get("/")
 def root():
     return {"message": "API está funcionando!"}
 
 @app.get("/health")
-def health_check():
-    """Endpoint para verificar saúde do sistema e performance"""
+def health_check(cliente: str = None, grupo: str = None):
+    """Endpoint para verificar saúde do sistema e performance
+
+    Detalha a planilha do cliente (ou grupo) pedido, ou a padrão; "workbooks"
+    traz a memória e o último acesso de cada planilha do registro.
+    """
     start_time = time.time()
     
     try:
+        filename, erro = resolver_workbook(cliente, grupo)
+        if erro:
+            return {
+                "status": "error",
+                "message": erro,
+                "response_time": time.time() - start_time
+            }
+        
         # Verificar se o arquivo existe
-        filename = "db_bluefit - Copia.xlsx"
         if not os.path.exists(filename):
             return {
                 "status": "error",
@@ -153,11 +173,12 @@ def health_check():
             }
         
         # Verificar cache
-        cache_status = "hit" if _df_cache["df"] is not None else "miss"
+        store = get_workbook_store(filename)
+        cache_status = "hit" if store.peek() is not None else "miss"
         
         # Verificar se consegue carregar dados
-        df = get_cached_df(filename)
-        if df is None:
+        snapshot = store.get_snapshot()
+        if snapshot is None:
             return {
                 "status": "error", 
                 "message": "Erro ao carregar dados",
@@ -165,13 +186,24 @@ def health_check():
                 "response_time": time.time() - start_time
             }
         
+        status = snapshot.status()
+        store_status = store.status()
         return {
             "status": "healthy",
             "message": "Sistema operacional",
-            "data_rows": len(df),
-            "data_columns": len(df.columns),
+            "data_rows": status["data_rows"],
+            "data_columns": status["data_columns"],
             "cache_status": cache_status,
-            "cache_age": time.time() - _df_cache["last_loaded"] if _df_cache["last_loaded"] > 0 else None,
+            "cache_age": status["idade"],
+            "data_version": status["versao"],
+            "data_source": status["origem"],
+            "reloading": store_status["recarregando"],
+            "last_checked": store_status["ultima_verificacao"],
+            "last_reload_error": store_status["ultimo_erro"],
+            "memory": snapshot.memoria(),
+            "workbooks": status_workbooks(),
+            "report_pool": status_pool(),
+            "response_cache": status_cache_respostas(),
             "response_time": time.time() - start_time
         }
     except Exception as e:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Backfill dos ids de conta (dre_n1_id, dre_n2_id, dfc_n2_id) em financial_data
+
+Cria colunas, índices e funções se ainda não existirem, resolve os lançamentos
+das empresas indicadas (todas, sem argumentos), reconstrói financial_data_mensal
+e atualiza as views materializadas.
+
+Uso (a partir de backend/):
+    python scripts/migrates/backfill_account_ids.py [empresa_id ...]
+"""
+import sys
+import time
+from sqlalchemy import text
+from database.connection_sqlalchemy import get_engine
+from database.account_ids import garantir_colunas_contas, resolver_contas_empresas
+from database.monthly_facts import reconstruir_fatos
+from helpers_postgresql.dre.materialized_view_helper import atualizar_views_materializadas
+
+def contar_sem_conta(connection, empresa_ids=None):
+    """Lançamentos com rótulo que não encontraram conta na estrutura: (dre_n1, dre_n2, dfc_n2)"""
+    filtro = "AND empresa_id::text = ANY(:empresas)" if empresa_ids else ""
+    return tuple(connection.execute(text(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE nome_conta_limpo(dre_n1) IS NOT NULL AND dre_n1_id IS NULL),
+            COUNT(*) FILTER (WHERE nome_conta_limpo(dre_n2) IS NOT NULL AND dre_n2_id IS NULL),
+            COUNT(*) FILTER (WHERE nome_conta_limpo(dfc_n2) IS NOT NULL AND dfc_n2_id IS NULL)
+        FROM financial_data
+        WHERE true {filtro}
+    """), {"empresas": empresa_ids}).fetchone())
+
+def backfill_account_ids(empresa_ids=None):
+    """Resolve os ids de conta e atualiza os agregados de relatório"""
+    inicio = time.time()
+
+    if garantir_colunas_contas():
+        print("✅ Colunas criadas e todos os lançamentos resolvidos")
+
+    with get_engine().begin() as connection:
+        total = resolver_contas_empresas(connection, empresa_ids)
+        print(f"🔗 Ids de conta resolvidos em {total:,} lançamentos")
+
+        sem_n1, sem_n2, sem_dfc = contar_sem_conta(connection, empresa_ids)
+        print(f"⚠️ Sem conta na estrutura: dre_n1 {sem_n1:,} | dre_n2 {sem_n2:,} | dfc_n2 {sem_dfc:,}")
+
+        reconstruir_fatos(connection, empresa_ids)
+
+    atualizar_views_materializadas("backfill ids de contas")
+    print(f"🎉 Backfill concluído em {time.time() - inicio:.1f}s")
+
+if __name__ == "__main__":
+    backfill_account_ids(sys.argv[1:] or None)
@@ -0,0 +1,103 @@
+"""
+Atualização dos agregados de relatório ao fim das migrações (conexões psycopg2)
+
+- ids de conta em financial_data: resolvidos de novo para as empresas carregadas
+  pela função SQL criada em database/account_ids.py;
+- financial_data_mensal: reconstruída para as empresas carregadas pela função
+  SQL criada em database/monthly_facts.py;
+- classificacao_plano_contas: classificações remapeadas (de_para → plano_de_contas
+  → dre_n2) para as empresas carregadas pela função SQL criada em database/classification_map.py;
+- views materializadas: mesmo REFRESH que helpers_postgresql/dre/materialized_view_helper.py
+  faz na API, CONCURRENTLY quando a view já está populada, para não bloquear leituras.
+"""
+
+MATERIALIZED_VIEWS = ["v_dre_n0_completo"]
+
+def resolve_account_ids(conn, empresa_ids=None):
+    """Resolve dre_n1_id/dre_n2_id/dfc_n2_id dos lançamentos das empresas indicadas (todas quando None)"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regproc('resolver_contas_financial_data') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            # A API (ou backfill_account_ids.py) cria as colunas e resolve todos os lançamentos
+            print("ℹ️ Ids de conta ainda não criados em financial_data, nada a resolver")
+            return
+        empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+        cur.execute("SELECT resolver_contas_financial_data(%s::text[])", (empresas,))
+        total = cur.fetchone()[0]
+        conn.commit()
+        print(f"🔗 Ids de conta resolvidos em {total:,} lançamentos")
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Erro ao resolver ids de conta: {e}")
+    finally:
+        cur.close()
+
+def refresh_report_aggregates(conn, empresa_ids=None):
+    """Ids de conta, fatos mensais, mapa de classificações e views materializadas, nessa ordem, após mudar dados ou estruturas"""
+    resolve_account_ids(conn, empresa_ids)
+    rebuild_monthly_facts(conn, empresa_ids)
+    rebuild_classification_map(conn, empresa_ids)
+    refresh_materialized_views(conn)
+
+def rebuild_monthly_facts(conn, empresa_ids=None):
+    """Recalcula financial_data_mensal para as empresas indicadas (todas quando None)"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regproc('reconstruir_financial_data_mensal') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            # A API cria e popula a tabela na inicialização, já com esta carga
+            print("ℹ️ financial_data_mensal ainda não existe, nada a reconstruir")
+            return
+        empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+        cur.execute("SELECT reconstruir_financial_data_mensal(%s::text[])", (empresas,))
+        conn.commit()
+        print(f"🔄 financial_data_mensal reconstruída ({len(empresas) if empresas else 'todas as'} empresas)")
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Erro ao reconstruir financial_data_mensal: {e}")
+    finally:
+        cur.close()
+
+def rebuild_classification_map(conn, empresa_ids=None):
+    """Remapeia classificacao_plano_contas para as empresas indicadas (todas quando None)"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regproc('reconstruir_classificacao_plano_contas') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            # A API cria e popula a tabela na inicialização, já com esta carga
+            print("ℹ️ classificacao_plano_contas ainda não existe, nada a remapear")
+            return
+        empresas = [str(e) for e in empresa_ids] if empresa_ids is not None else None
+        cur.execute("SELECT reconstruir_classificacao_plano_contas(%s::text[])", (empresas,))
+        total = cur.fetchone()[0]
+        conn.commit()
+        print(f"🗺️ {total:,} classificações mapeadas em classificacao_plano_contas")
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Erro ao remapear classificacao_plano_contas: {e}")
+    finally:
+        cur.close()
+
+def refresh_materialized_views(conn):
+    """Atualiza as views materializadas existentes após a carga"""
+    cur = conn.cursor()
+    try:
+        for view in MATERIALIZED_VIEWS:
+            cur.execute(
+                "SELECT ispopulated FROM pg_matviews WHERE matviewname = %s AND schemaname = current_schema()",
+                (view,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                print(f"ℹ️ {view} não é materializada, nada a atualizar")
+                continue
+            concurrently = "CONCURRENTLY " if row[0] else ""
+            cur.execute(f"REFRESH MATERIALIZED VIEW {concurrently}{view}")
+            conn.commit()
+            print(f"🔄 View materializada {view} atualizada")
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Erro ao atualizar views materializadas: {e}")
+    finally:
+        cur.close()
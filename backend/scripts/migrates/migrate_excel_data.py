@@ -8,6 +8,10 @@ from typing import Dict, Any
 from database.connection import get_database
 from database.schema import financial_data, categories
 from database.repository import FinancialDataRepository
+from database.connection_sqlalchemy import get_engine
+from database.account_ids import garantir_colunas_contas, resolver_contas_empresas
+from database.monthly_facts import reconstruir_fatos
+from helpers_postgresql.dre.materialized_view_helper import atualizar_views_materializadas
 
 def migrate_excel_to_postgres(excel_file: str = "db_bluefit - Copia.xlsx"):
     """Migra dados do Excel para PostgreSQL"""
@@ -83,6 +87,14 @@ def migrate_excel_to_postgres(excel_file: str = "db_bluefit - Copia.xlsx"):
         # Criar categorias baseadas nos dados
         create_categories_from_data(df)
         
+        # Resolver os ids de conta, reconstruir os fatos mensais e atualizar as views
+        # materializadas com os dados migrados (colunas criadas antes, fora da transação)
+        garantir_colunas_contas()
+        with get_engine().begin() as connection:
+            resolver_contas_empresas(connection)
+            reconstruir_fatos(connection)
+        atualizar_views_materializadas("migração Excel")
+        
     except Exception as e:
         print(f"❌ Erro na migração: {e}")
         raise
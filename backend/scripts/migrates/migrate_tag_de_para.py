@@ -12,6 +12,7 @@ import uuid
 import json
 from datetime import datetime
 import os
+from materialized_views import rebuild_classification_map
 
 def get_connection():
     """Estabelece conexão com o banco"""
@@ -314,6 +315,9 @@ def main():
             # 5. Validar inserção
             validate_de_para_insertion(conn, grupo_empresa_id)
             
+            # Classificações remapeadas (de_para → plano_de_contas) para o endpoint de classificações
+            rebuild_classification_map(conn, empresa_ids.values())
+            
             print(f"\n🎉 MIGRAÇÃO DE_PARA CONCLUÍDA COM SUCESSO!")
             print(f"📊 {inserted_count:,} registros de_para da empresa TAG inseridos")
             print(f"🔗 Dados disponíveis na tabela de_para")
@@ -9,6 +9,7 @@ from psycopg2.extras import RealDictCursor
 import uuid
 from datetime import datetime
 import re
+from materialized_views import refresh_report_aggregates
 
 def get_connection():
     """Estabelece conexão com o banco"""
@@ -244,6 +245,8 @@ def main():
         
         # Inserir dados
         if insert_dre_n2_structure_data(conn, df_clean, grupo_empresa_id, empresa_ids):
+            # Contas recriadas: resolver de novo os lançamentos e atualizar os agregados
+            refresh_report_aggregates(conn, empresa_ids)
             print("🎉 Migração concluída com sucesso!")
         else:
             print("❌ Migração falhou")
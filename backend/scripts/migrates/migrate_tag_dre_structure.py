@@ -11,6 +11,7 @@ import pandas as pd
 import uuid
 from datetime import datetime
 import os
+from materialized_views import refresh_materialized_views
 import re
 
 def get_connection():
@@ -319,6 +320,9 @@ def main():
             # 5. Validar inserção
             validate_dre_structure_insertion(conn, grupo_empresa_id)
             
+            # 6. Atualizar views materializadas (v_dre_n0_completo)
+            refresh_materialized_views(conn)
+            
             print(f"\n🎉 MIGRAÇÃO DA ESTRUTURA DRE CONCLUÍDA COM SUCESSO!")
             print(f"📊 {inserted_count:,} registros da estrutura DRE da empresa TAG inseridos")
             print(f"🔗 Dados disponíveis na tabela dre_structure_n0")
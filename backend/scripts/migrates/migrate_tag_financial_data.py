@@ -11,6 +11,7 @@ import pandas as pd
 import uuid
 from datetime import datetime
 import os
+from materialized_views import refresh_report_aggregates
 
 def get_connection():
     """Estabelece conexão com o banco"""
@@ -371,6 +372,10 @@ def main():
             # 5. Validar inserção
             validate_insertion(conn, grupo_empresa_id)
             
+            # 6. Resolver ids de conta, reconstruir os fatos mensais das empresas
+            #    carregadas e atualizar as views materializadas (v_dre_n0_completo)
+            refresh_report_aggregates(conn, empresa_mapping.values())
+            
             print(f"\n🎉 MIGRAÇÃO CONCLUÍDA COM SUCESSO!")
             print(f"📊 {inserted_count:,} registros da empresa TAG inseridos")
             print(f"🔗 Dados disponíveis na tabela financial_data")
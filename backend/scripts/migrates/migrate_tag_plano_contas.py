@@ -11,6 +11,7 @@ import pandas as pd
 import uuid
 from datetime import datetime
 import os
+from materialized_views import rebuild_classification_map
 
 def get_connection():
     """Estabelece conexão com o banco"""
@@ -339,6 +340,9 @@ def main():
             # 5. Validar inserção
             validate_plano_contas_insertion(conn, grupo_empresa_id)
             
+            # Classificações remapeadas (de_para → plano_de_contas) para o endpoint de classificações
+            rebuild_classification_map(conn, empresa_ids.values())
+            
             print(f"\n🎉 MIGRAÇÃO DO PLANO DE CONTAS CONCLUÍDA COM SUCESSO!")
             print(f"📊 {inserted_count:,} registros do plano de contas da empresa TAG inseridos")
             print(f"🔗 Dados disponíveis na tabela plano_de_contas")
@@ -0,0 +1,44 @@
+"""
+Ambiente dos testes: endpoints da planilha Excel e, com PostgreSQL e Redis simulados, os do banco
+
+fixtures/regression_workbook.xlsx é uma amostra anonimizada da base (set/2024 a
+jun/2025, com realizado e orçamento) e as abas de estrutura DRE/DFC. Ela é
+copiada para um diretório temporário, porque o snapshot colunar é gravado ao
+lado da planilha, e registrada como único cliente antes de importar a
+aplicação. Os relatórios rodam no próprio processo (sem pool) e sem Redis.
+
+Uso (a partir de backend/):
+    python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(BACKEND, "tests", "fixtures")
+
+_pasta = tempfile.mkdtemp(prefix="regression_workbook_")
+PLANILHA_TESTE = shutil.copy(
+    os.path.join(FIXTURES, "regression_workbook.xlsx"), os.path.join(_pasta, "regression_workbook.xlsx")
+)
+
+os.environ["EXCEL_WORKBOOKS"] = f"teste={PLANILHA_TESTE}"
+os.environ["EXCEL_DEFAULT_CLIENTE"] = "teste"
+os.environ["REPORT_POOL_WORKERS"] = "0"
+os.environ["ENABLE_CACHE"] = "false"
+sys.path.insert(0, BACKEND)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_pasta, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Cliente da API sem os eventos de startup (sem monitor de arquivos nem PostgreSQL)"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    return TestClient(app)
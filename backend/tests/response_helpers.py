@@ -0,0 +1,79 @@
+"""
+Comparação de respostas JSON dos endpoints da planilha Excel nos testes
+
+ESPERADO traz as respostas do commit "baseline" (antes do snapshot colunar, do
+cubo conta × período × cenário e das fórmulas compiladas) para a planilha de
+teste, em fixtures/expected_excel_responses.json.
+"""
+import json
+import math
+import os
+from conftest import FIXTURES
+
+with open(os.path.join(FIXTURES, "expected_excel_responses.json"), encoding="utf-8") as f:
+    ESPERADO = json.load(f)
+
+# Linhas de saldo do DFC: o trimestre traz o saldo do período, não a soma dos meses
+LINHAS_SALDO = {"Saldo inicial", "Saldo final"}
+
+
+def numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def comparar(esperado, obtido, caminho="", ignorar=None):
+    """Diferenças entre duas respostas JSON (lista de textos, vazia quando iguais)
+
+    Números com tolerância de ponto flutuante (0 e 0.0 são iguais); a ordem das
+    classificações dentro de uma conta não é contrato (a versão anterior
+    percorria um set), então elas são comparadas por nome. ignorar é
+    (período, campos): nesses campos, o período fica de fora da comparação.
+    """
+    if isinstance(esperado, dict):
+        if not isinstance(obtido, dict):
+            return [f"{caminho}: esperado objeto, obtido {type(obtido).__name__}"]
+        diferencas = []
+        if set(esperado) != set(obtido):
+            diferencas.append(f"{caminho}: chaves diferentes {sorted(set(esperado) ^ set(obtido))}")
+        for chave in set(esperado) & set(obtido):
+            if ignorar is not None and chave in ignorar[1]:
+                # Mudança intencional: o período alterado fica de fora, os demais são comparados
+                diferencas += comparar(
+                    {k: v for k, v in esperado[chave].items() if k != ignorar[0]},
+                    {k: v for k, v in obtido[chave].items() if k != ignorar[0]},
+                    f"{caminho}/{chave}",
+                )
+            else:
+                diferencas += comparar(esperado[chave], obtido[chave], f"{caminho}/{chave}", ignorar)
+        return diferencas
+
+    if isinstance(esperado, list):
+        if not isinstance(obtido, list) or len(esperado) != len(obtido):
+            return [f"{caminho}: listas de tamanhos diferentes"]
+        if caminho.endswith("/classificacoes"):
+            esperado = sorted(esperado, key=lambda item: str(item.get("nome")))
+            obtido = sorted(obtido, key=lambda item: str(item.get("nome")))
+        diferencas = []
+        for indice, (item_esperado, item_obtido) in enumerate(zip(esperado, obtido)):
+            diferencas += comparar(item_esperado, item_obtido, f"{caminho}[{indice}]", ignorar)
+        return diferencas
+
+    if numero(esperado) and numero(obtido):
+        if math.isclose(esperado, obtido, rel_tol=1e-9, abs_tol=1e-6):
+            return []
+    elif esperado == obtido:
+        return []
+    return [f"{caminho}: esperado {esperado!r}, obtido {obtido!r}"]
+
+
+def linhas_com_orcamento(linhas):
+    """Contas, totalizadores e classificações de "data", com suas classificações aninhadas"""
+    for linha in linhas:
+        if linha["nome"] not in LINHAS_SALDO:
+            yield linha
+        yield from linhas_com_orcamento(linha.get("classificacoes") or [])
+
+
+def linha(resposta, nome):
+    """Linha de primeiro nível de "data" com o nome dado"""
+    return next(item for item in resposta["data"] if item["nome"] == nome)
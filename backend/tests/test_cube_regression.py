@@ -0,0 +1,63 @@
+"""
+Regressão de /dre, /dfc, /receber e /pagar contra a implementação anterior ao cubo
+
+As respostas atuais precisam ser iguais às do commit "baseline" (ESPERADO, em
+response_helpers.py), com uma mudança intencional: o orçamento trimestral soma
+todos os meses do trimestre. Antes, um mês só com orçamento ficava fora do
+trimestre (o anual já o incluía). Na planilha de teste isso acontece no DFC em
+2025-T3 (orçamento com data em jul/2025, sem realizado), e os campos de
+orçamento desse trimestre são conferidos pela regra nova em vez do valor antigo.
+
+/receber e /pagar separam passado e futuro pela data de hoje; todas as datas da
+planilha de teste já passaram.
+"""
+import pytest
+from response_helpers import ESPERADO, comparar, linhas_com_orcamento, linha
+
+ROTAS = sorted(ESPERADO)
+
+# Campos alterados de propósito pelo orçamento trimestral (rota -> (trimestre, campos))
+MUDANCAS_ORCAMENTO_TRIMESTRAL = {
+    "/dfc": ("2025-T3", {
+        "orcamentos_trimestrais",
+        "horizontal_orcamentos_trimestrais",
+        "vertical_orcamentos_trimestrais",
+        "real_vs_orcamento_trimestrais",
+    }),
+}
+
+
+@pytest.mark.parametrize("rota", ROTAS)
+def test_resposta_igual_a_implementacao_anterior(client, rota):
+    resposta = client.get(rota)
+    assert resposta.status_code == 200
+
+    diferencas = comparar(ESPERADO[rota], resposta.json(), rota, MUDANCAS_ORCAMENTO_TRIMESTRAL.get(rota))
+    assert not diferencas, "\n".join(diferencas[:20])
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+def test_orcamento_trimestral_soma_todos_os_meses(client, rota):
+    linhas = list(linhas_com_orcamento(client.get(rota).json()["data"]))
+    assert linhas
+
+    for item in linhas:
+        por_trimestre = {}
+        for mes, valor in item["orcamentos_mensais"].items():
+            ano, numero_mes = mes.split("-")
+            trimestre = f"{ano}-T{(int(numero_mes) - 1) // 3 + 1}"
+            por_trimestre[trimestre] = por_trimestre.get(trimestre, 0) + valor
+        for trimestre, valor in item["orcamentos_trimestrais"].items():
+            # O DFC arredonda cada período para inteiro: até 0,5 de diferença por mês
+            assert valor == pytest.approx(por_trimestre.get(trimestre, 0), abs=1.5), (
+                f"{item['nome']} {trimestre}"
+            )
+
+
+def test_mes_so_com_orcamento_entra_no_trimestre(client):
+    """Caso da mudança intencional: jul/2025 só tem orçamento no DFC"""
+    anterior = linha(ESPERADO["/dfc"], "Movimentações")
+    atual = linha(client.get("/dfc").json(), "Movimentações")
+    assert anterior["orcamentos_trimestrais"]["2025-T3"] == 0
+    assert atual["orcamentos_mensais"]["2025-07"] != 0
+    assert atual["orcamentos_trimestrais"]["2025-T3"] == pytest.approx(atual["orcamentos_mensais"]["2025-07"], abs=0.5)
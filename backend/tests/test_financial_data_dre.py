@@ -0,0 +1,107 @@
+"""
+/financial-data/dre sobre a tabela de fatos (financial_data_mensal)
+
+A DRE usa a base competência: as células vêm de financial_data_mensal com
+base 'competencia' e sem os descartados (fictícios e duplicatas exatas), o mês
+é o da competência e as contas casam por dre_n2. Antes da criação da tabela a
+leitura responde 503, sem criá-la. Sem PostgreSQL aqui: a sessão da tabela de
+fatos responde a versão e devolve células fixas, e as estruturas DRE ficam em
+um SQLite em memória.
+"""
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+def _celula(conta_n2, mes, origem, entradas=0.0, saidas=0.0):
+    return SimpleNamespace(
+        empresa_id="empresa", conta_n1="( + ) Receita Bruta", conta_n2=conta_n2, classificacao="Receita de vendas",
+        mes=mes, origem=origem, entradas=entradas, saidas=saidas, quantidade=1,
+    )
+
+
+CELULAS = [
+    _celula("Faturamento", date(2024, 1, 1), "CAR", entradas=1000.0),
+    _celula("Faturamento", date(2024, 2, 1), "CAR", entradas=500.0),
+    _celula("Faturamento", date(2024, 1, 1), "ORC", entradas=800.0),
+]
+
+
+@pytest.fixture
+def fatos(monkeypatch):
+    """Sessão falsa da tabela de fatos; guarda o SQL e os parâmetros das consultas"""
+    from database import monthly_facts, repository_sqlalchemy
+
+    consultas = []
+    versao = {"atual": monthly_facts._VERSAO}
+
+    class SessaoFalsa:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def execute(self, sql, parametros=None):
+            if str(sql) == monthly_facts._SQL_VERSAO:
+                return SimpleNamespace(scalar=lambda: versao["atual"])
+            consultas.append((str(sql), parametros))
+            return SimpleNamespace(fetchall=lambda: CELULAS)
+
+    monkeypatch.setattr(monthly_facts, "_tabela_pronta", False)
+    monkeypatch.setattr(repository_sqlalchemy, "DatabaseSession", SessaoFalsa)
+    return SimpleNamespace(consultas=consultas, versao=versao)
+
+
+@pytest.fixture
+def estrutura_dre(monkeypatch):
+    """Estrutura DRE mínima (um totalizador e uma conta) em SQLite"""
+    from database import connection_sqlalchemy
+    from database.schema_sqlalchemy import DREStructureN0, DREStructureN1, DREStructureN2, DREClassification
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tabelas = [DREStructureN0.__table__, DREStructureN1.__table__, DREStructureN2.__table__, DREClassification.__table__]
+    DREStructureN0.metadata.create_all(engine, tables=tabelas)
+
+    session = sessionmaker(bind=engine)()
+    session.add(DREStructureN1(id=1, dre_n1_id=1, name="Receita Bruta", operation_type="="))
+    session.add(DREStructureN2(id=1, dre_n2_id=10, dre_n1_id=1, name="Faturamento", operation_type="+"))
+    session.commit()
+    session.close()
+
+    monkeypatch.setattr(connection_sqlalchemy, "get_engine", lambda: engine)
+    yield engine
+    engine.dispose()
+
+
+def test_dre_usa_competencia_sem_descartados(client, fatos, estrutura_dre):
+    resposta = client.get("/financial-data/dre")
+    assert resposta.status_code == 200
+
+    sql, parametros = fatos.consultas[0]
+    assert parametros["base"] == "competencia"
+    assert "NOT descartado" in sql
+
+    corpo = resposta.json()
+    assert corpo["meses"] == ["2024-01", "2024-02"]
+    assert corpo["trimestres"] == ["2024-T1"]
+
+    totalizador = corpo["data"][0]
+    conta = totalizador["classificacoes"][0]
+    assert conta["nome"] == "Faturamento"
+    assert conta["valores_mensais"] == {"2024-01": 1000.0, "2024-02": 500.0}
+    assert conta["orcamentos_mensais"] == {"2024-01": 800.0, "2024-02": 0.0}
+    assert conta["valores_trimestrais"] == {"2024-T1": 1500.0}
+    assert totalizador["valores_mensais"] == conta["valores_mensais"]
+
+
+def test_dre_antes_da_tabela_de_fatos_responde_503(client, fatos, estrutura_dre):
+    fatos.versao["atual"] = None
+
+    resposta = client.get("/financial-data/dre")
+    assert resposta.status_code == 503
+    assert resposta.headers["retry-after"] == "30"
+    assert not fatos.consultas
@@ -0,0 +1,47 @@
+"""
+expand= em /dre e /dre/classificacoes/{conta}: classificações sob demanda (planilha de teste)
+"""
+from urllib.parse import quote
+import pytest
+from response_helpers import comparar
+
+
+@pytest.fixture(scope="module")
+def completa(client):
+    return client.get("/dre").json()
+
+
+def _expandidas(resposta):
+    return {linha["nome"]: linha["classificacoes"] for linha in resposta["data"] if linha.get("classificacoes")}
+
+
+def test_expand_none_so_retira_as_classificacoes(client, completa):
+    resposta = client.get("/dre?expand=none").json()
+    assert not _expandidas(resposta)
+
+    sem_classificacoes = {**completa, "data": [{**linha, "classificacoes": []} for linha in completa["data"]]}
+    diferencas = comparar(sem_classificacoes, resposta, "/dre?expand=none")
+    assert not diferencas, "\n".join(diferencas[:20])
+
+
+def test_classificacoes_sob_demanda_iguais_as_da_resposta_completa(client, completa):
+    expandidas = _expandidas(completa)
+    assert expandidas
+
+    for conta, classificacoes in expandidas.items():
+        resposta = client.get(f"/dre/classificacoes/{quote(conta)}").json()
+        assert resposta["conta"] == conta
+        diferencas = comparar(classificacoes, resposta["classificacoes"], f"{conta}/classificacoes")
+        assert not diferencas, "\n".join(diferencas[:20])
+
+
+def test_expand_com_uma_conta(client, completa):
+    conta = next(iter(_expandidas(completa)))
+
+    resposta = client.get(f"/dre?expand={quote(conta)}").json()
+    assert list(_expandidas(resposta)) == [conta]
+
+
+def test_conta_nao_expansivel_retorna_erro(client):
+    assert "error" in client.get("/dre?expand=Conta inexistente").json()
+    assert "error" in client.get("/dre/classificacoes/Conta inexistente").json()
@@ -0,0 +1,37 @@
+"""
+Agendamento e status do refresh das views materializadas (sem PostgreSQL: só o estado do processo)
+"""
+import pytest
+from helpers_postgresql.dre import materialized_view_helper as modulo
+from helpers_postgresql.dre.materialized_view_helper import MaterializedViewHelper
+
+
+@pytest.fixture
+def view(monkeypatch):
+    monkeypatch.setattr(modulo, "ENABLE_MATERIALIZED_VIEWS", True)
+    view = MaterializedViewHelper("v_teste", ("id",))
+    yield view
+    view.cancelar()
+
+
+def test_escrita_sem_auto_refresh_fica_pendente(monkeypatch, view):
+    monkeypatch.setattr(modulo, "AUTO_REFRESH_MATERIALIZED_VIEWS", False)
+
+    assert view.agendar("insert financial_data") is False
+    assert view._timer is None
+
+    status = view.status()
+    assert status["pendente"] is True
+    assert status["defasagem_segundos"] >= 0
+    assert view.motivo_pendente == "insert financial_data"
+
+
+def test_escritas_com_auto_refresh_entram_no_mesmo_refresh(monkeypatch, view):
+    monkeypatch.setattr(modulo, "AUTO_REFRESH_MATERIALIZED_VIEWS", True)
+
+    assert view.agendar("insert financial_data") is True
+    timer = view._timer
+    assert view.agendar("update financial_data") is True
+    assert view._timer is timer
+    assert view.motivo_pendente == "insert financial_data"
+    assert view.status()["pendente"] is True
@@ -0,0 +1,33 @@
+"""
+format=numeric em /dre e /dfc: as análises viram números (ou null) e o resto da resposta não muda
+"""
+import pytest
+from response_helpers import comparar, numero
+
+
+def comparar_formato_numerico(padrao, numerico, caminho=""):
+    """format=numeric: "12.34%" vira 12.34 e "–" vira null; o resto é igual ao padrão"""
+    if isinstance(padrao, dict):
+        if set(padrao) != set(numerico):
+            return [f"{caminho}: chaves diferentes {sorted(set(padrao) ^ set(numerico))}"]
+        return [d for chave in padrao for d in comparar_formato_numerico(padrao[chave], numerico[chave], f"{caminho}/{chave}")]
+    if isinstance(padrao, list):
+        if len(padrao) != len(numerico):
+            return [f"{caminho}: listas de tamanhos diferentes"]
+        return [d for i, (a, b) in enumerate(zip(padrao, numerico)) for d in comparar_formato_numerico(a, b, f"{caminho}[{i}]")]
+    if padrao == "–":
+        return [] if numerico is None else [f"{caminho}: esperado null, obtido {numerico!r}"]
+    if isinstance(padrao, str) and padrao.endswith("%"):
+        if numero(numerico) and abs(float(padrao[:-1]) - numerico) <= 0.006:
+            return []
+        return [f"{caminho}: esperado {padrao}, obtido {numerico!r}"]
+    return comparar(padrao, numerico, caminho)
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+def test_formato_numerico_equivale_ao_padrao(client, rota):
+    padrao = client.get(rota).json()
+    numerico = client.get(f"{rota}?format=numeric").json()
+
+    diferencas = comparar_formato_numerico(padrao, numerico, rota)
+    assert not diferencas, "\n".join(diferencas[:20])
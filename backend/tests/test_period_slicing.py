@@ -0,0 +1,45 @@
+"""
+start/end/mes/granularity em /dre e /dfc: recorte do período completo, sem recalcular os valores
+"""
+import pytest
+from response_helpers import comparar, linhas_com_orcamento
+
+
+def _meses_do_recorte(serie, inicio, fim):
+    return {mes: valor for mes, valor in serie.items() if inicio <= mes <= fim}
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+def test_recorte_mantem_os_valores_mensais(client, rota):
+    """start/end: mesmos valores e orçamentos mensais do período completo (no DFC, também os saldos)"""
+    inicio, fim = "2024-11", "2025-02"
+    completo = {linha["nome"]: linha for linha in client.get(rota).json()["data"]}
+    recorte = client.get(f"{rota}?start={inicio}&end={fim}").json()
+
+    assert recorte["meses"] == [mes for mes in client.get(rota).json()["meses"] if inicio <= mes <= fim]
+    for linha in recorte["data"]:
+        referencia = completo[linha["nome"]]
+        for serie in ("valores_mensais", "orcamentos_mensais"):
+            diferencas = comparar(_meses_do_recorte(referencia[serie], inicio, fim), linha[serie], f"{linha['nome']}/{serie}")
+            assert not diferencas, "\n".join(diferencas)
+
+
+def test_mes_equivale_a_recorte_de_um_mes(client):
+    por_mes = client.get("/dre?mes=2024-11").json()
+    recorte = client.get("/dre?start=2024-11&end=2024-11").json()
+
+    diferencas = comparar(por_mes, recorte, "/dre?mes=2024-11")
+    assert not diferencas, "\n".join(diferencas[:20])
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+def test_granularidade_mensal_omite_trimestres_e_anos(client, rota):
+    resposta = client.get(f"{rota}?start=2024-11&end=2025-02&granularity=mes").json()
+
+    for linha in linhas_com_orcamento(resposta["data"]):
+        assert not [campo for campo in linha if campo.endswith(("_trimestrais", "_anuais"))], linha["nome"]
+
+
+@pytest.mark.parametrize("consulta", ["start=2025-02&end=2024-11", "start=2024-13", "granularity=semana"])
+def test_recorte_invalido_retorna_erro(client, consulta):
+    assert "error" in client.get(f"/dre?{consulta}").json()
@@ -0,0 +1,49 @@
+"""
+Cache de respostas com ETag/304 dos endpoints da planilha (helpers/response_cache.py)
+"""
+import pytest
+from helpers.response_cache import chave_resposta, limpar_cache_respostas
+
+
+@pytest.fixture
+def cache_vazio(client):
+    """Planilha já carregada (o cache só vale com uma versão em memória) e nenhuma resposta guardada"""
+    client.get("/dre")
+    limpar_cache_respostas()
+    yield
+    limpar_cache_respostas()
+
+
+def test_segunda_resposta_vem_do_cache_com_o_mesmo_etag(client, cache_vazio):
+    primeira = client.get("/dre")
+    segunda = client.get("/dre")
+
+    assert primeira.headers["x-cache"] == "miss"
+    assert segunda.headers["x-cache"] == "memory"
+    assert segunda.headers["etag"] == primeira.headers["etag"]
+    assert segunda.content == primeira.content
+
+
+def test_if_none_match_igual_retorna_304(client, cache_vazio):
+    etag = client.get("/dfc").headers["etag"]
+
+    resposta = client.get("/dfc", headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.content == b""
+    assert resposta.headers["etag"] == etag
+
+
+def test_parametros_diferentes_tem_etags_diferentes(client, cache_vazio):
+    completo = client.get("/dre").headers["etag"]
+    recorte = client.get("/dre?start=2024-11&end=2025-02").headers["etag"]
+    assert completo != recorte
+
+    resposta = client.get("/dre?start=2024-11&end=2025-02", headers={"If-None-Match": completo})
+    assert resposta.status_code == 200
+
+
+def test_chave_ignora_ordem_e_parametros_vazios():
+    chave = chave_resposta("v1", "/dre", [("start", "2024-11"), ("end", "2025-02")])
+    assert chave == chave_resposta("v1", "/dre", [("end", "2025-02"), ("fields", ""), ("start", "2024-11")])
+    assert chave != chave_resposta("v2", "/dre", [("start", "2024-11"), ("end", "2025-02")])
+    assert chave_resposta("v1", "/receber", [], "2025-01-01") != chave_resposta("v1", "/receber", [], "2025-01-02")
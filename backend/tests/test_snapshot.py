@@ -0,0 +1,67 @@
+"""
+Snapshot colunar da planilha (helpers/snapshot_helper.py)
+
+A leitura pelo snapshot precisa devolver as mesmas abas, com os mesmos valores
+e tipos, que a leitura direta do Excel; o snapshot é refeito quando o conteúdo
+da planilha muda e reaproveitado quando só o mtime muda.
+"""
+import os
+import shutil
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from conftest import FIXTURES
+
+pytest.importorskip("pyarrow")
+
+from helpers.snapshot_helper import carregar_abas, caminho_snapshot, MANIFESTO
+
+
+@pytest.fixture
+def planilha(tmp_path):
+    return shutil.copy(os.path.join(FIXTURES, "regression_workbook.xlsx"), tmp_path / "planilha.xlsx")
+
+
+def test_snapshot_igual_a_leitura_do_excel(planilha):
+    do_excel, info_excel = carregar_abas(planilha)
+    assert info_excel["origem"] == "excel"
+    assert os.path.exists(os.path.join(caminho_snapshot(planilha), MANIFESTO))
+
+    do_snapshot, info_snapshot = carregar_abas(planilha)
+    assert info_snapshot["origem"] == "snapshot"
+    assert info_snapshot["hash"] == info_excel["hash"]
+
+    assert sorted(do_snapshot) == sorted(do_excel)
+    for aba, df in do_excel.items():
+        pd.testing.assert_frame_equal(do_snapshot[aba], df, obj=aba)
+
+
+def test_mtime_novo_com_mesmo_conteudo_usa_o_snapshot(planilha):
+    _, info_excel = carregar_abas(planilha)
+    mtime = os.path.getmtime(planilha) + 60
+    os.utime(planilha, (mtime, mtime))
+
+    _, info = carregar_abas(planilha)
+    assert info["origem"] == "snapshot"
+    assert info["hash"] == info_excel["hash"]
+    assert info["mtime"] == mtime
+
+
+def test_conteudo_novo_refaz_o_snapshot(planilha):
+    anterior, info_anterior = carregar_abas(planilha)
+
+    livro = load_workbook(planilha)
+    aba = livro["base"]
+    colunas = [celula.value for celula in aba[1]]
+    aba.cell(row=2, column=colunas.index("valor_original") + 1, value=123456.78)
+    livro.save(planilha)
+
+    atual, info = carregar_abas(planilha)
+    assert info["origem"] == "excel"
+    assert info["hash"] != info_anterior["hash"]
+    assert atual["base"].loc[0, "valor_original"] == 123456.78
+    assert anterior["base"].loc[0, "valor_original"] != 123456.78
+
+    novo, info_snapshot = carregar_abas(planilha)
+    assert info_snapshot["origem"] == "snapshot"
+    pd.testing.assert_frame_equal(novo["base"], atual["base"])
@@ -0,0 +1,103 @@
+"""
+fields= (famílias de campos) em /dre e /dfc da planilha e nos endpoints da DRE N0 no PostgreSQL
+
+Sem PostgreSQL nem Redis aqui: o cache é um RedisCache desconectado (get/set
+não fazem nada) e as consultas do ClassificacoesHelper devolvem linhas fixas.
+"""
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from response_helpers import comparar
+
+
+def projetar(completa, parcial):
+    """Campos de completa presentes em parcial, aplicado também às classificações aninhadas"""
+    if isinstance(parcial, dict):
+        return {chave: projetar(completa.get(chave), valor) for chave, valor in parcial.items()}
+    if isinstance(parcial, list) and isinstance(completa, list) and len(parcial) == len(completa):
+        return [projetar(a, b) for a, b in zip(completa, parcial)]
+    return completa
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+@pytest.mark.parametrize("campos", ["valores", "orcamentos,real_vs_orcamento", "horizontal,vertical"])
+def test_campos_parciais_iguais_a_resposta_completa(client, rota, campos):
+    """fields=: só os campos pedidos, com os mesmos valores da resposta completa"""
+    completa = client.get(rota).json()
+    parcial = client.get(f"{rota}?fields={campos}").json()
+
+    for linha in parcial["data"]:
+        referencia = next(item for item in completa["data"] if item["nome"] == linha["nome"])
+        assert set(linha) < set(referencia), linha["nome"]
+        diferencas = comparar(projetar(referencia, linha), linha, f"{rota}?fields={campos}/{linha['nome']}")
+        assert not diferencas, "\n".join(diferencas[:20])
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc"])
+def test_campos_invalidos_retornam_erro(client, rota):
+    assert "inexistente" in client.get(f"{rota}?fields=valores,inexistente").json()["error"]
+
+
+def _lancamento(nome, valor, mes):
+    ano = mes[:4]
+    return SimpleNamespace(
+        nome_lancamento=nome, classificacao="Receita de vendas", valor_original=valor,
+        periodo_mensal=mes, periodo_trimestral=f"{ano}-Q{(int(mes[5:]) - 1) // 3 + 1}", periodo_anual=ano,
+        observacao=None, documento=None, banco=None, conta_corrente=None,
+    )
+
+
+LANCAMENTOS = [
+    _lancamento("Cliente A", 100.0, "2025-01"),
+    _lancamento("Cliente A", 50.0, "2025-04"),
+    _lancamento("Cliente B", -30.0, "2025-01"),
+]
+
+
+@pytest.fixture
+def postgres_falso(monkeypatch):
+    from endpoints import dre_n0_postgresql
+    from helpers_postgresql.dre.cache_helper import RedisCache
+
+    class EngineFalso:
+        @contextmanager
+        def connect(self):
+            yield None
+
+    async def cache_desconectado():
+        return RedisCache()
+
+    helper = dre_n0_postgresql.ClassificacoesHelper
+    monkeypatch.setattr(dre_n0_postgresql, "get_cache", cache_desconectado)
+    monkeypatch.setattr(dre_n0_postgresql, "get_engine", lambda: EngineFalso())
+    monkeypatch.setattr(helper, "fetch_nomes_por_classificacao", staticmethod(lambda *args: LANCAMENTOS))
+    monkeypatch.setattr(helper, "fetch_faturamento_data", staticmethod(lambda *args: []))
+
+
+ROTA_NOMES = "/dre-n0/classificacoes/Faturamento/nomes/Receita de vendas"
+
+
+def test_nomes_sem_fields_traz_todos_os_campos(client, postgres_falso):
+    resposta = client.get(ROTA_NOMES)
+    assert resposta.status_code == 200
+
+    nomes = {item["nome"]: item for item in resposta.json()["data"]}
+    assert nomes["Cliente A"]["valores_mensais"] == {"2025-01": 100.0, "2025-04": 50.0}
+    assert nomes["Cliente A"]["valor_total"] == 150.0
+    assert nomes["Cliente B"]["valores_trimestrais"] == {"2025-Q1": -30.0}
+
+
+def test_nomes_com_fields_retira_as_familias_nao_pedidas(client, postgres_falso):
+    completa = client.get(ROTA_NOMES).json()["data"]
+    resposta = client.get(f"{ROTA_NOMES}?fields=orcamentos")
+    assert resposta.status_code == 200
+
+    for linha, referencia in zip(resposta.json()["data"], completa):
+        assert not [chave for chave in linha if chave.startswith("valor")], linha["nome"]
+        assert linha == {chave: valor for chave, valor in referencia.items() if not chave.startswith("valor")}
+
+
+def test_nomes_com_fields_invalido_retorna_400(client, postgres_falso):
+    resposta = client.get(f"{ROTA_NOMES}?fields=valores,inexistente")
+    assert resposta.status_code == 400
+    assert "inexistente" in resposta.json()["detail"]
@@ -0,0 +1,66 @@
+"""
+Registro de planilhas por cliente/grupo e orçamento de memória (helpers/workbook_store.py)
+
+O conftest registra só o cliente "teste" (EXCEL_WORKBOOKS), que também é o padrão.
+"""
+import os
+import shutil
+import pytest
+from conftest import FIXTURES, PLANILHA_TESTE
+from response_helpers import comparar
+from helpers import workbook_store
+from helpers.workbook_store import resolver_workbook, get_workbook_store, status_workbooks
+
+
+def test_resolver_workbook_por_cliente_ou_grupo():
+    assert resolver_workbook() == (PLANILHA_TESTE, None)
+    assert resolver_workbook(cliente=" Teste ") == (PLANILHA_TESTE, None)
+    assert resolver_workbook(grupo="teste") == (PLANILHA_TESTE, None)
+
+    filename, erro = resolver_workbook(cliente="outro")
+    assert filename is None
+    assert "outro" in erro
+
+
+def test_cliente_explicito_igual_ao_padrao(client):
+    padrao = client.get("/dre").json()
+    por_cliente = client.get("/dre?cliente=teste").json()
+
+    diferencas = comparar(padrao, por_cliente, "/dre?cliente=teste")
+    assert not diferencas, "\n".join(diferencas[:20])
+
+
+@pytest.mark.parametrize("rota", ["/dre", "/dfc", "/receber", "/pagar"])
+def test_cliente_desconhecido_retorna_erro(client, rota):
+    assert "outro" in client.get(f"{rota}?cliente=outro").json()["error"]
+
+
+def test_status_traz_a_memoria_de_cada_cliente(client):
+    client.get("/dre")
+    status = status_workbooks()["teste"]
+    assert status["carregado"] is True
+    assert status["memoria"]["total"] > 0
+
+
+@pytest.fixture
+def stores_isolados(monkeypatch, tmp_path):
+    """Duas planilhas em stores fora do registro da aplicação"""
+    monkeypatch.setattr(workbook_store, "_stores", {})
+    origem = os.path.join(FIXTURES, "regression_workbook.xlsx")
+    return [shutil.copy(origem, tmp_path / f"cliente_{indice}.xlsx") for indice in range(2)]
+
+
+def test_orcamento_descarta_a_planilha_usada_ha_mais_tempo(monkeypatch, stores_isolados):
+    # Orçamento menor que uma planilha: a recém-carregada fica, mesmo sozinha acima dele
+    monkeypatch.setattr(workbook_store, "WORKBOOK_MEMORY_BUDGET_PROCESSO_MB", 0.01)
+    antiga, recente = (get_workbook_store(filename) for filename in stores_isolados)
+
+    assert antiga.get_snapshot() is not None
+    assert recente.get_snapshot() is not None
+
+    assert antiga.peek() is None
+    assert recente.peek() is not None
+
+    # Descartada, volta no próximo acesso
+    assert antiga.get_snapshot() is not None
+    assert recente.peek() is None
@@ -0,0 +1,83 @@
+"""
+Recarga stale-while-revalidate do WorkbookStore (helpers/workbook_store.py)
+
+Depois da primeira carga, os requests recebem a última versão boa enquanto a
+nova é carregada em background; a troca acontece só com a nova versão pronta,
+e uma recarga com erro mantém a versão anterior.
+"""
+import os
+import shutil
+import time
+import pytest
+from openpyxl import load_workbook
+from conftest import FIXTURES
+from helpers.workbook_store import WorkbookStore
+
+
+@pytest.fixture
+def planilha(tmp_path):
+    return shutil.copy(os.path.join(FIXTURES, "regression_workbook.xlsx"), tmp_path / "planilha.xlsx")
+
+
+def _alterar(planilha, valor):
+    """Grava um valor novo na primeira linha da base, com mtime certamente diferente"""
+    livro = load_workbook(planilha)
+    aba = livro["base"]
+    colunas = [celula.value for celula in aba[1]]
+    aba.cell(row=2, column=colunas.index("valor_original") + 1, value=valor)
+    livro.save(planilha)
+    mtime = os.path.getmtime(planilha) + 60
+    os.utime(planilha, (mtime, mtime))
+
+
+def _aguardar_recarga(store, limite=30):
+    inicio = time.time()
+    while store.status()["recarregando"]:
+        assert time.time() - inicio < limite, "recarga em background não terminou"
+        time.sleep(0.05)
+
+
+def test_arquivo_alterado_serve_a_versao_anterior_ate_a_nova_ficar_pronta(planilha):
+    store = WorkbookStore(planilha)
+    anterior = store.get_snapshot()
+    assert anterior is not None
+
+    _alterar(planilha, 123456.78)
+
+    # O request que percebe a mudança não espera a recarga
+    assert store.get_snapshot() is anterior
+    _aguardar_recarga(store)
+
+    atual = store.get_snapshot()
+    assert atual is not anterior
+    assert atual.versao != anterior.versao
+    assert atual.base.loc[0, "valor_original"] == 123456.78
+    assert anterior.base.loc[0, "valor_original"] != 123456.78
+
+
+def test_mesmo_conteudo_mantem_a_versao_e_os_derivados(planilha):
+    store = WorkbookStore(planilha)
+    anterior = store.get_snapshot()
+    derivado = anterior.derivado("teste", object)
+
+    mtime = os.path.getmtime(planilha) + 60
+    os.utime(planilha, (mtime, mtime))
+    store.get_snapshot()
+    _aguardar_recarga(store)
+
+    atual = store.get_snapshot()
+    assert atual is anterior
+    assert atual.derivado("teste", object) is derivado
+
+
+def test_recarga_com_erro_mantem_a_ultima_versao_boa(planilha):
+    store = WorkbookStore(planilha)
+    anterior = store.get_snapshot()
+
+    with open(planilha, "wb") as f:
+        f.write(b"arquivo corrompido")
+    assert store.revalidar(bloquear=True)
+
+    assert store.get_snapshot() is anterior
+    _aguardar_recarga(store)
+    assert store.status()["ultimo_erro"]